@@ -0,0 +1,87 @@
+"""
+Import-time benchmark for the jpe_py package.
+
+`using JPE` imports jpe_py, so `import jpe_py` must stay cheap: it must not
+pull in the dropbox or google SDKs and must not touch the network. This script
+times the import of the package and of each submodule in fresh interpreters
+(median of --repeat runs), with sockets disabled, and exits non-zero if the
+package import loads an SDK, opens a connection or exceeds --max-ms.
+
+usage:
+    python bench/bench_import.py
+    python bench/bench_import.py --repeat 10 --max-ms 50
+"""
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.join(os.path.dirname(HERE), "src")
+
+# modules that `import jpe_py` alone must not load
+HEAVY = ("dropbox", "stone", "googleapiclient", "google.oauth2", "httpx", "requests")
+
+_PROBE = """
+import sys, time, json, socket
+
+def _no_network(*args, **kwargs):
+    raise RuntimeError("network access during import")
+
+socket.socket.connect = _no_network
+socket.create_connection = _no_network
+
+t0 = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - t0
+print(json.dumps({{"seconds": seconds, "modules": sorted(sys.modules)}}))
+"""
+
+ENV = {"JPE_DBOX_APP": "bench", "JPE_DBOX_APP_SECRET": "bench", "JPE_DBOX_APP_REFRESH": "bench"}
+
+
+def probe(module):
+    "time `import module` in a fresh interpreter; returns (seconds, loaded module names)."
+    env = dict(os.environ, **ENV, PYTHONPATH=os.pathsep.join([SRC, os.environ.get("PYTHONPATH", "")]))
+    out = subprocess.run([sys.executable, "-c", _PROBE.format(module=module)],
+                         env=env, capture_output=True, text=True)
+    if out.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{out.stderr}")
+    res = json.loads(out.stdout.strip().splitlines()[-1])
+    return res["seconds"], res["modules"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, default=100.0, help="budget for `import jpe_py`")
+    args = parser.parse_args(argv)
+
+    ok = True
+    for module in ("jpe_py", "jpe_py.metrics", "jpe_py.db_filerequests",
+                   "jpe_py.dropbox_async", "jpe_py.gmail_client"):
+        try:
+            runs = [probe(module) for _ in range(args.repeat)]
+        except RuntimeError as e:
+            print(e)
+            ok = False
+            continue
+        ms = statistics.median(s for s, _ in runs) * 1000
+        loaded = runs[0][1]
+        heavy = [h for h in HEAVY if h in loaded]
+        print(f"import {module:24s} {ms:8.1f} ms  {len(loaded):5d} modules  heavy: {', '.join(heavy) or '-'}")
+        if module == "jpe_py":
+            if heavy:
+                print(f"  FAIL: import jpe_py loads {', '.join(heavy)}")
+                ok = False
+            if ms > args.max_ms:
+                print(f"  FAIL: import jpe_py took {ms:.1f} ms > {args.max_ms} ms")
+                ok = False
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,268 @@
+"""
+Throughput of the python Dropbox/Gmail layer against the local fake services.
+
+Imports a fresh copy of the jpe_py package from src/ for every run, points it
+at a FakeServer and times each scenario at every size:
+
+    monitor     check_file_requests_bulk + monitor_viable_file_requests over 2n requests
+    links       get_link_at_path for n folders, cold cache then warm
+    links_async the same through the async backend (needs httpx)
+    create      create_file_requests_bulk for 2n requests
+    email       send_emails_batch of n messages
+    email_attach send_emails_batch of n messages sharing the same two attachments
+    inbox       inbox_changes + match_messages over n new messages among 10n older ones
+    upload      upload_files of n small files in several chunks each
+
+usage:
+    python bench/bench_python_layer.py --sizes 10 100 1000 --latency 0.02 --rate 0
+    python bench/bench_python_layer.py --scenarios links email --json results.json
+
+Each scenario row reports wall time, items per second and the API calls and
+retries counted by metrics.py during the run.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import contextlib
+import io
+import importlib.util
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.join(os.path.dirname(HERE), "src")
+sys.path.insert(0, HERE)
+sys.path.insert(0, SRC)
+
+from fake_services import FakeServer, RedirectHttp, redirect_session  # noqa: E402
+
+TOKEN = "bench-token"
+SCENARIOS = ("monitor", "links", "links_async", "create", "email", "email_attach", "inbox", "upload")
+
+
+class Layer:
+    "the jpe_py submodules; layer[name] reads (and assigns) a module global wherever it lives."
+
+    MODULES = ("metrics", "db_filerequests", "dropbox_async", "gmail_client")
+
+    def __init__(self):
+        for name in [m for m in sys.modules if m == "jpe_py" or m.startswith("jpe_py.")]:
+            del sys.modules[name]
+        self.modules = [importlib.import_module(f"jpe_py.{m}") for m in self.MODULES]
+
+    def _owner(self, name):
+        for module in reversed(self.modules):
+            if name in vars(module):
+                return module
+        raise KeyError(name)
+
+    def __getitem__(self, name):
+        return getattr(self._owner(name), name)
+
+    def __setitem__(self, name, value):
+        setattr(self._owner(name), name, value)
+
+
+def load_layer(server, workdir):
+    "a fresh jpe_py wired to `server`."
+    os.environ.update({
+        "JPE_DBOX_APP": "bench", "JPE_DBOX_APP_SECRET": "bench", "JPE_DBOX_APP_REFRESH": "bench",
+        "JPE_DBOX_INDEX": os.path.join(workdir, "index.sqlite"),
+        "JPE_DBOX_API_URL": server.url + "/2",
+        "JPE_METRICS_FILE": os.path.join(workdir, "metrics.jsonl"),
+    })
+    token_file = os.path.join(workdir, "gmail_token.json")
+    with open(token_file, "w") as f:
+        json.dump({"ACCESS_TOKEN": TOKEN, "ACCESS_TOKEN_EXPIRES_AT": time.time() + 10 ** 6,
+                   "REFRESH_TOKEN": "x", "CLIENT_ID": "x", "CLIENT_SECRET": "x"}, f)
+    os.environ["JPE_GMAIL_TOKEN"] = token_file
+
+    ns = Layer()
+
+    # dropbox: a valid cached token and every https request sent to the fake server
+    ns["_dbx_token"], ns["_dbx_token_expires"] = TOKEN, time.time() + 10 ** 6
+    redirect_session(ns["_http_session"](), server.url, ns["DBX_POOL_SIZE"])
+
+    # gmail: a service built on an http client that talks to the fake server
+    from googleapiclient.discovery import build
+    ns["refresh_access_token_from_json"]()
+    ns["_gmail_service"] = build("gmail", "v1", http=RedirectHttp(server.url),
+                                 static_discovery=True, cache_discovery=False,
+                                 requestBuilder=ns["_InstrumentedHttpRequest"])
+    ns["_gmail_service_token"] = TOKEN
+    return ns
+
+
+def _reset_link_cache(ns):
+    with ns["_link_cache_lock"]:
+        ns["_link_cache"] = {}
+        con = ns["_index_connect"]()
+        try:
+            con.execute("DELETE FROM shared_links")
+            con.commit()
+        finally:
+            con.close()
+
+
+def _papers(n):
+    return [f"/JPE/Author{i}-{10000000 + i}/1" for i in range(n)]
+
+
+def bench_monitor(ns, server, n, workdir):
+    ids = []
+    for i, root in enumerate(_papers(n)):
+        for folder in ("replication-package", "paper-appendices"):
+            dest = f"{root}/{folder}"
+            if i % 10:  # every tenth paper lost its folders
+                server.state.add_folder(dest)
+            ids.append(server.state.add_file_request(f"{root} {folder}", dest, file_count=i % 3)["id"])
+    t0 = time.perf_counter()
+    ns["check_file_requests_bulk"](TOKEN, ids)
+    ns["monitor_viable_file_requests"](TOKEN, only_open=True)
+    return time.perf_counter() - t0, len(ids)
+
+
+def bench_links(ns, server, n, workdir):
+    paths = [f"{root}/replication-package" for root in _papers(n)]
+    for p in paths:
+        server.state.add_folder(p)
+    _reset_link_cache(ns)
+    t0 = time.perf_counter()
+    ns["run_many"]("get_link_at_path", [(p, TOKEN) for p in paths], max_workers=8)
+    cold = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    for p in paths:
+        ns["get_link_at_path"](p, TOKEN)
+    return cold, len(paths), {"warm_s": time.perf_counter() - t0}
+
+
+def bench_links_async(ns, server, n, workdir):
+    paths = [f"{root}/paper-appendices" for root in _papers(n)]
+    for p in paths:
+        server.state.add_folder(p)
+    _reset_link_cache(ns)
+    t0 = time.perf_counter()
+    ns["links_at_paths_async"](paths, TOKEN)
+    return time.perf_counter() - t0, len(paths)
+
+
+def bench_create(ns, server, n, workdir):
+    specs = [(f"{root} {folder} upload", f"{root}/{folder}", 14)
+             for root in _papers(n) for folder in ("replication-package", "paper-appendices")]
+    t0 = time.perf_counter()
+    ns["create_file_requests_bulk"](specs, TOKEN)
+    return time.perf_counter() - t0, len(specs)
+
+
+def bench_email(ns, server, n, workdir):
+    messages = [{"to": f"author{i}@example.org", "subject": f"Replication package {i}",
+                 "html_body": "<p>Please upload your package.</p>" * 20,
+                 "sent_from": "jpe@example.org"} for i in range(n)]
+    t0 = time.perf_counter()
+    ns["send_emails_batch"](messages)
+    return time.perf_counter() - t0, n
+
+
+def bench_email_attach(ns, server, n, workdir, pdf_kb=512):
+    pdf, script = os.path.join(workdir, "instructions.pdf"), os.path.join(workdir, "upload.sh")
+    with open(pdf, "wb") as f:
+        f.write(os.urandom(pdf_kb * 1024))
+    with open(script, "w") as f:
+        f.write("curl -X PUT --upload-file package.zip https://example.org/upload\n" * 10)
+    messages = [{"to": f"author{i}@example.org", "subject": f"Upload instructions {i}",
+                 "html_body": "<p>Please upload your package.</p>", "sent_from": "jpe@example.org",
+                 "attachments": [pdf, script]} for i in range(n)]
+    t0 = time.perf_counter()
+    ns["send_emails_batch"](messages)
+    cache = ns["part_cache_info"]()
+    return time.perf_counter() - t0, n, {"part_cache_hits": cache["hits"], "part_cache_misses": cache["misses"]}
+
+
+def bench_inbox(ns, server, n, workdir):
+    for i in range(10 * n):
+        server.state.add_inbox_message(f"old message {i}", f"someone{i}@example.org")
+    history_id = ns["inbox_changes"]()["history_id"]
+    ids = [str(10000000 + i) for i in range(n)]
+    for i in range(n):
+        if i % 3 == 0:
+            subject = f"Re: I assigned you the JPE-Author{i}-{ids[i]}-R1 package"
+        else:
+            subject = f"newsletter {i}"
+        server.state.add_inbox_message(subject, f"author{i}@example.org")
+    t0 = time.perf_counter()
+    changes = ns["inbox_changes"](history_id)
+    matches = ns["match_messages"](changes["messages"], ids)
+    return time.perf_counter() - t0, len(changes["messages"]), {"matched": len(matches)}
+
+
+def bench_upload(ns, server, n, workdir, file_kb=64, chunk_kb=16):
+    local = os.path.join(workdir, f"upload-{n}")
+    os.makedirs(local, exist_ok=True)
+    pairs = []
+    for i in range(n):
+        path = os.path.join(local, f"f{i}.bin")
+        with open(path, "wb") as f:
+            f.write(os.urandom(file_kb * 1024))
+        pairs.append((path, f"/bench/upload-{n}/f{i}.bin"))
+    t0 = time.perf_counter()
+    ns["upload_files"](pairs, TOKEN, chunk_size=chunk_kb * 1024)
+    return time.perf_counter() - t0, n, {"mb": n * file_kb / 1024}
+
+
+BENCHES = {"monitor": bench_monitor, "links": bench_links, "links_async": bench_links_async,
+           "create": bench_create, "email": bench_email,
+           "email_attach": bench_email_attach, "inbox": bench_inbox, "upload": bench_upload}
+
+
+def run(sizes, scenarios, latency, rate, verbose=False):
+    rows = []
+    for n in sizes:
+        for scenario in scenarios:
+            if scenario == "links_async" and importlib.util.find_spec("httpx") is None:
+                print(f"skipping {scenario}: httpx is not installed")
+                continue
+            with tempfile.TemporaryDirectory() as workdir, FakeServer(latency=latency, rate=rate) as server:
+                ns = load_layer(server, workdir)
+                try:
+                    # the layer prints per item; keep that out of the timings unless asked
+                    with contextlib.redirect_stdout(sys.stdout if verbose else io.StringIO()):
+                        out = BENCHES[scenario](ns, server, n, workdir)
+                finally:
+                    if scenario == "links_async":
+                        ns["close_async_backend"]()
+                seconds, items = out[0], out[1]
+                metrics = ns["get_metrics"]()
+                api = {k: v for k, v in metrics.items() if "/" in k}
+                row = {"scenario": scenario, "n": n, "items": items, "seconds": seconds,
+                       "items_per_s": items / seconds if seconds else None,
+                       "api_calls": sum(v["calls"] for v in api.values()),
+                       "retries": sum(v["retries"] for v in metrics.values()),
+                       "server_requests": server.requests,
+                       **(out[2] if len(out) > 2 else {}),
+                       "metrics": metrics}
+                rows.append(row)
+                print(f"{scenario:12s} n={n:<5d} {items:6d} items {seconds:8.3f}s "
+                      f"{row['items_per_s']:9.1f}/s  api calls {row['api_calls']:6d}  retries {row['retries']}")
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds per fake API request")
+    parser.add_argument("--rate", type=float, default=0, help="requests per second per service (0: unlimited)")
+    parser.add_argument("--json", help="write all results, with per-endpoint metrics, to this file")
+    parser.add_argument("--verbose", action="store_true", help="show what the layer prints")
+    args = parser.parse_args(argv)
+
+    rows = run(args.sizes, args.scenarios, args.latency, args.rate, args.verbose)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"latency": args.latency, "rate": args.rate, "results": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,575 @@
+"""
+Local stand-in for the Dropbox and Gmail HTTP APIs, for benchmarks.
+
+Serves the Dropbox file request, sharing, files and upload session endpoints
+under /2/... (RPC and content style alike) and the Gmail send, draft, profile,
+history, message list/get and batch endpoints under /gmail/v1/... and
+/batch, from in-memory state.
+Every request waits `latency` seconds; with `rate` > 0 each service admits at
+most `rate` requests per second and answers the rest with 429 + Retry-After.
+
+The SDKs only talk https to the real hosts, so the clients are pointed here
+with `redirect_session` (requests, used by the Dropbox SDK) and `RedirectHttp`
+(httplib2, used by googleapiclient).
+"""
+
+import json
+import time
+import uuid
+import hashlib
+import threading
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import httplib2
+from requests.adapters import HTTPAdapter
+
+_TS = "2024-01-01T00:00:00Z"
+
+
+def content_hash(data):
+    "Dropbox content hash of `data`: sha256 over the sha256 of each 4 MB block."
+    blocks = [hashlib.sha256(data[i:i + 4 * 1024 * 1024]).digest()
+              for i in range(0, len(data), 4 * 1024 * 1024)]
+    return hashlib.sha256(b"".join(blocks)).hexdigest()
+
+
+class _RateLimiter:
+    "token bucket admitting `rate` requests per second (0: no limit)."
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = float(rate)
+        self.stamp = time.monotonic()
+        self.lock = threading.Lock()
+
+    def admit(self):
+        if not self.rate:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.stamp) * self.rate)
+            self.stamp = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+class _ApiError(Exception):
+    "a Dropbox endpoint error: HTTP 409 with the given error union."
+
+    def __init__(self, tag, error):
+        self.tag, self.error = tag, error
+
+
+class FakeState:
+    "In-memory Dropbox account and Gmail mailbox."
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.file_requests = {}      # id -> file request dict
+        self.folders = set()         # path_lower
+        self.files = {}              # path_lower -> file metadata dict
+        self.links = {}              # path_lower -> shared link metadata dict
+        self.sessions = {}           # session id -> bytearray
+        self.messages = []           # raw messages sent
+        self.drafts = []
+        self.inbox = {}              # message id -> received message resource
+        self.history_id = 1000       # mailbox history id, bumped per received message
+        self.history_floor = 0       # history.list answers 404 below this id
+
+    def add_folder(self, path):
+        with self.lock:
+            self.folders.add(path.lower())
+
+    def add_file(self, path, data=b""):
+        with self.lock:
+            self.files[path.lower()] = _file_meta(path, data)
+
+    def add_inbox_message(self, subject, sender, thread_id=None, labels=("INBOX",)):
+        "deliver a message to the mailbox; returns its id."
+        with self.lock:
+            self.history_id += 1
+            mid = f"in{self.history_id}"
+            self.inbox[mid] = {
+                "id": mid, "threadId": thread_id or f"t{mid}", "labelIds": list(labels),
+                "historyId": str(self.history_id), "internalDate": str(int(time.time() * 1000)),
+                "snippet": f"Re: {subject}"[:100],
+                "payload": {"headers": [{"name": "From", "value": sender},
+                                        {"name": "To", "value": "jpe@example.org"},
+                                        {"name": "Subject", "value": subject}]},
+            }
+            return mid
+
+    def add_file_request(self, title, destination, file_count=0, is_open=True):
+        fr = {"id": uuid.uuid4().hex[:12], "url": f"https://fake.dropbox/request/{uuid.uuid4().hex[:8]}",
+              "title": title, "destination": destination, "created": _TS,
+              "is_open": is_open, "file_count": file_count}
+        with self.lock:
+            self.file_requests[fr["id"]] = fr
+        return fr
+
+
+def _file_meta(path, data):
+    name = path.rstrip("/").rsplit("/", 1)[-1]
+    return {".tag": "file", "name": name, "id": "id:" + uuid.uuid4().hex[:12],
+            "path_lower": path.lower(), "path_display": path,
+            "client_modified": _TS, "server_modified": _TS, "rev": "0" * 9 + "1",
+            "size": len(data), "content_hash": content_hash(data)}
+
+
+def _folder_meta(path):
+    return {".tag": "folder", "name": path.rstrip("/").rsplit("/", 1)[-1],
+            "id": "id:" + hashlib.md5(path.lower().encode()).hexdigest()[:12],
+            "path_lower": path.lower(), "path_display": path}
+
+
+def _link_meta(path, url):
+    permissions = {"can_revoke": True, "visibility_policies": [], "can_set_expiry": True,
+                   "can_remove_expiry": True, "allow_download": True, "can_allow_download": True,
+                   "can_disallow_download": True, "allow_comments": True,
+                   "team_restricts_comments": False, "resolved_visibility": {".tag": "public"}}
+    return {".tag": "folder", "url": url, "name": path.rstrip("/").rsplit("/", 1)[-1] or "root",
+            "id": "id:" + uuid.uuid4().hex[:12], "path_lower": path.lower(),
+            "link_permissions": permissions}
+
+
+class _Dropbox:
+    "handlers for /2/<endpoint>; each takes the decoded argument and the request body."
+
+    PAGE = 1000
+
+    def __init__(self, state):
+        self.s = state
+
+    def _page(self, items, key, start, limit=None):
+        limit = limit or self.PAGE
+        page = items[start:start + limit]
+        more = start + limit < len(items)
+        return {key: page, "cursor": f"{key}:{start + limit}", "has_more": more}
+
+    # file requests
+    def file_requests_list_v2(self, arg, body):
+        return self._page(list(self.s.file_requests.values()), "file_requests", 0, arg.get("limit"))
+
+    def file_requests_list_continue(self, arg, body):
+        _, start = arg["cursor"].split(":")
+        return self._page(list(self.s.file_requests.values()), "file_requests", int(start))
+
+    def file_requests_get(self, arg, body):
+        fr = self.s.file_requests.get(arg["id"])
+        if fr is None:
+            raise _ApiError("not_found", {".tag": "not_found"})
+        return fr
+
+    def file_requests_create(self, arg, body):
+        fr = self.s.add_file_request(arg["title"], arg["destination"])
+        if arg.get("deadline"):
+            fr["deadline"] = arg["deadline"]
+        return fr
+
+    def file_requests_update(self, arg, body):
+        fr = self.file_requests_get(arg, body)
+        if "open" in arg:
+            fr["is_open"] = arg["open"]
+        return fr
+
+    def file_requests_delete(self, arg, body):
+        with self.s.lock:
+            gone = [self.s.file_requests.pop(i) for i in arg["ids"] if i in self.s.file_requests]
+        return {"file_requests": gone}
+
+    # files
+    def files_get_metadata(self, arg, body):
+        path = arg["path"].lower()
+        if path in self.s.files:
+            return self.s.files[path]
+        if path in self.s.folders:
+            return _folder_meta(arg["path"])
+        raise _ApiError("path/not_found", {".tag": "path", "path": {".tag": "not_found"}})
+
+    def _entries(self, path, recursive):
+        prefix = path.lower().rstrip("/") + "/"
+        entries = [_folder_meta(p) for p in sorted(self.s.folders) if p.startswith(prefix) and p != prefix.rstrip("/")]
+        entries += [m for p, m in sorted(self.s.files.items()) if p.startswith(prefix)]
+        if not recursive:
+            depth = prefix.count("/")
+            entries = [e for e in entries if e["path_lower"].count("/") == depth]
+        return entries
+
+    def files_list_folder(self, arg, body):
+        path = arg["path"]
+        if path and path.lower() not in self.s.folders:
+            raise _ApiError("path/not_found", {".tag": "path", "path": {".tag": "not_found"}})
+        entries = self._entries(path, arg.get("recursive", False))
+        out = self._page(entries, "entries", 0)
+        out["cursor"] = json.dumps([path, arg.get("recursive", False), self.PAGE])
+        return out
+
+    def files_list_folder_continue(self, arg, body):
+        path, recursive, start = json.loads(arg["cursor"])
+        out = self._page(self._entries(path, recursive), "entries", start)
+        out["cursor"] = json.dumps([path, recursive, start + self.PAGE])
+        return out
+
+    def files_create_folder_batch(self, arg, body):
+        entries = []
+        for path in arg["paths"]:
+            if path.lower() in self.s.folders:
+                entries.append({".tag": "failure", "failure": {
+                    ".tag": "path", "path": {".tag": "conflict", "conflict": {".tag": "folder"}}}})
+            else:
+                self.s.add_folder(path)
+                entries.append({".tag": "success", "metadata": _folder_meta(path)})
+        return {".tag": "complete", "entries": entries}
+
+    # upload sessions (content endpoints: argument in the Dropbox-API-Arg header)
+    def files_upload_session_start(self, arg, body):
+        sid = uuid.uuid4().hex
+        with self.s.lock:
+            self.s.sessions[sid] = bytearray(body)
+        return {"session_id": sid}
+
+    def files_upload_session_append_v2(self, arg, body):
+        cursor = arg["cursor"]
+        with self.s.lock:
+            data = self.s.sessions[cursor["session_id"]]
+            if cursor["offset"] != len(data):
+                raise _ApiError("incorrect_offset", {".tag": "incorrect_offset", "correct_offset": len(data)})
+            data.extend(body)
+        return None
+
+    def _commit(self, cursor, commit, body=b""):
+        with self.s.lock:
+            data = bytes(self.s.sessions.pop(cursor["session_id"])) + body
+        meta = _file_meta(commit["path"], data)
+        with self.s.lock:
+            self.s.files[meta["path_lower"]] = meta
+        return meta
+
+    def files_upload_session_finish(self, arg, body):
+        return self._commit(arg["cursor"], arg["commit"], body)
+
+    def files_upload_session_finish_batch_v2(self, arg, body):
+        return {"entries": [{**self._commit(e["cursor"], e["commit"]), ".tag": "success"}
+                            for e in arg["entries"]]}
+
+    # sharing
+    def sharing_create_shared_link_with_settings(self, arg, body):
+        path = arg["path"].lower()
+        with self.s.lock:
+            link = self.s.links.get(path)
+            if link is None:
+                self.s.links[path] = _link_meta(arg["path"], f"https://fake.dropbox/s/{uuid.uuid4().hex[:10]}?dl=0")
+                return self.s.links[path]
+        raise _ApiError("shared_link_already_exists", {
+            ".tag": "shared_link_already_exists",
+            "shared_link_already_exists": {".tag": "metadata", "metadata": link}})
+
+    def sharing_revoke_shared_link(self, arg, body):
+        url = arg["url"].split("?", 1)[0]
+        with self.s.lock:
+            for path, link in list(self.s.links.items()):
+                if link["url"].split("?", 1)[0] == url:
+                    del self.s.links[path]
+                    return None
+        raise _ApiError("shared_link_not_found", {".tag": "shared_link_not_found"})
+
+    def sharing_list_shared_links(self, arg, body):
+        links = list(self.s.links.values())
+        if arg.get("path"):
+            links = [l for l in links if l["path_lower"] == arg["path"].lower()]
+        if arg.get("cursor"):
+            return self._page(links, "links", int(arg["cursor"].split(":")[1]))
+        return self._page(links, "links", 0)
+
+
+def _http_response(status, payload):
+    reason = {200: "OK", 429: "Too Many Requests", 404: "Not Found"}.get(status, "Error")
+    body = json.dumps(payload).encode()
+    return (f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n").encode() + body
+
+
+class _Gmail:
+    "handlers for the Gmail endpoints the client uses."
+
+    def __init__(self, state, limiter):
+        self.s = state
+        self.limiter = limiter
+
+    def send(self, payload):
+        with self.s.lock:
+            self.s.messages.append(payload.get("raw", ""))
+            n = len(self.s.messages)
+        return {"id": f"msg{n}", "threadId": f"thr{n}", "labelIds": ["SENT"]}
+
+    def draft(self, payload):
+        with self.s.lock:
+            self.s.drafts.append(payload.get("message", {}).get("raw", ""))
+            n = len(self.s.drafts)
+        return {"id": f"draft{n}", "message": {"id": f"dmsg{n}"}}
+
+    def profile(self):
+        with self.s.lock:
+            return {"emailAddress": "jpe@example.org", "messagesTotal": len(self.s.inbox),
+                    "historyId": str(self.s.history_id)}
+
+    def history(self, query):
+        start = int(query["startHistoryId"][0])
+        label = query.get("labelId", [None])[0]
+        offset = int(query.get("pageToken", ["0"])[0])
+        size = int(query.get("maxResults", ["100"])[0])
+        with self.s.lock:
+            if start < self.s.history_floor:
+                return 404, {"error": {"code": 404, "message": "Requested entity was not found."}}
+            added = [m for m in self.s.inbox.values()
+                     if int(m["historyId"]) > start and (label is None or label in m["labelIds"])]
+            added.sort(key=lambda m: int(m["historyId"]))
+            current = str(self.s.history_id)
+        page = added[offset:offset + size]
+        out = {"historyId": current,
+               "history": [{"id": m["historyId"],
+                            "messagesAdded": [{"message": {k: m[k] for k in ("id", "threadId", "labelIds")}}]}
+                           for m in page]}
+        if offset + size < len(added):
+            out["nextPageToken"] = str(offset + size)
+        return 200, out
+
+    def list_messages(self, query):
+        labels = query.get("labelIds", [])
+        offset = int(query.get("pageToken", ["0"])[0])
+        size = int(query.get("maxResults", ["100"])[0])
+        with self.s.lock:
+            found = [{"id": m["id"], "threadId": m["threadId"]} for m in self.s.inbox.values()
+                     if all(label in m["labelIds"] for label in labels)]
+        out = {"messages": found[offset:offset + size], "resultSizeEstimate": len(found)}
+        if offset + size < len(found):
+            out["nextPageToken"] = str(offset + size)
+        return 200, out
+
+    def get_message(self, mid, query):
+        with self.s.lock:
+            m = self.s.inbox.get(mid)
+        if m is None:
+            return 404, {"error": {"code": 404, "message": "Requested entity was not found."}}
+        wanted = {h.lower() for h in query.get("metadataHeaders", [])}
+        headers = [h for h in m["payload"]["headers"] if not wanted or h["name"].lower() in wanted]
+        return 200, dict(m, payload={"headers": headers})
+
+    def route(self, method, path, payload, query=None):
+        query = query or {}
+        if method == "POST" and path.endswith("/messages/send"):
+            return 200, self.send(payload)
+        if method == "POST" and path.endswith("/drafts"):
+            return 200, self.draft(payload)
+        if method == "GET" and path.endswith("/profile"):
+            return 200, self.profile()
+        if method == "GET" and path.endswith("/history"):
+            return self.history(query)
+        if method == "GET" and path.endswith("/messages"):
+            return self.list_messages(query)
+        if method == "GET" and "/messages/" in path:
+            return self.get_message(path.rsplit("/", 1)[-1], query)
+        return 404, {"error": {"code": 404, "message": f"no fake for {method} {path}"}}
+
+    def batch(self, content_type, body):
+        "answer a multipart/mixed batch; rate limiting applies per part."
+        msg = BytesParser(policy=HTTP).parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode() + body)
+        boundary = "batch_" + uuid.uuid4().hex
+        out = []
+        for part in msg.iter_parts():
+            inner = part.get_payload(decode=True)
+            head, _, inner_body = inner.partition(b"\r\n\r\n")
+            method, target = head.split(b"\r\n", 1)[0].decode().split(" ")[:2]
+            payload = json.loads(inner_body) if inner_body.strip() else {}
+            if self.limiter.admit():
+                url = urlsplit(target)
+                status, result = self.route(method, url.path, payload, parse_qs(url.query))
+            else:
+                status, result = 429, {"error": {"code": 429, "message": "Rate Limit Exceeded",
+                                                 "status": "RESOURCE_EXHAUSTED"}}
+            cid = part["Content-ID"].strip("<>")
+            out.append(f"--{boundary}\r\nContent-Type: application/http\r\n"
+                       f"Content-ID: <response-{cid}>\r\n\r\n".encode() + _http_response(status, result) + b"\r\n")
+        out.append(f"--{boundary}--\r\n".encode())
+        return f"multipart/mixed; boundary={boundary}", b"".join(out)
+
+
+class FakeServer:
+    """
+    Fake Dropbox + Gmail server on 127.0.0.1.
+
+        with FakeServer(latency=0.02, rate=100) as srv:
+            srv.state.add_file_request(...)
+            ... srv.url ...
+    """
+
+    def __init__(self, latency=0.0, rate=0, gmail_rate=None, port=0):
+        self.latency = latency
+        self.state = FakeState()
+        self.dropbox = _Dropbox(self.state)
+        self.dropbox_limiter = _RateLimiter(rate)
+        self.gmail = _Gmail(self.state, _RateLimiter(rate if gmail_rate is None else gmail_rate))
+        self.requests = 0
+        self.faults = {}  # dropbox endpoint -> [(status, retry_after), ...] answered before the real handler
+        self.revoked = set()  # bearer tokens answered with 401
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._httpd.server_port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def fail(self, endpoint, status, times=1, retry_after=0):
+        """
+        answer the next `times` calls of the Dropbox `endpoint` (e.g.
+        "sharing/create_shared_link_with_settings") with HTTP `status`
+        (401, 429 with `retry_after`, or 5xx) instead of handling them.
+        """
+        with self.state.lock:
+            self.faults.setdefault(endpoint, []).extend([(status, retry_after)] * times)
+
+    def revoke(self, token):
+        "answer every Dropbox call made with access token `token` with 401."
+        with self.state.lock:
+            self.revoked.add(token)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _handler(server):
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body, content_type="application/json", headers=()):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for k, v in headers:
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                server.requests += 1
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                if server.latency:
+                    time.sleep(server.latency)
+                path = urlsplit(self.path).path
+                if path.startswith("/2/"):
+                    self._dropbox(path[3:], body)
+                elif path == "/batch" or path.startswith("/batch/"):
+                    ctype, out = server.gmail.batch(self.headers["Content-Type"], body)
+                    self._send(200, out, ctype)
+                elif path.startswith("/gmail/"):
+                    if not server.gmail.limiter.admit():
+                        return self._send(429, json.dumps({"error": {"code": 429, "message": "Rate Limit Exceeded"}}).encode(),
+                                          headers=[("Retry-After", "1")])
+                    status, out = server.gmail.route("POST", path, json.loads(body or b"{}"))
+                    self._send(status, json.dumps(out).encode())
+                else:
+                    self._send(404, b'{"error": "not found"}')
+
+            def do_GET(self):
+                server.requests += 1
+                if server.latency:
+                    time.sleep(server.latency)
+                url = urlsplit(self.path)
+                if not url.path.startswith("/gmail/"):
+                    return self._send(404, b'{"error": "not found"}')
+                if not server.gmail.limiter.admit():
+                    return self._send(429, json.dumps({"error": {"code": 429, "message": "Rate Limit Exceeded"}}).encode(),
+                                      headers=[("Retry-After", "1")])
+                status, out = server.gmail.route("GET", url.path, {}, parse_qs(url.query))
+                self._send(status, json.dumps(out).encode())
+
+            def _dropbox(self, endpoint, body):
+                if not server.dropbox_limiter.admit():
+                    err = {"error_summary": "too_many_requests/",
+                           "error": {"reason": {".tag": "too_many_requests"}, "retry_after": 1}}
+                    return self._send(429, json.dumps(err).encode(), headers=[("Retry-After", "1")])
+                bearer = self.headers.get("Authorization", "").partition("Bearer ")[2]
+                with server.state.lock:
+                    queued = server.faults.get(endpoint)
+                    fault = queued.pop(0) if queued else None
+                    if fault is None and bearer in server.revoked:
+                        fault = (401, 0)
+                if fault is not None:
+                    return self._fault(*fault)
+                handler = getattr(server.dropbox, endpoint.replace("/", "_"), None)
+                if handler is None:
+                    return self._send(400, f"no fake for {endpoint}".encode(), "text/plain")
+                header_arg = self.headers.get("Dropbox-API-Arg")
+                if header_arg is not None:
+                    arg, data = json.loads(header_arg), body
+                else:
+                    arg, data = (json.loads(body) if body.strip() else {}), b""
+                try:
+                    out = handler(arg or {}, data)
+                except _ApiError as e:
+                    err = {"error_summary": f"{e.tag}/..", "error": e.error}
+                    return self._send(409, json.dumps(err).encode())
+                self._send(200, json.dumps(out).encode())
+
+            def _fault(self, status, retry_after):
+                if status == 429:
+                    err = {"error_summary": "too_many_requests/",
+                           "error": {"reason": {".tag": "too_many_requests"}, "retry_after": retry_after}}
+                    return self._send(429, json.dumps(err).encode(), headers=[("Retry-After", str(retry_after))])
+                if status == 401:
+                    err = {"error_summary": "invalid_access_token/", "error": {".tag": "invalid_access_token"}}
+                    return self._send(401, json.dumps(err).encode())
+                self._send(status, b"injected failure", "text/plain")
+
+        return Handler
+
+
+class _RedirectAdapter(HTTPAdapter):
+    def __init__(self, base_url, **kwargs):
+        self.base_url = base_url.rstrip("/")
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        parts = urlsplit(request.url)
+        request.url = self.base_url + parts.path + (f"?{parts.query}" if parts.query else "")
+        return super().send(request, **kwargs)
+
+
+def redirect_session(session, base_url, pool_size=16):
+    "send every https request of a requests.Session to `base_url` instead."
+    session.mount("https://", _RedirectAdapter(base_url, pool_connections=pool_size, pool_maxsize=pool_size))
+    return session
+
+
+class RedirectHttp(httplib2.Http):
+    "httplib2.Http that sends every request to `base_url` instead of the real host."
+
+    def __init__(self, base_url, **kwargs):
+        self.base_url = base_url.rstrip("/")
+        super().__init__(**kwargs)
+
+    def request(self, uri, method="GET", body=None, headers=None, *args, **kwargs):
+        parts = urlsplit(uri)
+        uri = self.base_url + parts.path + (f"?{parts.query}" if parts.query else "")
+        return super().request(uri, method, body, headers, *args, **kwargs)
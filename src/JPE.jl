@@ -41,7 +41,12 @@ using MD5
 using Random
 using CategoricalArrays
 
-global dbox_token = ""
+# `nothing` makes the python layer fetch (and cache) a token on the first Dropbox call;
+# dbox_set_token() pins one explicitly.
+global dbox_token = nothing
+
+# the python package src/jpe_py; its submodules load on first use
+const jpy = PyNULL()
 
 
 # Write your package code here.
@@ -66,10 +71,34 @@ export ps
 export db_df, db_filter_paper
 
 
-function dbox_set_token()
-    global dbox_token = dbox_refresh_token()
+function dbox_set_token(; force::Bool = false)
+    global dbox_token = dbox_refresh_token(force = force)
+end
+
+"""
+    py_metrics(; reset = false)
+
+Timings of the python Dropbox/Gmail layer since startup (or the last reset), one row per
+operation or API endpoint, slowest in total first. See `src/jpe_py/metrics.py`.
+"""
+function py_metrics(; reset::Bool = false)
+    m = jpy.get_metrics(reset = reset)
+    df = DataFrame(name = collect(keys(m)))
+    for col in ["calls", "retries", "bytes", "total_s", "mean_s", "p50_s", "p95_s", "max_s"]
+        df[!, col] = [something(m[n][col], missing) for n in df.name]
+    end
+    df.errors = [join(["$k=$v" for (k, v) in m[n]["errors"]], ", ") for n in df.name]
+    sort!(df, :total_s, rev = true)
 end
 
+"""
+    py_dump_metrics(label = nothing)
+
+Append a snapshot of `py_metrics` to the JSON-lines file `\$JPE_DB/python_metrics.jsonl`
+(or `\$JPE_METRICS_FILE`).
+"""
+py_dump_metrics(label = nothing) = jpy.dump_metrics(label = label)
+
 # Global persistent database connection
 # These are Refs so they are set at __init__ time (runtime), NOT baked into the
 # precompile cache. Using const String values here caused DB_PATH to be frozen
@@ -119,13 +148,10 @@ function __init__()
     JPE_DB[] = ENV["JPE_DB"]
     DB_PATH[] = joinpath(ENV["JPE_DB"], "jpe.duckdb")
 
-    # include two python modules
-    # 1. dropbox API
-    @pyinclude(joinpath(@__DIR__,"db_filerequests.py"))
-    dbox_set_token()
-
-    # 2. gmail API
-    @pyinclude(joinpath(@__DIR__,"gmail_client.py"))
+    # python layer (dropbox, gmail, metrics). Importing the package loads neither
+    # SDK and makes no network call: see src/jpe_py/__init__.py
+    pushfirst!(PyVector(pyimport("sys")."path"), @__DIR__)
+    copy!(jpy, pyimport("jpe_py"))
 
     # verify gh CLI is authenticated as the JPE account
     gh_check_auth()
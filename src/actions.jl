@@ -63,6 +63,10 @@ this happens after authors submitted their packages via file request link
 function dispatch()
     rows = db_filter_status("author_back_de")
 
+    # one listing of all shared links, so the link lookups below are served locally;
+    # package sizes are looked up per dispatched paper (`dbox_get_folder_size`)
+    nrow(rows) > 0 && dbox_warm_link_cache(dbox_token)
+
     # p = papers
     for r in eachrow(rows)
         cid = case_id(r.journal,r.surname_of_author,r.paper_id,r.round)
@@ -501,7 +505,13 @@ function assign_replicators(paperID, selection)
         end
         
         # Get submission time from Dropbox and update
-        submit_time = dbox_fr_submit_time(dbox_token, current_iteration.file_request_path)
+        submit_time = try
+            dbox_fr_submit_time(dbox_token, current_iteration.file_request_path)
+        catch e
+            dbox_error_kind(e) == "not_found" || rethrow()
+            @warn "No upload folder at $(current_iteration.file_request_path); arrival date not set"
+            nothing
+        end
         if !isnothing(submit_time)
             DBInterface.execute(con, """
             UPDATE iterations
@@ -706,14 +716,22 @@ function dispatch_remote_replication(paperID; deadline_days::Int = 20)
     caseID = case_id(r.journal, r.surname_of_author, paperID, r.round)
 
     # --- upload link: create once, reset deadline in place on repeat dispatches ---
-    upload_id, upload_url = if ismissing(iter.replicator_upload_id)
+    new_upload_request() = begin
         dest = joinpath(get_dbox_loc(r.journal, r.paper_slug, r.round), "replicator-upload")
         fr = dbox_create_file_request(dest, "$caseID results upload", dbox_token; deadline_days = deadline_days)
-        isnothing(fr) && error("Failed to create upload file request for $paperID")
         fr["id"], fr["url"]
+    end
+    upload_id, upload_url = if ismissing(iter.replicator_upload_id)
+        new_upload_request()
     else
-        dbox_update_fr_deadline(iter.replicator_upload_id, dbox_token, deadline_days)
-        iter.replicator_upload_id, iter.replicator_upload_url
+        try
+            dbox_update_fr_deadline(iter.replicator_upload_id, dbox_token, deadline_days)
+            iter.replicator_upload_id, iter.replicator_upload_url
+        catch e
+            # the request was deleted on Dropbox: make a new one
+            dbox_error_kind(e) == "not_found" || rethrow()
+            new_upload_request()
+        end
     end
 
     # --- download link: revoke + recreate to reset expiry (shared links have no update-in-place) ---
@@ -1115,6 +1133,19 @@ function delete_dropbox_paper(paperID; round = nothing, dryrun = true)
     end
 
     delete_location(locallocs,dryrun = dryrun )
+
+    # the file requests of deleted rounds point to folders that are gone: remove them in bulk
+    iters = db_filter_iteration(paperID)
+    isnothing(round) || subset!(iters, :round => ByRow(==(round)))
+    fr_ids = unique(collect(skipmissing(vcat(iters.file_request_id_pkg, iters.file_request_id_paper, iters.replicator_upload_id))))
+    if dryrun
+        @info "would delete $(length(fr_ids)) file requests"
+    elseif !isempty(fr_ids)
+        res = dbox_delete_file_requests(fr_ids, dbox_token)
+        for (id, outcome) in res
+            outcome in ("deleted", "not_found") || @warn "could not delete file request $id: $outcome"
+        end
+    end
 end
 
 
@@ -1341,7 +1372,7 @@ function prepare_rnrs(paperID)
 end
 
 
-function monitor_file_requests()
+function monitor_file_requests(; dump_metrics::Bool = false)
     # Filter papers for status "with_author" or "new_arrival"
     i = @chain db_df("papers") begin
         subset(:status => ByRow(.∈(Ref(["with_author","new_arrival"]))))
@@ -1358,19 +1389,23 @@ function monitor_file_requests()
     pap_waiting = NamedTuple[]
 
     @info "checking packages..."
+    # one listing for all file requests, kept in the file_request_state table
+    dbox_sync_file_request_state()
+    fr_status = dbox_fr_state(vcat(i.file_request_id_pkg, i.file_request_id_paper))
+
     for r in eachrow(i)
         try
             # Get file_request id and check whether arrived
             println("  📦 $(r.paper_slug)")
 
-            if dbox_fr_arrived(dbox_token, r.file_request_id_pkg)["file_count"] > 0
+            if fr_status[r.file_request_id_pkg]["file_count"] > 0
                 push!(pkg_arrived, (journal = r.journal, paper_id = r.paper_id, round = r.round, slug = r.paper_slug))
                 println("File request arrived! ✅")
             else
                 push!(pkg_waiting, (journal = r.journal, paper_id = r.paper_id, round = r.round, slug = r.paper_slug))
             end
 
-            if dbox_fr_arrived(dbox_token, r.file_request_id_paper)["file_count"] > 0
+            if fr_status[r.file_request_id_paper]["file_count"] > 0
                 push!(pap_arrived, (journal = r.journal, paper_id = r.paper_id, round = r.round, slug = r.paper_slug))
             else
                 push!(pap_waiting, (journal = r.journal, paper_id = r.paper_id, round = r.round, slug = r.paper_slug))
@@ -1380,6 +1415,22 @@ function monitor_file_requests()
         end
     end
     
+    # exact arrival times from the dropbox change feed: earliest upload per package
+    # the feed cursor is saved only after all arrivals are written, so no event is lost
+    arrival_times = Dict{Tuple{String,Int},DateTime}()
+    feed_cursor = nothing
+    try
+        events, feed_cursor = dbox_upload_events(dbox_token)
+        for ev in events
+            ev["folder"] == "replication-package" || continue
+            k = (ev["paper_slug"], ev["round"])
+            arrival_times[k] = min(get(arrival_times, k, ev["server_modified"]), ev["server_modified"])
+        end
+    catch e
+        @warn "Could not read dropbox change feed, using today as arrival date: $e"
+    end
+    all_written = true
+
     waiting = DataFrame(pkg_waiting)
     papwaiting = DataFrame(pap_waiting)
     arrived = DataFrame(pkg_arrived)
@@ -1407,8 +1458,7 @@ function monitor_file_requests()
                 
                 update_paper_status(a.paper_id, "with_author", "author_back_de") do con
                     # Update iterations table with arrival date
-                    # submit_time = dbox_fr_submit_time(dbox_token, iter.file_request_path)
-                    submit_time = today()
+                    submit_time = get(arrival_times, (a.slug, a.round), today())
                     if !isnothing(submit_time)
                         DBInterface.execute(con, """
                         UPDATE iterations
@@ -1420,6 +1470,7 @@ function monitor_file_requests()
                     return a
                 end
             catch e
+                all_written = false
                 @warn "Error updating status for $(a.paper_id): $e"
             end
         end
@@ -1427,6 +1478,11 @@ function monitor_file_requests()
         @info "No file request arrived ❌"
     end
 
+    if !isnothing(feed_cursor) && all_written
+        dbox_save_upload_cursor(feed_cursor)
+    end
+    dump_metrics && py_dump_metrics("monitor_file_requests")
+
     return Dict(:waiting => waiting, :arrived => arrived, :remindJO => df_reminders) 
 end
 
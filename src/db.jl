@@ -716,6 +716,43 @@ function db_get_table_schema(table::String)
             "repl_comments" => Dict(:type => "VARCHAR", :constraints => ""),
             "comments" => Dict(:type => "VARCHAR", :constraints => ""),
             "_primary_key" => Dict(:columns => ["paper_id", "round"])
+        ),
+        "file_request_state" => Dict(
+            "file_request_id" => Dict(:type => "VARCHAR", :constraints => ""),
+            "title" => Dict(:type => "VARCHAR", :constraints => ""),
+            "destination" => Dict(:type => "VARCHAR", :constraints => ""),
+            "journal" => Dict(:type => "VARCHAR", :constraints => ""),
+            "paper_id" => Dict(:type => "VARCHAR", :constraints => ""),
+            "round" => Dict(:type => "INTEGER", :constraints => ""),
+            "folder" => Dict(:type => "VARCHAR", :constraints => ""),
+            "file_count" => Dict(:type => "INTEGER", :constraints => ""),
+            "is_open" => Dict(:type => "BOOLEAN", :constraints => ""),
+            "deadline" => Dict(:type => "TIMESTAMP", :constraints => ""),
+            "created" => Dict(:type => "TIMESTAMP", :constraints => ""),
+            "state_hash" => Dict(:type => "VARCHAR", :constraints => ""),
+            "changed_at" => Dict(:type => "TIMESTAMP", :constraints => ""),
+            "last_synced_at" => Dict(:type => "TIMESTAMP", :constraints => ""),
+            "_primary_key" => Dict(:columns => ["file_request_id"])
+        ),
+        "email_replies" => Dict(
+            "message_id" => Dict(:type => "VARCHAR", :constraints => ""),
+            "thread_id" => Dict(:type => "VARCHAR", :constraints => ""),
+            "paper_id" => Dict(:type => "VARCHAR", :constraints => ""),
+            "round" => Dict(:type => "INTEGER", :constraints => ""),
+            "role" => Dict(:type => "VARCHAR", :constraints => ""),
+            "matched_by" => Dict(:type => "VARCHAR", :constraints => ""),
+            "from_address" => Dict(:type => "VARCHAR", :constraints => ""),
+            "subject" => Dict(:type => "VARCHAR", :constraints => ""),
+            "snippet" => Dict(:type => "VARCHAR", :constraints => ""),
+            "received_at" => Dict(:type => "TIMESTAMP", :constraints => ""),
+            "synced_at" => Dict(:type => "TIMESTAMP", :constraints => ""),
+            "_primary_key" => Dict(:columns => ["message_id"])
+        ),
+        "gmail_sync" => Dict(
+            "mailbox" => Dict(:type => "VARCHAR", :constraints => ""),
+            "history_id" => Dict(:type => "VARCHAR", :constraints => ""),
+            "synced_at" => Dict(:type => "TIMESTAMP", :constraints => ""),
+            "_primary_key" => Dict(:columns => ["mailbox"])
         )
     )
     
@@ -1,499 +0,0 @@
-import dropbox
-from dropbox import Dropbox
-from dropbox.file_requests import CreateFileRequestArgs
-from dropbox.sharing import RequestedVisibility, SharedLinkSettings
-from dropbox.files import FileMetadata
-from datetime import datetime, timedelta, timezone
-
-import os
-import requests
-
-# Load secrets from environment variables
-APP_KEY = os.environ["JPE_DBOX_APP"]
-APP_SECRET = os.environ["JPE_DBOX_APP_SECRET"]
-REFRESH_TOKEN = os.environ["JPE_DBOX_APP_REFRESH"]
-
-def refresh_token():
-    url = "https://api.dropbox.com/oauth2/token"
-    response = requests.post(
-        url,
-        auth=(APP_KEY, APP_SECRET),
-        data={
-            "grant_type": "refresh_token",
-            "refresh_token": REFRESH_TOKEN
-        }
-    )
-    response.raise_for_status()
-    return response.json()["access_token"]
-
-def get_user_info(token):
-        dbx = Dropbox(token)
-        return dbx.users_get_current_account()
-
-
-def get_link_at_path(path, token, expiry_days=None):
-    "get a shareable link for local path /Apps/JPE-packages/path"
-
-    dbx = Dropbox(token)
-
-    expires = datetime.now(timezone.utc) + timedelta(days=expiry_days) if expiry_days is not None else None
-
-    try:
-        # Create settings with 'public' visibility (default for shared links)
-        settings = SharedLinkSettings(
-            requested_visibility=RequestedVisibility.public,
-            expires=expires
-        )
-
-        # Attempt to create a new shared link
-        link = dbx.sharing_create_shared_link_with_settings(path, settings)
-        print("Public shared link:", link.url)
-        return link.url
-
-    except (dropbox.exceptions.ApiError, Exception) as e:
-        # If a link already exists, return it.
-        # Two cases:
-        #   1. ApiError with is_shared_link_already_exists() — normal SDK path
-        #   2. stone ValidationError("shared_link_already_exists: missing '.tag' key") —
-        #      SDK deserialization bug on some API versions; detect by message string.
-        is_already_exists = (
-            (isinstance(e, dropbox.exceptions.ApiError)
-             and isinstance(e.error, dropbox.sharing.CreateSharedLinkWithSettingsError)
-             and e.error.is_shared_link_already_exists())
-            or "shared_link_already_exists" in str(e)
-        )
-        if is_already_exists:
-            # Try to extract URL directly from the error metadata (no extra API call)
-            try:
-                existing = e.error.get_shared_link_already_exists().metadata
-                if existing is not None:
-                    print("Existing shared link (from error metadata):", existing.url)
-                    return existing.url
-            except Exception:
-                pass
-            # Fall back to listing shared links for this path
-            links = dbx.sharing_list_shared_links(path=path, direct_only=True)
-            if links.links:
-                print("Existing shared link (from list):", links.links[0].url)
-                return links.links[0].url
-            else:
-                raise RuntimeError(f"A shared link exists for {path} but could not be retrieved.")
-        else:
-            raise RuntimeError(f"Dropbox API error creating shared link for {path}: {e}")
-
-def create_file_request(token, title: str, destination_path: str, deadline_days=None):
-    """
-    Creates a file request in Dropbox.
-
-    Args:
-        token.
-        title (str): The title of the file request (visible to users).
-        destination_path (str): The Dropbox folder path where uploaded files will be stored.
-        deadline_days (int, optional): if given, sets a deadline that many days from now.
-
-    Returns:
-        the file request objects.
-    """
-    from dropbox.file_requests import FileRequestDeadline
-
-    dbx = Dropbox(token)
-
-    deadline = None
-    if deadline_days is not None:
-        deadline = FileRequestDeadline(
-            deadline=datetime.now(timezone.utc) + timedelta(days=deadline_days),
-            allow_late_uploads=None
-        )
-
-    try:
-        # Create the file request
-        result = dbx.file_requests_create(
-            title=title,
-            destination=destination_path,
-            deadline=deadline
-        )
-        return {'url': result.url, 'id': result.id}
-    except dropbox.exceptions.ApiError as e:
-        print(f"Dropbox API error: {e}")
-        return None
-
-
-def update_file_request_deadline(token, request_id: str, deadline_days):
-    """
-    Reset the deadline on an existing file request, in place (no new id/url).
-
-    Args:
-        token.
-        request_id (str): id of the existing file request.
-        deadline_days (int): new deadline, that many days from now.
-
-    Returns:
-        the updated file request object (dict with 'url', 'id').
-    """
-    from dropbox.file_requests import FileRequestDeadline, UpdateFileRequestDeadline
-
-    dbx = Dropbox(token)
-
-    new_deadline = UpdateFileRequestDeadline.update(
-        FileRequestDeadline(
-            deadline=datetime.now(timezone.utc) + timedelta(days=deadline_days),
-            allow_late_uploads=None
-        )
-    )
-
-    try:
-        result = dbx.file_requests_update(request_id, deadline=new_deadline)
-        return {'url': result.url, 'id': result.id}
-    except dropbox.exceptions.ApiError as e:
-        print(f"Dropbox API error: {e}")
-        return None
-
-def file_request_exists(token, destination_path: str) -> bool:
-    dbx = Dropbox(token)
-
-    result = dbx.file_requests_list_v2()
-    file_requests = result.file_requests
-
-    while result.has_more:
-        result = dbx.file_requests_list_continue(result.cursor)
-        file_requests.extend(result.file_requests)
-
-    return any(fr.destination == destination_path for fr in file_requests)
-
-
-
-def submission_time(token, destination_path):
-    dbx = Dropbox(token)
-
-    try:
-        result = dbx.files_list_folder(destination_path)
-
-        for entry in result.entries:
-            if isinstance(entry, FileMetadata):
-                return entry.server_modified  # First file found
-
-        return None  # No file entries found
-
-    except dropbox.exceptions.ApiError as e:
-        print(f"Dropbox API error: {e}")
-        return None
-    
-
-def check_file_request_submissions(access_token, file_request_id, verbose = False):
-    """
-    Check if files have been submitted to a specific file request
-    
-    Args:
-        access_token (str): Your Dropbox access token
-        file_request_id (str): The ID of the file request
-    
-    Returns:
-        dict: Information about the file request including file count
-    """
-    dbx = dropbox.Dropbox(access_token)
-    
-    try:
-        # Get file request details including file count
-        request_info = dbx.file_requests_get(file_request_id)
-        
-        if verbose:
-            print(f"File Request: {request_info.title}")
-            print(f"Status: {'Open' if request_info.is_open else 'Closed'}")
-            print(f"Files submitted: {request_info.file_count}")
-            print(f"Destination folder: {request_info.destination}")
-        
-        if hasattr(request_info, 'deadline') and request_info.deadline:
-            print(f"Deadline: {request_info.deadline}")
-            
-        return {
-            'title': request_info.title,
-            'file_count': request_info.file_count,
-            'is_open': request_info.is_open,
-            'destination': request_info.destination,
-            'request_info': request_info
-        }
-        
-    except dropbox.exceptions.ApiError as e:
-        print(f"API Error: {e}")
-        return None
-    except Exception as e:
-        print(f"Error: {e}")
-        return None
-
-def monitor_all_file_requests(access_token):
-    """
-    Check submission status for all file requests
-    """
-    dbx = dropbox.Dropbox(access_token)
-    
-    try:
-        # Get list of all file requests
-        file_requests = dbx.file_requests_list()
-        
-        print(f"Found {len(file_requests.file_requests)} file requests:")
-        
-        for request in file_requests.file_requests:
-            print(f"\n--- File Request ---")
-            print(f"Title: {request.title}")
-            print(f"ID: {request.id}")
-            print(f"Status: {'Open' if request.is_open else 'Closed'}")
-            print(f"Files submitted: {request.file_count}")
-            print(f"Destination: {request.destination}")
-            
-            if request.file_count > 0:
-                print(f"✅ Has {request.file_count} submitted files")
-            else:
-                print("❌ No files submitted yet")
-                
-    except dropbox.exceptions.ApiError as e:
-        print(f"API Error: {e}")
-    except Exception as e:
-        print(f"Error: {e}")
-
-import dropbox
-
-def cleanup_file_requests(access_token, request_ids_to_delete):
-    """
-    Delete file requests that are no longer needed
-    
-    Args:
-        access_token (str): Dropbox access token
-        request_ids_to_delete (list): List of file request IDs to delete
-    """
-    if not request_ids_to_delete:
-        return
-        
-    dbx = dropbox.Dropbox(access_token)
-    
-    for request_id in request_ids_to_delete:
-        try:
-            # Get request info first
-            request_info = dbx.file_requests_get(request_id)
-            print(f"🗑️  Deleting file request: '{request_info.title}' (ID: {request_id})")
-
-            # Dropbox refuses to delete an open file request; close it first.
-            if request_info.is_open:
-                dbx.file_requests_update(request_id, open=False)
-
-            # Delete the file request - pass as list
-            dbx.file_requests_delete([request_id])
-            print(f"✅ Successfully deleted file request")
-            
-        except dropbox.exceptions.ApiError as e:
-            print(f"❌ Error deleting file request {request_id}: {e}")
-        except Exception as e:
-            print(f"❌ Unexpected error: {e}")
-
-def monitor_viable_file_requests(access_token, only_open=True, delete=False):
-    """
-    Monitor file requests that are viable and optionally clean up problematic ones
-    
-    Args:
-        access_token (str): Dropbox access token
-        only_open (bool): Only monitor open file requests
-        delete (bool): If True, delete closed requests or requests with missing destination folders
-    
-    Returns:
-        list: List of viable file requests
-    """
-    dbx = dropbox.Dropbox(access_token)
-    
-    try:
-        file_requests = dbx.file_requests_list()
-        viable_requests = []
-        closed_request_ids = []
-        missing_folder_ids = []
-        
-        print(f"📋 Processing {len(file_requests.file_requests)} total file requests...")
-        
-        for request in file_requests.file_requests:
-            request_deleted = False
-            
-            # Check if request is closed
-            if not request.is_open:
-                print(f"🔒 Found closed request: '{request.title}' (ID: {request.id})")
-                closed_request_ids.append(request.id)
-                
-                if delete:
-                    print(f"🗑️  Deleting closed request: '{request.title}'")
-                    try:
-                        dbx.file_requests_delete([request.id])
-                        print(f"✅ Successfully deleted closed request")
-                        request_deleted = True
-                    except Exception as e:
-                        print(f"❌ Error deleting closed request: {e}")
-                elif only_open:
-                    print(f"⏭️  Skipping closed request (only_open=True)")
-                    continue
-            
-            # Skip further checks if request was deleted
-            if request_deleted:
-                continue
-                
-            # Check if destination folder exists (only for non-deleted requests)
-            try:
-                dbx.files_get_metadata(request.destination)
-                # Folder exists, this is a viable request
-                if not only_open or request.is_open:
-                    viable_requests.append(request)
-                    
-            except dropbox.exceptions.ApiError as e:
-                if hasattr(e.error, 'is_path_not_found') and e.error.is_path_not_found():
-                    print(f"📁 Missing destination folder for: '{request.title}' (ID: {request.id})")
-                    missing_folder_ids.append(request.id)
-                    
-                    if delete:
-                        print(f"🗑️  Deleting request with missing folder: '{request.title}'")
-                        try:
-                            dbx.file_requests_delete([request.id])
-                            print(f"✅ Successfully deleted request with missing folder")
-                        except Exception as delete_error:
-                            print(f"❌ Error deleting request with missing folder: {delete_error}")
-                    else:
-                        print(f"⚠️  Skipping request with missing destination folder")
-                elif 'not_found' in str(e).lower() or 'path_not_found' in str(e).lower():
-                    # Alternative check for path not found
-                    print(f"📁 Missing destination folder for: '{request.title}' (ID: {request.id})")
-                    missing_folder_ids.append(request.id)
-                    
-                    if delete:
-                        print(f"🗑️  Deleting request with missing folder: '{request.title}'")
-                        try:
-                            dbx.file_requests_delete([request.id])
-                            print(f"✅ Successfully deleted request with missing folder")
-                        except Exception as delete_error:
-                            print(f"❌ Error deleting request with missing folder: {delete_error}")
-                    else:
-                        print(f"⚠️  Skipping request with missing destination folder")
-                else:
-                    # Some other API error - might still be viable
-                    print(f"⚠️  API warning for '{request.title}': {e}")
-                    if not only_open or request.is_open:
-                        viable_requests.append(request)
-        
-        # Summary of cleanup actions
-        if delete:
-            total_deleted = len(closed_request_ids) + len(missing_folder_ids)
-            if total_deleted > 0:
-                print(f"\n🧹 Cleanup Summary:")
-                print(f"   - Closed requests processed: {len(closed_request_ids)}")
-                print(f"   - Missing folder requests processed: {len(missing_folder_ids)}")
-                print(f"   - Total deletion attempts: {total_deleted}")
-        else:
-            if closed_request_ids or missing_folder_ids:
-                print(f"\n💡 Cleanup Available:")
-                if closed_request_ids:
-                    print(f"   - {len(closed_request_ids)} closed requests could be deleted")
-                if missing_folder_ids:
-                    print(f"   - {len(missing_folder_ids)} requests with missing folders could be deleted")
-                print(f"   - Run with delete=True to clean up automatically")
-        
-        print(f"\n📊 Monitoring {len(viable_requests)} viable file requests:")
-        
-        for request in viable_requests:
-            print(f"\n--- {request.title} ---")
-            print(f"Status: {'🟢 Open' if request.is_open else '🔴 Closed'}")
-            print(f"Files submitted: {request.file_count}")
-            print(f"Destination: {request.destination}")
-            
-            if request.file_count > 0:
-                print(f"✅ Has {request.file_count} submission(s)")
-            else:
-                print("❌ No submissions yet")
-        
-        return viable_requests
-        
-    except Exception as e:
-        print(f"❌ Error: {e}")
-        return []
-
-def create_password_protected_link(path, password, token):
-    """
-    Create a password-protected shared link for a Dropbox path.
-
-    Args:
-        path: Dropbox path (e.g., "/JPE/Surname-12345678/1/replication-package")
-        password: Password to protect the link
-        token: Dropbox access token
-
-    Returns:
-        dict: {'url': str, 'id': str, 'path': str}
-    """
-    dbx = dropbox.Dropbox(token)
-    from dropbox.sharing import SharedLinkSettings, RequestedVisibility
-
-    settings = SharedLinkSettings(
-        requested_visibility=RequestedVisibility.password,
-        link_password=password
-    )
-
-    try:
-        link = dbx.sharing_create_shared_link_with_settings(path, settings)
-        return {
-            'url': link.url,
-            'id': link.url,
-            'path': link.path_lower
-        }
-    except dropbox.exceptions.ApiError as e:
-        if hasattr(e.error, 'is_shared_link_already_exists') and e.error.is_shared_link_already_exists():
-            existing_link = e.error.get_shared_link_already_exists().metadata
-            dbx.sharing_revoke_shared_link(existing_link.url)
-            link = dbx.sharing_create_shared_link_with_settings(path, settings)
-            return {
-                'url': link.url,
-                'id': link.url,
-                'path': link.path_lower
-            }
-        else:
-            raise
-
-
-def revoke_shared_link(url, token):
-    """
-    Revoke a Dropbox shared link.
-
-    Args:
-        url: The shared link URL to revoke
-        token: Dropbox access token
-    """
-    dbx = dropbox.Dropbox(token)
-    dbx.sharing_revoke_shared_link(url)
-
-
-def upload_text(path, text, token):
-    """Upload a UTF-8 string to a Dropbox path, overwriting if it exists. For testing only."""
-    from dropbox.files import WriteMode
-    dbx = dropbox.Dropbox(token)
-    dbx.files_upload(text.encode('utf-8'), path, mode=WriteMode.overwrite)
-
-
-def download_via_password_link(url, password, token):
-    """
-    Download file content from a password-protected Dropbox shared link.
-    Uses sharing_get_shared_link_file which accepts link_password directly.
-    Returns the file content as bytes.
-    """
-    dbx = dropbox.Dropbox(token)
-    metadata, response = dbx.sharing_get_shared_link_file(url=url, link_password=password)
-    return response.content
-
-
-def delete_dropbox_path(path, token):
-    """Delete a file or folder at a Dropbox path. For testing only."""
-    dbx = dropbox.Dropbox(token)
-    dbx.files_delete_v2(path)
-
-
-# Usage examples:
-#
-# # Just monitor (default behavior)
-# viable_requests = monitor_viable_file_requests(access_token)
-# 
-# # Monitor and automatically delete closed/problematic requests
-# viable_requests = monitor_viable_file_requests(access_token, delete=True)
-# 
-# # Monitor all requests (including closed ones) but don't delete
-# all_viable = monitor_viable_file_requests(access_token, only_open=False, delete=False)
-# 
-# # Monitor all requests and clean up problematic ones
-# cleaned_requests = monitor_viable_file_requests(access_token, only_open=False, delete=True)
\ No newline at end of file
@@ -2,70 +2,94 @@
 
 dbox_arrivals() = joinpath(dropbox(), "package-arrivals")
 
-dbox_refresh_token() = py"refresh_token"()
-dbox_get_user(to) = py"get_user_info"(to)
+dbox_refresh_token(; force::Bool = false) = jpy.refresh_token(force = force)
+dbox_get_user(to) = jpy.get_user_info(to)
+
+# The dbox_* wrappers call the python layer directly: it refreshes an expired token,
+# waits out rate limits and retries transient errors itself (see the retry policy in
+# jpe_py/db_filerequests.py), and raises a DropboxError once a call has failed for good.
+
+"""
+    dbox_error_kind(e)
+
+The kind of a Dropbox error caught from a `dbox_*` call: `"auth"`, `"rate_limit"`,
+`"transient"`, `"not_found"`, `"permanent"` or `"unavailable"` (circuit open after
+repeated failures), or `nothing` if `e` is not a Dropbox error.
 
-function dbox_link_at_path(path, dbox_token; expiry::Union{Int,Nothing}=nothing)
     try
-        py"get_link_at_path"(path, dbox_token, expiry_days=expiry)
-    catch e1
-        try
-            @error "$e1"
-            @info "refreshing dropbox token"
-            dbox_set_token()
-            py"get_link_at_path"(path, dbox_token, expiry_days=expiry)
-        catch e2
-            throw(e2)
-        end
+        dbox_revoke_link(url, dbox_token)
+    catch e
+        dbox_error_kind(e) == "not_found" || rethrow()
     end
+"""
+function dbox_error_kind(e)
+    e isa PyCall.PyError || return nothing
+    pyisinstance(e.val, jpy.DropboxError) || return nothing
+    return e.val.kind
 end
 
-function dbox_create_file_request(dest,title,token; deadline_days::Union{Int,Nothing}=nothing)
-    try
-        py"create_file_request"(token,title,dest,deadline_days=deadline_days)
-    catch e1
-        try
-            @error "$e1"
-            @info "refreshing dropbox token"
-            dbox_set_token()
-            py"create_file_request"(token,title,dest,deadline_days=deadline_days)
-        catch e2
-            throw(e2)
-        end
-    end
+function dbox_link_at_path(path, dbox_token; expiry::Union{Int,Nothing}=nothing)
+    jpy.get_link_at_path(path, dbox_token, expiry_days=expiry)
+end
+
+"""
+    dbox_warm_link_cache(token)
 
+Fill the shared link cache used by `dbox_link_at_path` from one listing of all our shared links.
+"""
+dbox_warm_link_cache(token) = jpy.warm_link_cache(token)
+
+function dbox_create_file_request(dest,title,token; deadline_days::Union{Int,Nothing}=nothing)
+    jpy.create_file_request(token,title,dest,deadline_days=deadline_days)
 end
 
+"""
+    dbox_create_file_requests(specs, token)
+
+Create many file requests at once; `specs` are `(title, dest)` or `(title, dest, deadline_days)`
+tuples. Folders are created in one batch call and the requests concurrently, with back-off on
+rate limiting. Returns one `Dict("title", "destination", "id", "url", "error")` per spec, in order;
+`"error"` is `nothing` on success.
+"""
+dbox_create_file_requests(specs, token) = jpy.create_file_requests_bulk(collect(specs), token)
+
 function dbox_update_fr_deadline(id, token, deadline_days::Int)
-    try
-        py"update_file_request_deadline"(token,id,deadline_days)
-    catch e1
-        try
-            @error "$e1"
-            @info "refreshing dropbox token"
-            dbox_set_token()
-            py"update_file_request_deadline"(token,id,deadline_days)
-        catch e2
-            throw(e2)
-        end
-    end
+    jpy.update_file_request_deadline(token,id,deadline_days)
 end
 
-function dbox_delete_file_request(id, token)
-    try
-        py"cleanup_file_requests"(token,[id])
-    catch e1
-        try
-            @error "$e1"
-            @info "refreshing dropbox token"
-            dbox_set_token()
-            py"cleanup_file_requests"(token,[id])
-        catch e2
-            throw(e2)
-        end
+dbox_delete_file_request(id, token) = jpy.cleanup_file_requests(token,[id])
+
+"""
+    dbox_run_many(op, args; max_workers = 8)
+
+Run the python dropbox operation `op` (e.g. `"get_link_at_path"`) once per entry of `args`,
+concurrently. Rate-limited calls are retried with back-off. Returns a vector of
+`Dict("result" => ..., "error" => ..., "kind" => ...)` in the order of `args`; `"kind"` is
+`nothing` on success, else as for `dbox_error_kind`.
+"""
+function dbox_run_many(op, args; max_workers::Int = 8)
+    jpy.run_many(op, collect(args), max_workers = max_workers)
+end
+
+"""
+Shareable links for many dropbox paths at once. Paths that failed give `nothing` and a warning.
+"""
+function dbox_links_at_paths(paths, dbox_token; expiry::Union{Int,Nothing}=nothing)
+    res = dbox_run_many("get_link_at_path", [Dict("path" => p, "token" => dbox_token, "expiry_days" => expiry) for p in paths])
+    map(zip(paths, res)) do (p, r)
+        isnothing(r["error"]) || @warn "could not get link for $p: $(r["error"])"
+        r["result"]
     end
 end
 
+"""
+    dbox_delete_file_requests(ids, token)
+
+Close and delete many file requests with a handful of API calls.
+Returns `Dict(id => "deleted" | "not_found" | error message)`.
+"""
+dbox_delete_file_requests(ids, token) = jpy.cleanup_file_requests(token,collect(ids))
+
 function dbox_check_fr_pkg(journal,paperid,author,round)
     d = joinpath(ENV["JPE_DBOX_APPS"],journal,author * "-" * paperid,round,"replication-package")
     readdir(d)
@@ -76,30 +100,75 @@ function dbox_check_fr_paper(journal,paperid,author,round)
     readdir(d)
 end
 
+"""
+Time of the first file uploaded to `dest`, or `nothing` if it has none yet. Throws if the
+folder does not exist (`dbox_error_kind(e) == "not_found"`).
+"""
 function dbox_fr_submit_time(token,dest)
-    py"submission_time"(token,dest)
+    jpy.submission_time(token,dest)
 end
 
 function dbox_fr_exists(token,dest)
-    py"file_request_exists"(token,dest)
+    jpy.file_request_exists(token,dest)
 end
 
 function dbox_fr_arrived(token,id)
-    py"check_file_request_submissions"(token, id)
+    jpy.check_file_request_submissions(token, id)
+end
+
+"""
+Status of many file requests from a single listing: `Dict(id => Dict("file_count", "is_open", "destination", "deadline"))`.
+Ids unknown to dropbox map to `nothing`.
+"""
+function dbox_fr_arrived_bulk(token,ids)
+    jpy.check_file_requests_bulk(token, collect(ids))
+end
+
+"""
+    dbox_use_async(enable = true)
+
+Serve `get_link_at_path`, `check_file_request_submissions`, `submission_time` and
+`create_file_request` from the async HTTP backend in `jpe_py/dropbox_async.py` (needs the
+python package `httpx`). Call sites are unchanged; `enable = false` switches back.
+"""
+dbox_use_async(enable::Bool = true) = jpy.use_async_backend(enable)
+
+"""
+    dbox_fr_status_async(token, ids)
+
+Like `dbox_fr_arrived_bulk`, but all requests in flight at once on the async backend.
+Returns one `Dict("result", "error", "kind")` per id; unknown ids fail with kind `"not_found"`.
+"""
+dbox_fr_status_async(token, ids) = jpy.check_file_requests_async(token, collect(ids))
+
+"""
+    dbox_upload_events(token; wait = false)
+
+Files uploaded to any replication-package, paper-appendices or replicator-upload folder
+since the saved cursor, with their real upload time in `"server_modified"`. Returns
+`(events, cursor)`; the cursor is not moved until `dbox_save_upload_cursor(cursor)`, so call
+that once the events are stored. See `read_changes` in `jpe_py/db_filerequests.py`.
+"""
+function dbox_upload_events(token; wait::Bool = false)
+    changes = jpy.read_changes(token, wait = wait)
+    changes["events"], changes["cursor"]
 end
 
+"Move the upload change feed past the events returned with `cursor` by `dbox_upload_events`."
+dbox_save_upload_cursor(cursor) = jpy.save_cursor(cursor)
+
 """
-Show the file requests and their status for all iterations of a given paper
+Show the file requests and their status for all iterations of a given paper, from the
+`file_request_state` table; `sync = false` skips refreshing it from Dropbox first.
 """
-function dbox_fr_paper(paperID)
+function dbox_fr_paper(paperID; sync::Bool = true)
+    sync && dbox_sync_file_request_state()
     i = @chain db_filter_iteration(paperID) begin
         select(:round, r"file_request_id")
         stack(Not(:round))
     end
-    i.submitted_files .= 0
-    for r in eachrow(i)
-        r.submitted_files = dbox_fr_arrived(dbox_token, r.value)["file_count"]
-    end
+    state = dbox_fr_state(i.value)
+    i.submitted_files = [haskey(state, v) ? state[v]["file_count"] : missing for v in i.value]
     println()
     @info "--- paper $paperID file requests status ----"
     i
@@ -141,124 +210,146 @@ function dbox_ensure_downloaded(filepath)
     end
 end
 
-function dbox_upload_text(path, text, token)
-    try
-        py"upload_text"(path, text, token)
-    catch e1
-        try
-            @error "$e1"
-            @info "refreshing dropbox token"
-            dbox_set_token()
-            py"upload_text"(path, text, token)
-        catch e2
-            throw(e2)
-        end
-    end
-end
+dbox_upload_text(path, text, token) = jpy.upload_text(path, text, token)
+
+"""
+    dbox_upload_file(local_path, path, token)
+
+Upload a local file of any size to dropbox `path` in chunks. A failed upload is resumed
+on the next call with the same arguments.
+"""
+dbox_upload_file(local_path, path, token) = jpy.upload_file(local_path, path, token)
 
 function dbox_download_via_password_link(url, password, token)
-    try
-        py"download_via_password_link"(url, password, token)
-    catch e1
-        try
-            @error "$e1"
-            @info "refreshing dropbox token"
-            dbox_set_token()
-            py"download_via_password_link"(url, password, token)
-        catch e2
-            throw(e2)
-        end
-    end
+    jpy.download_via_password_link(url, password, token)
 end
 
-function dbox_delete_path(path, token)
-    try
-        py"delete_dropbox_path"(path, token)
-    catch e1
-        try
-            @error "$e1"
-            @info "refreshing dropbox token"
-            dbox_set_token()
-            py"delete_dropbox_path"(path, token)
-        catch e2
-            throw(e2)
-        end
-    end
+"""
+    dbox_download_link_to_file(url, local_path, token; password = nothing)
+
+Stream the file behind a shared link to `local_path` without holding it in memory.
+Interrupted downloads resume where they stopped.
+"""
+function dbox_download_link_to_file(url, local_path, token; password = nothing)
+    jpy.download_shared_link_to_file(url, local_path, token, password = password)
 end
 
+"""
+    dbox_sync_folder(path, local_dir, token)
+
+Make `local_dir` a copy of the dropbox folder `path`, downloading only files whose
+content hash is not already on disk (see `sync_folder` in `jpe_py/db_filerequests.py`).
+"""
+dbox_sync_folder(path, local_dir, token) = jpy.sync_folder(path, local_dir, token)
+
+dbox_delete_path(path, token) = jpy.delete_dropbox_path(path, token)
+
 function dbox_create_password_link(path, password, token)
-    try
-        py"create_password_protected_link"(path, password, token)
-    catch e1
-        try
-            @error "$e1"
-            @info "refreshing dropbox token"
-            dbox_set_token()
-            py"create_password_protected_link"(path, password, token)
-        catch e2
-            throw(e2)
-        end
-    end
+    jpy.create_password_protected_link(path, password, token)
 end
 
-function dbox_revoke_link(url, token)
-    try
-        py"revoke_shared_link"(url, token)
-    catch e1
-        try
-            @error "$e1"
-            @info "refreshing dropbox token"
-            dbox_set_token()
-            py"revoke_shared_link"(url, token)
-        catch e2
-            throw(e2)
-        end
-    end
-end
+dbox_revoke_link(url, token) = jpy.revoke_shared_link(url, token)
+
+"""
+    dbox_get_folder_size(path)
 
+Total size in GB of all files below `path`. Answered from the cached inventory
+scan when it covers `path` (see `folder_stats` in `jpe_py/db_filerequests.py`).
+"""
 function dbox_get_folder_size(path)
     api_path = startswith(path, "/") ? path : "/" * path
-    token = dbox_token
     @info "looking for $path"
-    
-    # List folder recursively
-    response = HTTP.post(
-        "https://api.dropboxapi.com/2/files/list_folder",
-        ["Authorization" => "Bearer $token", "Content-Type" => "application/json"],
-        JSON.json(Dict("path" => api_path, "recursive" => true))
-    )
-    
-    data = JSON.parse(String(response.body))
-    
-    total_size = 0
-    for entry in data["entries"]
-        if entry[".tag"] == "file"
-            total_size += entry["size"]
+    stats = dbox_folder_stats(api_path)
+    return round(stats["bytes"] / 1024^3, digits = 2)  # GB
+end
+
+"""
+    dbox_folder_stats(path)
+
+Dict with `"n_files"`, `"bytes"`, `"largest_file"` and `"largest_bytes"` for a Dropbox folder.
+"""
+dbox_folder_stats(path) = jpy.folder_stats(path, dbox_token)
+
+"""
+    dbox_inventory(; refresh = false, save = true)
+
+Files, bytes and largest file per `/journal/slug/round/folder` of the whole app folder,
+from one recursive listing. With `save`, the result replaces the `dropbox_inventory`
+table in the database.
+"""
+function dbox_inventory(; refresh::Bool = false, save::Bool = true)
+    cols = jpy.scan_inventory(dbox_token, max_age = refresh ? 0 : jpy.INVENTORY_TTL)
+    inv = DataFrame([Symbol(c) => cols[c] for c in jpy.INVENTORY_COLUMNS])
+    if save
+        robust_db_operation() do con
+            DuckDB.register_data_frame(con, inv, "inv")
+            DBInterface.execute(con, "CREATE OR REPLACE TABLE dropbox_inventory AS SELECT *, current_timestamp AS scanned_at FROM inv")
         end
     end
-    
-    # Handle pagination if there are more results
-    while get(data, "has_more", false)
-        response = HTTP.post(
-            "https://api.dropboxapi.com/2/files/list_folder/continue",
-            ["Authorization" => "Bearer $token", "Content-Type" => "application/json"],
-            JSON.json(Dict("cursor" => data["cursor"]))
-        )
-        
-        data = JSON.parse(String(response.body))
-        
-        for entry in data["entries"]
-            if entry[".tag"] == "file"
-                total_size += entry["size"]
-            end
+    inv
+end
+
+"""
+    dbox_sync_file_request_state()
+
+Bring the `file_request_state` table up to date with Dropbox: one listing of all file
+requests, and only rows whose `file_count`, `is_open`, deadline, title or destination
+changed since the last sync are written (`changed_at`). Requests gone from Dropbox are
+deleted, and `last_synced_at` is set on all rows. Returns
+`(listed = ..., changed = ..., removed = ...)`.
+"""
+function dbox_sync_file_request_state()
+    db_ensure_table_exists("file_request_state", verbose = false)
+    known = with_db() do con
+        DataFrame(DBInterface.execute(con, "SELECT file_request_id, state_hash FROM file_request_state"))
+    end
+    res = jpy.sync_file_request_state(dbox_token, Dict(zip(known.file_request_id, known.state_hash)))
+    cols = collect(jpy.FR_STATE_COLUMNS)
+    changed = DataFrame([Symbol(c) => identity.(map(x -> something(x, missing), res["changed"][c])) for c in cols])
+    removed = DataFrame(file_request_id = String.(res["removed"]))
+    robust_db_operation() do con
+        if nrow(changed) > 0
+            DuckDB.register_data_frame(con, changed, "fr_changed")
+            stmt = DBInterface.prepare(con, """
+                INSERT OR REPLACE INTO file_request_state ($(join(cols, ", ")), changed_at, last_synced_at)
+                SELECT $(join(cols, ", ")), ?, ? FROM fr_changed
+            """)
+            DBInterface.execute(stmt, (res["synced_at"], res["synced_at"]))
         end
+        if nrow(removed) > 0
+            DuckDB.register_data_frame(con, removed, "fr_removed")
+            DBInterface.execute(con, "DELETE FROM file_request_state WHERE file_request_id IN (SELECT file_request_id FROM fr_removed)")
+        end
+        stmt = DBInterface.prepare(con, "UPDATE file_request_state SET last_synced_at = ?")
+        DBInterface.execute(stmt, (res["synced_at"],))
+    end
+    (listed = res["listed"], changed = nrow(changed), removed = nrow(removed))
+end
+
+"""
+    dbox_fr_state(ids)
+
+Stored state of file requests from the `file_request_state` table (see
+`dbox_sync_file_request_state`): `Dict(id => Dict("file_count", "is_open", "destination", "deadline"))`.
+Ids not in the table are left out.
+"""
+function dbox_fr_state(ids)
+    ids = unique(collect(skipmissing(ids)))
+    isempty(ids) && return Dict{String,Dict{String,Any}}()
+    df = with_db() do con
+        DuckDB.register_data_frame(con, DataFrame(file_request_id = String.(ids)), "fr_wanted")
+        DBInterface.execute(con, """
+            SELECT s.file_request_id, s.file_count, s.is_open, s.destination, s.deadline
+            FROM file_request_state s JOIN fr_wanted USING (file_request_id)
+        """) |> DataFrame
     end
-    
-    return round(total_size / 1024^3,digits = 2)  # GB
+    Dict(r.file_request_id => Dict("file_count" => r.file_count, "is_open" => r.is_open,
+                                   "destination" => r.destination, "deadline" => r.deadline)
+         for r in eachrow(df))
 end
 
 function dbox_list_shared_links()
-    token = dbox_token
+    token = dbox_refresh_token()
     resp = HTTP.post(
         "https://api.dropboxapi.com/2/sharing/list_shared_links",
         ["Authorization" => "Bearer $token",
@@ -214,6 +214,23 @@ end
 
 
 function gmail_send_invoice(first,email,invoicetable,capped,rate,EUR2USD,invoice; send = true)
+    m = gmail_invoice_message(first,email,invoicetable,capped,rate,EUR2USD,invoice)
+    if send
+        gmail_send(
+            m.to,
+            m.subject,
+            m.body,
+            m.attachments
+        )
+    else
+        println(m.body)
+    end
+end
+
+"""
+The invoice email for one replicator as a named tuple `(to, subject, body, attachments)`.
+"""
+function gmail_invoice_message(first,email,invoicetable,capped,rate,EUR2USD,invoice)
     rateUSD = round(rate * EUR2USD,digits = 2)
     subject = "Your JPE Invoice details"
 
@@ -242,16 +259,7 @@ function gmail_send_invoice(first,email,invoicetable,capped,rate,EUR2USD,invoice
         Florian
         """
     body = body * signature()
-    if send
-        gmail_send(
-            to,
-            subject,
-            body,
-            []
-        )
-    else
-        println(body)
-    end
+    (to = to, subject = subject, body = body, attachments = [])
 end
 
 
@@ -534,11 +542,84 @@ end
 
 # low level functions interfacing with the python client
 function gmail_send(to,subject,body,attachments; from = "'JPE Data Editor' <jpe.dataeditor@gmail.com>")
-    py"send_email"(to,subject,body,from,attachments)
+    jpy.send_email(to,subject,body,from,attachments)
 end
 
 function gmail_draft(to,subject,body,attachments; from = "'JPE Data Editor' <jpe.dataeditor@gmail.com>")
-    py"create_draft"(to,subject,body,from,attachments)
+    jpy.create_draft(to,subject,body,from,attachments)
+end
+
+"""
+    gmail_send_batch(messages; from = ..., batch_size = 50)
+
+Send many emails in as few HTTP requests as possible. `messages` is a vector of
+named tuples `(to, subject, body, attachments)`. Messages failing with rate limits or
+server errors are retried. Returns one `Dict("id" => ..., "error" => ...)` per message.
+"""
+function gmail_send_batch(messages; from = "'JPE Data Editor' <jpe.dataeditor@gmail.com>", batch_size::Int = 50)
+    msgs = [Dict("to" => m.to, "subject" => m.subject, "html_body" => m.body,
+                 "sent_from" => from, "attachments" => m.attachments) for m in messages]
+    jpy.send_emails_batch(msgs, batch_size = batch_size)
+end
+
+
+"""
+    gmail_sync_replies()
+
+Read the messages that arrived in the inbox since the last call and record those that
+belong to a paper in the `email_replies` table. A message belongs to a paper if its
+subject contains the paper id (e.g. in the case ID) or its thread already does; `role`
+says whether an author or a replicator of that paper wrote it. Only new messages are
+fetched (Gmail history since the `historyId` kept in `gmail_sync`), so this is cheap to
+run often. The first call only records where the mailbox is. Returns the new matches.
+
+Needs a Gmail token (`JPE_GMAIL_TOKEN`) granted a read scope, e.g. `gmail.metadata`.
+"""
+function gmail_sync_replies()
+    db_ensure_table_exists("email_replies", verbose = false)
+    db_ensure_table_exists("gmail_sync", verbose = false)
+    history_id, threads = with_db() do con
+        h = DataFrame(DBInterface.execute(con, "SELECT history_id FROM gmail_sync WHERE mailbox = 'me'"))
+        t = DataFrame(DBInterface.execute(con, "SELECT DISTINCT thread_id, paper_id FROM email_replies"))
+        (nrow(h) == 0 ? nothing : h.history_id[1]), Dict(zip(t.thread_id, t.paper_id))
+    end
+
+    changes = jpy.inbox_changes(history_id)
+    changes["reset"] && @warn "gmail history since $history_id is gone; matched the last days of the inbox instead"
+
+    papers = db_df("papers")
+    contacts = Dict{String,Dict{String,String}}()
+    for r in eachrow(papers), col in (:email_of_author, :email_of_second_author)
+        ismissing(r[col]) || (get!(contacts, r.paper_id, Dict{String,String}())[lowercase(strip(r[col]))] = "author")
+    end
+    for r in eachrow(db_df("iterations")), col in (:replicator1, :replicator2)
+        ismissing(r[col]) || (get!(contacts, r.paper_id, Dict{String,String}())[lowercase(strip(r[col]))] = "replicator")
+    end
+    matches = jpy.match_messages(changes["messages"], collect(skipmissing(papers.paper_id)), threads, contacts)
+
+    synced_at = now(UTC)
+    robust_db_operation() do con
+        stmt = DBInterface.prepare(con, """
+            INSERT OR REPLACE INTO email_replies (message_id, thread_id, paper_id, round, role, matched_by,
+                from_address, subject, snippet, received_at, synced_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """)
+        for m in matches
+            DBInterface.execute(stmt, (m["id"], m["thread_id"], m["paper_id"], something(m["round"], missing),
+                                       something(m["role"], missing), m["matched_by"],
+                                       something(m["from_address"], missing), m["subject"], m["snippet"],
+                                       something(m["received_at"], missing), synced_at))
+        end
+        stmt = DBInterface.prepare(con, "INSERT OR REPLACE INTO gmail_sync (mailbox, history_id, synced_at) VALUES ('me', ?, ?)")
+        DBInterface.execute(stmt, (changes["history_id"], synced_at))
+    end
+    @info "$(length(changes["messages"])) new messages, $(length(matches)) about papers"
+    DataFrame(paper_id = [m["paper_id"] for m in matches],
+              round = [something(m["round"], missing) for m in matches],
+              role = [something(m["role"], missing) for m in matches],
+              from = [something(m["from"], missing) for m in matches],
+              subject = [m["subject"] for m in matches],
+              received_at = [something(m["received_at"], missing) for m in matches])
 end
 
 
@@ -149,38 +149,62 @@ creates file requests for the replication package and paper appendices.
 - The updated DataFrameRow with file request information
 """
 function setup_dropbox_structure!(r::DataFrameRow, dbox_token)
-    # Get case ID for file request naming
-    cid = get_case_id(r.journal, r.paper_slug, r.round)
+    setup_dropbox_structure!([r], dbox_token)[1] || error("could not create file requests for $(r.paper_slug)")
+    r
+end
 
-    @debug "creating for $cid"
-    
-    # Set up paths
-    r.file_request_path = get_dbox_loc(r.journal, r.paper_slug, r.round)
-    r.file_request_path_full = get_dbox_loc(r.journal, r.paper_slug, r.round, full = true)
-    r.repl_package_path = joinpath(r.file_request_path,"replication-package")
-    r.paper_path = joinpath(r.file_request_path,"paper-appendices")
-
-    # Create directories
-    mr = string(ENV["JPE_DBOX_APPS"], r.repl_package_path)
-    mp = string(ENV["JPE_DBOX_APPS"], r.paper_path)
-    mkpath(mr)
-    mkpath(mp)
-    
-    # Create file requests if needed
-    @debug "fr exists?" dbox_fr_exists(dbox_token,r.repl_package_path)
-    @debug "old frs" r.file_request_id_pkg r.file_request_url_pkg r.file_request_id_paper r.file_request_url_paper
-    # if !dbox_fr_exists(dbox_token,r.repl_package_path)
-        fr_pkg   = dbox_create_file_request(r.repl_package_path, "$(cid) package upload", dbox_token)
-        fr_paper = dbox_create_file_request(r.paper_path, "$(cid) paper upload", dbox_token)
+"""
+    setup_dropbox_structure!(rows, dbox_token)
+
+Same for many papers at once: the package and paper file requests of all `rows` are created
+in one bulk call (see `dbox_create_file_requests`). Returns a `Vector{Bool}`, `true` for the rows
+whose two requests were both created. A row with a failed request gets a warning and keeps its old
+file request fields; the other request created for it is deleted again, so a re-run starts clean.
+"""
+function setup_dropbox_structure!(rows::Union{AbstractDataFrame,AbstractVector{<:DataFrameRow}}, dbox_token)
+    rs = rows isa AbstractDataFrame ? eachrow(rows) : rows
+    specs = Tuple{String,String}[]
+    for r in rs
+        # Get case ID for file request naming
+        cid = get_case_id(r.journal, r.paper_slug, r.round)
+
+        @debug "creating for $cid"
+
+        # Set up paths
+        r.file_request_path = get_dbox_loc(r.journal, r.paper_slug, r.round)
+        r.file_request_path_full = get_dbox_loc(r.journal, r.paper_slug, r.round, full = true)
+        r.repl_package_path = joinpath(r.file_request_path,"replication-package")
+        r.paper_path = joinpath(r.file_request_path,"paper-appendices")
+
+        # Create directories
+        mkpath(string(ENV["JPE_DBOX_APPS"], r.repl_package_path))
+        mkpath(string(ENV["JPE_DBOX_APPS"], r.paper_path))
+
+        @debug "old frs" r.file_request_id_pkg r.file_request_url_pkg r.file_request_id_paper r.file_request_url_paper
+        push!(specs, ("$(cid) package upload", r.repl_package_path))
+        push!(specs, ("$(cid) paper upload", r.paper_path))
+    end
+
+    # Create file requests, two per paper
+    frs = dbox_create_file_requests(specs, dbox_token)
+    ok = trues(length(rs))
+    for (i, r) in enumerate(rs)
+        fr_pkg, fr_paper = frs[2i-1], frs[2i]
+        errors = ["$(fr["title"]): $(fr["error"])" for fr in (fr_pkg, fr_paper) if !isnothing(fr["error"])]
+        if !isempty(errors)
+            ok[i] = false
+            @warn "skipping $(r.paper_slug): could not create file requests" errors
+            created = [fr["id"] for fr in (fr_pkg, fr_paper) if isnothing(fr["error"])]
+            isempty(created) || dbox_delete_file_requests(created, dbox_token)
+            continue
+        end
         r.file_request_id_pkg = fr_pkg["id"]
-        r.file_request_id_paper = fr_paper["id"]
         r.file_request_url_pkg = fr_pkg["url"]
+        r.file_request_id_paper = fr_paper["id"]
         r.file_request_url_paper = fr_paper["url"]
-    # else
-    #     @warn "file request exists at $(r.repl_package_path)"
-    # end
-    
-    @debug "new frs" r.file_request_id_pkg r.file_request_url_pkg r.file_request_id_paper r.file_request_url_paper
+        @debug "new frs" r.file_request_id_pkg r.file_request_url_pkg r.file_request_id_paper r.file_request_url_paper
+    end
+    ok
 end
 
 """
@@ -220,15 +244,18 @@ function google_arrivals()
     db_ensure_table_exists("papers")
     db_ensure_table_exists("iterations")
     
+    # create folder structure and file requests for all papers in one go;
+    # papers whose requests failed stay unprocessed for the next run
+    created = setup_dropbox_structure!(y, dbox_token)
+    all(created) || @warn "$(count(!, created)) of $(nrow(y)) arrivals skipped; they stay unprocessed in form_arrivals for a later run"
+
     # Process each row
-    for r in eachrow(y)
+    for (r, ok) in zip(eachrow(y), created)
+        ok || continue
         ghid = string(r.journal, "-", sanitize_repo_name(r.surname_of_author), "-", r.paper_id)
         @info "processing $ghid"
         cid = get_case_id(r.journal, r.paper_slug, r.round)
 
-        # create folder structure and file requests
-        setup_dropbox_structure!(r, dbox_token)
-
         # create gh repo for this package from template
         r.gh_org_repo = "JPE-Reproducibility/" * ghid
         
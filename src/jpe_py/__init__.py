@@ -0,0 +1,63 @@
+"""
+Python layer of JPE.jl: Dropbox file requests, links and transfers, Gmail, and
+call metrics.
+
+`import jpe_py` is cheap: a submodule (and the dropbox or google SDK it needs)
+is only imported when one of its names is first used, e.g. `jpe_py.send_email`
+loads gmail_client. Tokens are fetched on the first API call, not at import.
+Check with bench/bench_import.py.
+"""
+
+import importlib
+
+_EXPORTS = {
+    "metrics": (
+        "get_metrics", "reset_metrics", "dump_metrics", "instrument", "instrumented",
+        "record_retry", "record_bytes",
+    ),
+    "db_filerequests": (
+        "refresh_token", "set_pool_size", "dbx_client", "run_many", "get_user_info",
+        "ERROR_KINDS", "DropboxError", "classify_error",
+        "warm_link_cache", "get_link_at_path",
+        "create_file_request", "create_file_requests_bulk", "update_file_request_deadline",
+        "iter_file_requests", "iter_folder", "file_request_exists", "submission_time",
+        "check_file_request_submissions", "check_file_requests_bulk", "monitor_all_file_requests",
+        "FR_STATE_COLUMNS", "sync_file_request_state",
+        "cleanup_file_requests", "monitor_viable_file_requests",
+        "create_password_protected_link", "revoke_shared_link",
+        "upload_text", "upload_file", "upload_files",
+        "download_via_password_link", "download_shared_link_to_file", "download_file",
+        "local_content_hash", "sync_folder",
+        "INVENTORY_TTL", "INVENTORY_COLUMNS", "scan_inventory", "folder_stats",
+        "read_changes", "save_cursor", "poll_changes", "watch_uploads", "delete_dropbox_path",
+    ),
+    "dropbox_async": (
+        "AsyncDropbox", "async_dropbox", "run_async", "close_async_backend", "use_async_backend",
+        "links_at_paths_async", "check_file_requests_async", "submission_times_async",
+        "create_file_requests_async",
+    ),
+    "gmail_client": (
+        "refresh_access_token_from_json", "build_gmail_service",
+        "send_email", "create_draft", "send_emails_batch", "part_cache_info", "clear_part_cache",
+        "INBOX_HEADERS", "inbox_changes", "match_messages",
+    ),
+}
+
+_OWNER = {name: module for module, names in _EXPORTS.items() for name in names}
+
+__all__ = sorted(_OWNER)
+
+
+def __getattr__(name):
+    # looked up on every access (not cached here), so a function swapped inside
+    # its module, e.g. by use_async_backend, is picked up
+    if name in _EXPORTS:
+        return importlib.import_module(f"{__name__}.{name}")
+    module = _OWNER.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(f"{__name__}.{module}"), name)
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_OWNER) | set(_EXPORTS))
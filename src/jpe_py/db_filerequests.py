@@ -0,0 +1,1934 @@
+import dropbox
+from dropbox import Dropbox
+from dropbox.file_requests import CreateFileRequestArgs
+from dropbox.sharing import RequestedVisibility, SharedLinkSettings
+from dropbox.files import FileMetadata
+from datetime import datetime, timedelta, timezone
+
+import os
+import json
+import random
+import sys
+import shutil
+import sqlite3
+import hashlib
+import threading
+import time
+import requests
+import functools
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+
+from .metrics import instrument, instrumented, record_retry
+
+# Load secrets from environment variables
+APP_KEY = os.environ["JPE_DBOX_APP"]
+APP_SECRET = os.environ["JPE_DBOX_APP_SECRET"]
+REFRESH_TOKEN = os.environ["JPE_DBOX_APP_REFRESH"]
+
+# Size of the shared HTTP connection pool used by all Dropbox clients.
+DBX_POOL_SIZE = int(os.environ.get("JPE_DBOX_POOL_SIZE", "16"))
+
+# Client registry: one Dropbox client per access token, all sharing a single
+# pooled requests.Session so repeated calls reuse open TLS connections.
+_dbx_lock = threading.Lock()
+_dbx_session = None
+_dbx_clients = {}
+
+# Access token cache. The token is handed out until TOKEN_EXPIRY_MARGIN
+# seconds before Dropbox says it expires.
+TOKEN_EXPIRY_MARGIN = 300
+_dbx_token_lock = threading.Lock()
+_dbx_token = None
+_dbx_token_expires = 0.0
+# Tokens that were replaced or rejected by Dropbox. Callers still holding one
+# (e.g. Julia's dbox_token) get the current token instead, see _live_token.
+_stale_tokens = set()
+
+
+def _token_valid():
+    return _dbx_token is not None and time.time() < _dbx_token_expires - TOKEN_EXPIRY_MARGIN
+
+
+def refresh_token(force=False, stale=None):
+    """
+    Return a valid Dropbox access token, refreshing it only if the cached one
+    is missing, about to expire, or `force` is true. Concurrent callers share
+    a single refresh.
+
+    `stale` is a token Dropbox rejected: it is never handed out again, and
+    the cached token is refreshed only if it still is that one, so a burst of
+    auth errors costs one refresh.
+    """
+    global _dbx_token, _dbx_token_expires
+
+    def fresh():
+        if stale is not None:
+            return _dbx_token != stale and _token_valid()
+        return not force and _token_valid()
+
+    if stale is not None:
+        _stale_tokens.add(stale)
+    if fresh():
+        return _dbx_token
+
+    with _dbx_token_lock:
+        # another thread may have refreshed while we waited for the lock
+        if fresh():
+            return _dbx_token
+
+        url = "https://api.dropbox.com/oauth2/token"
+        with instrument("dropbox/oauth2/token"):
+            response = requests.post(
+                url,
+                auth=(APP_KEY, APP_SECRET),
+                data={
+                    "grant_type": "refresh_token",
+                    "refresh_token": REFRESH_TOKEN
+                }
+            )
+            response.raise_for_status()
+        payload = response.json()
+        token = payload["access_token"]
+
+        # a new access token supersedes all old ones: drop their clients
+        with _dbx_lock:
+            if token != _dbx_token:
+                _dbx_clients.clear()
+                if _dbx_token is not None:
+                    _stale_tokens.add(_dbx_token)
+        _dbx_token = token
+        _dbx_token_expires = time.time() + payload.get("expires_in", 14400)
+        return token
+
+
+def set_pool_size(n):
+    """
+    Resize the shared Dropbox connection pool. Existing clients are dropped
+    and rebuilt on next use.
+    """
+    global DBX_POOL_SIZE, _dbx_session
+    with _dbx_lock:
+        DBX_POOL_SIZE = int(n)
+        _dbx_session = None
+        _dbx_clients.clear()
+
+
+def _http_session():
+    "The pooled requests.Session shared by all Dropbox clients."
+    global _dbx_session
+    with _dbx_lock:
+        if _dbx_session is None:
+            _dbx_session = dropbox.create_session(max_connections=DBX_POOL_SIZE)
+        return _dbx_session
+
+
+class _InstrumentedDropbox(Dropbox):
+    "Dropbox client that times every API call as dropbox/<namespace>/<route> (see metrics.py)."
+
+    def request(self, route, namespace, request_arg, request_binary, timeout=None):
+        name = f"dropbox/{namespace}/{route.name}"
+        if route.version > 1:
+            name += f"_v{route.version}"
+        with instrument(name) as m:
+            if isinstance(request_binary, (bytes, bytearray)):
+                m.add_bytes(len(request_binary))
+            try:
+                return super().request(route, namespace, request_arg, request_binary, timeout=timeout)
+            except dropbox.exceptions.AuthError as e:
+                e.token = self._oauth2_access_token  # the token to retire (see _call_with_backoff)
+                raise
+
+
+def _live_token(token):
+    "`token`, or the current token if it is None or was retired."
+    if token is None or token in _stale_tokens:
+        return refresh_token()
+    return token
+
+
+def dbx_client(token=None):
+    """
+    Return the pooled Dropbox client for `token`.
+
+    Clients are created once per token and share one HTTP session. If `token`
+    is None or has been replaced by a refresh, the cached token from
+    `refresh_token()` is used. The SDK's own retries are off: rate limits and
+    5xx errors surface to `_call_with_backoff`, the only retry loop.
+    """
+    token = _live_token(token)
+    session = _http_session()
+    with _dbx_lock:
+        dbx = _dbx_clients.get(token)
+        if dbx is None:
+            dbx = _InstrumentedDropbox(token, session=session,
+                                       max_retries_on_error=0, max_retries_on_rate_limit=0)
+            _dbx_clients[token] = dbx
+        return dbx
+
+
+def _backoff_delay(attempt, retry_after=None, base=1.0, cap=60.0):
+    "seconds to wait before retry `attempt` (0-based): honour retry_after, else full-jitter exponential."
+    if retry_after is not None:
+        return retry_after + random.uniform(0, base)
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def _op_name(op):
+    op = getattr(op, 'func', op)  # functools.partial
+    return getattr(op, '__name__', type(op).__name__)
+
+
+def _client_op(token, method):
+    """
+    op calling `method` of dbx_client(token). The client is looked up on every
+    call, so an attempt replayed after a token refresh uses the new token.
+    """
+    def op(*args, **kwargs):
+        return getattr(dbx_client(token), method)(*args, **kwargs)
+    op.__name__ = method
+    return op
+
+
+# Retry policy. Every Dropbox operation called from Julia (see _retry_policy)
+# and every call made through run_many goes through _call_with_backoff, which
+# sorts a failure into one of ERROR_KINDS and acts on it:
+#   auth         expired or revoked token: refresh once, then replay
+#   rate_limit   429: wait retry_after (all threads pause), then replay
+#   transient    5xx, dropped connection, timeout: jittered back-off, replay
+#   not_found    the path, file request or link does not exist: fail fast
+#   permanent    any other API or input error: fail fast
+#   unavailable  circuit open after repeated transient failures: no call made
+# A call that fails for good raises DropboxError with the kind.
+ERROR_KINDS = ('auth', 'rate_limit', 'transient', 'not_found', 'permanent', 'unavailable')
+
+# Consecutive calls failing on rate_limit/transient errors (after their
+# retries) that open the circuit, and seconds it stays open.
+BREAKER_THRESHOLD = int(os.environ.get("JPE_DBOX_BREAKER_THRESHOLD", "5"))
+BREAKER_COOLDOWN = float(os.environ.get("JPE_DBOX_BREAKER_COOLDOWN", "60"))
+
+
+class DropboxError(RuntimeError):
+    """
+    A Dropbox operation that failed for good: `kind` is one of ERROR_KINDS,
+    `cause` the original exception and `retry_after` the wait Dropbox asked
+    for, if any.
+    """
+
+    def __init__(self, kind, cause, retry_after=None):
+        super().__init__(f"{kind}: {type(cause).__name__}: {cause}")
+        self.kind = kind
+        self.cause = cause
+        self.retry_after = retry_after
+
+
+def _status_kind(status):
+    if status == 401:
+        return 'auth'
+    if status == 429:
+        return 'rate_limit'
+    if status >= 500:
+        return 'transient'
+    return 'permanent'
+
+
+def _is_not_found(err):
+    "True if a route error union, or the lookup error inside it, means 'not found'."
+    for _ in range(3):
+        for tag in ('not_found', 'shared_link_not_found'):
+            if getattr(err, 'is_' + tag, lambda: False)():
+                return True
+        for tag in ('path', 'path_lookup'):
+            if getattr(err, 'is_' + tag, lambda: False)():
+                err = getattr(err, 'get_' + tag)()
+                break
+        else:
+            return False
+    return False
+
+
+def classify_error(e):
+    "(kind, retry_after) for an exception raised by a Dropbox call; kind is one of ERROR_KINDS."
+    if isinstance(e, DropboxError):
+        return e.kind, e.retry_after
+    if isinstance(e, dropbox.exceptions.RateLimitError):
+        return 'rate_limit', e.backoff
+    if isinstance(e, dropbox.exceptions.HttpError):
+        return _status_kind(e.status_code), None
+    if isinstance(e, dropbox.exceptions.ApiError):
+        return ('not_found' if _is_not_found(e.error) else 'permanent'), None
+    if isinstance(e, requests.exceptions.HTTPError) and e.response is not None:
+        return _status_kind(e.response.status_code), None
+    if isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                      ConnectionError, TimeoutError)):
+        return 'transient', None
+    httpx = sys.modules.get("httpx")  # only loaded by the async backend
+    if httpx is not None and isinstance(e, httpx.TransportError):
+        return 'transient', None
+    return 'permanent', None
+
+
+def _give_up(e):
+    "the DropboxError to raise for `e` once retrying is over."
+    if isinstance(e, DropboxError):
+        return e
+    kind, retry_after = classify_error(e)
+    return DropboxError(kind, e, retry_after)
+
+
+# Time until which nobody calls Dropbox, set from the retry_after of a 429 so
+# that concurrent callers wait it out together instead of each hitting it.
+_rate_limited_until = 0.0
+
+
+def _note_rate_limit(retry_after):
+    global _rate_limited_until
+    if retry_after:
+        _rate_limited_until = max(_rate_limited_until, time.time() + retry_after)
+
+
+def _rate_limit_wait():
+    "seconds left before Dropbox may be called again."
+    return max(0.0, _rate_limited_until - time.time())
+
+
+class _CircuitBreaker:
+    """
+    Opens after `threshold` consecutive calls failed on rate_limit or
+    transient errors; while open, calls fail with kind 'unavailable' without
+    reaching Dropbox. After `cooldown` seconds one trial call goes through:
+    success closes the circuit, another failure opens it again.
+    """
+
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if not self._trial and time.time() - self._opened_at >= self.cooldown:
+                self._trial = True
+                return True
+            return False
+
+    def retry_in(self):
+        with self._lock:
+            if self._opened_at is None:
+                return 0.0
+            return max(0.0, self._opened_at + self.cooldown - time.time())
+
+    def record(self, ok):
+        with self._lock:
+            if ok:
+                self._failures, self._opened_at, self._trial = 0, None, False
+                return
+            self._failures += 1
+            if self._trial or self._failures >= self.threshold:
+                self._opened_at, self._trial = time.time(), False
+
+    def release(self):
+        "end a call that said nothing about Dropbox's health; a trial it held may be retried."
+        with self._lock:
+            self._trial = False
+
+
+_breaker = _CircuitBreaker(BREAKER_THRESHOLD, BREAKER_COOLDOWN)
+# per thread: True while a call runs under the policy, so that nested
+# operations do not retry what their caller will retry anyway
+_policy = threading.local()
+
+
+def _call(op, args):
+    if isinstance(args, dict):
+        return op(**args)
+    if isinstance(args, (list, tuple)):
+        return op(*args)
+    return op(args)
+
+
+def _call_with_backoff(op, args, max_retries=5):
+    """
+    op(args) under the retry policy (args as for run_many). Returns its result
+    or raises DropboxError. A DropboxError from a nested call is final.
+    """
+    name = _op_name(op)
+    outer = getattr(_policy, 'active', False)
+    # only the outermost call is admitted by, and accounts to, the breaker
+    if not outer and not _breaker.allow():
+        raise DropboxError('unavailable', RuntimeError(
+            f"Dropbox circuit open after repeated failures, retry in {_breaker.retry_in():.0f}s"))
+    _policy.active = True
+    recorded = outer
+    attempt, refreshed = 0, False
+    try:
+        while True:
+            time.sleep(_rate_limit_wait())
+            try:
+                result = _call(op, args)
+            except Exception as e:
+                kind, retry_after = classify_error(e)
+                final = isinstance(e, DropboxError)
+                if kind == 'auth' and not refreshed and not final:
+                    refreshed = True
+                    record_retry(name)
+                    try:
+                        refresh_token(stale=getattr(e, 'token', None) or _dbx_token)
+                    except Exception as refresh_error:
+                        raise DropboxError('auth', refresh_error) from refresh_error
+                    continue
+                retryable = kind in ('rate_limit', 'transient')
+                if retryable and attempt < max_retries and not final:
+                    if kind == 'rate_limit':
+                        _note_rate_limit(retry_after)
+                    record_retry(name)
+                    time.sleep(_backoff_delay(attempt, retry_after))
+                    attempt += 1
+                    continue
+                if not recorded and kind not in ('unavailable', 'auth'):
+                    _breaker.record(not retryable)
+                    recorded = True
+                if final:
+                    raise
+                raise _give_up(e) from e
+            if not recorded:
+                _breaker.record(True)
+                recorded = True
+            return result
+    finally:
+        _policy.active = outer
+        if not recorded:
+            # auth failures, interrupts: no verdict, but a trial must not stay taken
+            _breaker.release()
+
+
+def _retry_policy(fn):
+    "decorator: run `fn` under the retry policy unless its caller already does."
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if getattr(_policy, 'active', False):
+            return fn(*args, **kwargs)
+        return _call_with_backoff(functools.partial(fn, *args, **kwargs), ())
+    return wrapper
+
+
+def run_many(op, arg_list, max_workers=8, max_retries=5):
+    """
+    Run independent Dropbox operations concurrently.
+
+    Args:
+        op: a function (or the name of one in this module), e.g. "get_link_at_path".
+        arg_list (list): one entry per call; a tuple/list is passed as positional
+            arguments, a dict as keyword arguments, anything else as the single argument.
+        max_workers (int): maximum number of calls in flight.
+        max_retries (int): retries per call on rate limiting or transient errors
+            (see the retry policy above).
+
+    Returns:
+        list: one dict {'result', 'error', 'kind'} per entry of arg_list, in
+        input order. 'error' and 'kind' are None on success, else the error
+        message and one of ERROR_KINDS.
+    """
+    if isinstance(op, str):
+        op = globals()[op]
+    arg_list = list(arg_list)
+    if not arg_list:
+        return []
+
+    # workers of a call already under the policy share its breaker admission
+    nested = getattr(_policy, 'active', False)
+
+    def one(args):
+        _policy.active = nested
+        try:
+            return {'result': _call_with_backoff(op, args, max_retries), 'error': None, 'kind': None}
+        except Exception as e:
+            return {'result': None, 'error': f"{type(e).__name__}: {e}", 'kind': classify_error(e)[0]}
+        finally:
+            _policy.active = False
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(arg_list)))) as pool:
+        return list(pool.map(one, arg_list))
+
+
+@_retry_policy
+def get_user_info(token):
+        dbx = dbx_client(token)
+        return dbx.users_get_current_account()
+
+
+# Shared link cache: path_lower -> {'url', 'visibility', 'expires', 'cached_at'}.
+# Kept in memory and written through to the local index (table shared_links)
+# so that it survives restarts. Loaded lazily; warm_link_cache() refills it
+# from one listing of all our shared links. Entries older than LINK_CACHE_TTL
+# seconds are asked for again, so a link revoked outside this process does not
+# stick around.
+LINK_CACHE_TTL = 24 * 3600
+_link_cache = None
+_link_cache_lock = threading.Lock()
+
+
+def _utcnow():
+    "current UTC time as a naive datetime, like the ones the Dropbox SDK returns."
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _link_cache_entries():
+    global _link_cache
+    if _link_cache is None:
+        con = _index_connect()
+        try:
+            rows = con.execute("SELECT path_lower, url, visibility, expires, updated_at "
+                               "FROM shared_links").fetchall()
+        finally:
+            con.close()
+        _link_cache = {p: {'url': u, 'visibility': v,
+                           'expires': datetime.fromisoformat(e) if e else None,
+                           'cached_at': datetime.fromisoformat(t) if t else datetime.min}
+                       for p, u, v, e, t in rows}
+    return _link_cache
+
+
+def _url_key(url):
+    "a shared link without its query (?dl=0, ?rlkey=...), for comparing urls."
+    parts = urlsplit(url)
+    return (parts.netloc.lower(), parts.path)
+
+
+def _link_cache_get(path):
+    "cached public, unexpired and recently confirmed link url for `path`, or None."
+    with _link_cache_lock:
+        entry = _link_cache_entries().get(path.lower())
+    if entry is None or entry['visibility'] != 'public':
+        return None
+    if (_utcnow() - entry['cached_at']).total_seconds() > LINK_CACHE_TTL:
+        return None  # get_link_at_path asks Dropbox and refreshes the entry
+    if entry['expires'] is not None and entry['expires'] <= _utcnow():
+        _link_cache_drop(path=path)
+        return None
+    return entry['url']
+
+
+def _link_row(link):
+    "(path_lower, url, visibility, expires) of a SharedLinkMetadata."
+    rv = link.link_permissions.resolved_visibility if link.link_permissions else None
+    return (link.path_lower, link.url, rv._tag if rv is not None else 'public', link.expires)
+
+
+def _link_cache_put(links):
+    "cache a list of SharedLinkMetadata."
+    rows = [_link_row(link) for link in links if link.path_lower is not None]
+    if not rows:
+        return
+    now = _utcnow()
+    with _link_cache_lock:
+        cache = _link_cache_entries()
+        for path_lower, url, visibility, expires in rows:
+            cache[path_lower] = {'url': url, 'visibility': visibility, 'expires': expires, 'cached_at': now}
+        con = _index_connect()
+        try:
+            con.executemany("INSERT OR REPLACE INTO shared_links (path_lower, url, visibility, expires, updated_at) "
+                            "VALUES (?, ?, ?, ?, ?)",
+                            [(p, u, v, e.isoformat() if e else None, now.isoformat())
+                             for p, u, v, e in rows])
+            con.commit()
+        finally:
+            con.close()
+
+
+def _link_cache_drop(path=None, url=None):
+    "forget the cached link for `path`, or every cached link with `url` (query ignored)."
+    key = _url_key(url) if url is not None else None
+    with _link_cache_lock:
+        cache = _link_cache_entries()
+        gone = [p for p, entry in cache.items()
+                if (path is not None and p == path.lower()) or (key is not None and _url_key(entry['url']) == key)]
+        if not gone:
+            return
+        for p in gone:
+            del cache[p]
+        con = _index_connect()
+        try:
+            con.executemany("DELETE FROM shared_links WHERE path_lower = ?", [(p,) for p in gone])
+            con.commit()
+        finally:
+            con.close()
+
+
+@instrumented()
+@_retry_policy
+def warm_link_cache(token=None):
+    """
+    Refill the shared link cache from a paginated listing of all our shared
+    links. Returns the number of links cached.
+    """
+    global _link_cache
+    dbx = dbx_client(token)
+    links = []
+    result = dbx.sharing_list_shared_links()
+    links.extend(result.links)
+    while result.has_more:
+        result = dbx.sharing_list_shared_links(cursor=result.cursor)
+        links.extend(result.links)
+
+    with _link_cache_lock:
+        _link_cache = {}
+        con = _index_connect()
+        try:
+            con.execute("DELETE FROM shared_links")
+            con.commit()
+        finally:
+            con.close()
+    _link_cache_put(links)
+    return len(_link_cache)
+
+
+@instrumented()
+@_retry_policy
+def get_link_at_path(path, token, expiry_days=None):
+    "get a shareable link for local path /Apps/JPE-packages/path"
+
+    cached = _link_cache_get(path)
+    if cached is not None:
+        return cached
+
+    dbx = dbx_client(token)
+
+    expires = datetime.now(timezone.utc) + timedelta(days=expiry_days) if expiry_days is not None else None
+
+    try:
+        # Create settings with 'public' visibility (default for shared links)
+        settings = SharedLinkSettings(
+            requested_visibility=RequestedVisibility.public,
+            expires=expires
+        )
+
+        # Attempt to create a new shared link
+        link = dbx.sharing_create_shared_link_with_settings(path, settings)
+        print("Public shared link:", link.url)
+        _link_cache_put([link])
+        return link.url
+
+    except Exception as e:
+        # If a link already exists, return it.
+        # Two cases:
+        #   1. ApiError with is_shared_link_already_exists() — normal SDK path
+        #   2. stone ValidationError("shared_link_already_exists: missing '.tag' key") —
+        #      SDK deserialization bug on some API versions; detect by message string.
+        is_already_exists = (
+            (isinstance(e, dropbox.exceptions.ApiError)
+             and isinstance(e.error, dropbox.sharing.CreateSharedLinkWithSettingsError)
+             and e.error.is_shared_link_already_exists())
+            or "shared_link_already_exists" in str(e)
+        )
+        if is_already_exists:
+            # Try to extract URL directly from the error metadata (no extra API call)
+            try:
+                existing = e.error.get_shared_link_already_exists().metadata
+                if existing is not None:
+                    print("Existing shared link (from error metadata):", existing.url)
+                    _link_cache_put([existing])
+                    return existing.url
+            except Exception:
+                pass
+            # Fall back to listing shared links for this path
+            links = dbx.sharing_list_shared_links(path=path, direct_only=True)
+            if links.links:
+                print("Existing shared link (from list):", links.links[0].url)
+                _link_cache_put([links.links[0]])
+                return links.links[0].url
+            else:
+                raise RuntimeError(f"A shared link exists for {path} but could not be retrieved.")
+        # anything else is classified by the retry policy
+        raise
+
+@instrumented()
+@_retry_policy
+def create_file_request(token, title: str, destination_path: str, deadline_days=None):
+    """
+    Creates a file request in Dropbox.
+
+    Args:
+        token.
+        title (str): The title of the file request (visible to users).
+        destination_path (str): The Dropbox folder path where uploaded files will be stored.
+        deadline_days (int, optional): if given, sets a deadline that many days from now.
+
+    Returns:
+        dict with the 'url' and 'id' of the new file request; raises
+        DropboxError if it could not be created.
+    """
+    result = _create_file_request(token, title, destination_path, deadline_days)
+    return {'url': result.url, 'id': result.id}
+
+
+def _create_file_request(token, title, destination_path, deadline_days=None):
+    "create one file request and index it; errors propagate."
+    from dropbox.file_requests import FileRequestDeadline
+
+    deadline = None
+    if deadline_days is not None:
+        deadline = FileRequestDeadline(
+            deadline=datetime.now(timezone.utc) + timedelta(days=deadline_days),
+            allow_late_uploads=None
+        )
+    result = dbx_client(token).file_requests_create(
+        title=title,
+        destination=destination_path,
+        deadline=deadline
+    )
+    _fr_index_add(result)
+    return result
+
+
+def _create_folders(token, paths, poll_interval=1.0, max_polls=60):
+    """
+    Create folders with one files_create_folder_batch call (waiting for the
+    job if Dropbox runs it asynchronously). Existing folders are fine.
+    Returns {path: error message} for the folders that could not be created.
+    """
+    if not paths:
+        return {}
+    try:
+        launch = _call_with_backoff(_client_op(token, 'files_create_folder_batch'), {'paths': paths})
+        if launch.is_complete():
+            entries = launch.get_complete().entries
+        else:
+            job_id = launch.get_async_job_id()
+            for _ in range(max_polls):
+                status = _call_with_backoff(_client_op(token, 'files_create_folder_batch_check'), (job_id,))
+                if not status.is_in_progress():
+                    break
+                time.sleep(poll_interval)
+            if status.is_failed():
+                return {p: f"CreateFolderBatchError: {status.get_failed()}" for p in paths}
+            if not status.is_complete():
+                return {p: "CreateFolderBatchError: job did not finish" for p in paths}
+            entries = status.get_complete().entries
+    except Exception as e:
+        return {p: f"{type(e).__name__}: {e}" for p in paths}
+
+    errors = {}
+    for path, entry in zip(paths, entries):
+        if entry.is_success():
+            continue
+        err = entry.get_failure()
+        if err.is_path() and err.get_path().is_conflict() and err.get_path().get_conflict().is_folder():
+            continue
+        errors[path] = f"CreateFolderEntryError: {err}"
+    return errors
+
+
+@instrumented()
+@_retry_policy
+def create_file_requests_bulk(file_requests, token=None, max_workers=8, max_retries=5):
+    """
+    Create many file requests in one step.
+
+    All destination folders are created with a single files_create_folder_batch
+    call, then the requests are created concurrently, each retried with
+    back-off on rate limiting or Dropbox 5xx errors.
+
+    Args:
+        file_requests (list): (title, destination_path) or (title, destination_path, deadline_days) tuples.
+        token: Dropbox access token.
+        max_workers (int): maximum number of creations in flight.
+        max_retries (int): retries per request on transient errors.
+
+    Returns:
+        list: one dict {'title', 'destination', 'id', 'url', 'error'} per request,
+        in input order. 'error' is None on success, else "<ExceptionClass>: <message>";
+        for a failed creation that is a DropboxError naming the error kind, so
+        "DropboxError: rate_limit: ..." means the retries ran out, not that the
+        request was invalid.
+    """
+    specs = [(r[0], r[1], r[2] if len(r) > 2 else None) for r in file_requests]
+
+    folder_errors = _create_folders(token, list(dict.fromkeys(dest for _, dest, _ in specs)))
+    todo = [i for i, (_, dest, _) in enumerate(specs) if dest not in folder_errors]
+    created = run_many(functools.partial(_create_file_request, token), [specs[i] for i in todo],
+                       max_workers=max_workers, max_retries=max_retries)
+
+    out = [{'title': title, 'destination': dest, 'id': None, 'url': None, 'error': folder_errors.get(dest)}
+           for title, dest, _ in specs]
+    for i, res in zip(todo, created):
+        if res['error'] is None:
+            out[i]['id'], out[i]['url'] = res['result'].id, res['result'].url
+        else:
+            out[i]['error'] = res['error']
+    return out
+
+
+@instrumented()
+@_retry_policy
+def update_file_request_deadline(token, request_id: str, deadline_days):
+    """
+    Reset the deadline on an existing file request, in place (no new id/url).
+
+    Args:
+        token.
+        request_id (str): id of the existing file request.
+        deadline_days (int): new deadline, that many days from now.
+
+    Returns:
+        the updated file request object (dict with 'url', 'id'). Raises
+        DropboxError, of kind 'not_found' if the request no longer exists.
+    """
+    from dropbox.file_requests import FileRequestDeadline, UpdateFileRequestDeadline
+
+    dbx = dbx_client(token)
+
+    new_deadline = UpdateFileRequestDeadline.update(
+        FileRequestDeadline(
+            deadline=datetime.now(timezone.utc) + timedelta(days=deadline_days),
+            allow_late_uploads=None
+        )
+    )
+
+    result = dbx.file_requests_update(request_id, deadline=new_deadline)
+    return {'url': result.url, 'id': result.id}
+
+def iter_file_requests(token=None):
+    """
+    Yield all file requests, fetching pages lazily with
+    file_requests_list_v2 / file_requests_list_continue.
+    """
+    dbx = dbx_client(token)
+    result = dbx.file_requests_list_v2()
+    yield from result.file_requests
+    while result.has_more:
+        result = dbx.file_requests_list_continue(result.cursor)
+        yield from result.file_requests
+
+
+def iter_folder(path, token=None, recursive=True):
+    """
+    Yield the metadata of all entries under a Dropbox folder, fetching pages
+    lazily with files_list_folder / files_list_folder_continue.
+    """
+    dbx = dbx_client(token)
+    result = dbx.files_list_folder(path, recursive=recursive)
+    yield from result.entries
+    while result.has_more:
+        result = dbx.files_list_folder_continue(result.cursor)
+        yield from result.entries
+
+
+# Destination -> file request index for file_request_exists, rebuilt from a
+# full listing when older than FR_INDEX_TTL seconds.
+FR_INDEX_TTL = 300
+_fr_index = {}
+_fr_index_built = 0.0
+_fr_index_lock = threading.Lock()
+
+
+def _fr_index_add(fr):
+    with _fr_index_lock:
+        if _fr_index_built:
+            _fr_index[fr.destination] = fr
+
+
+def _fr_index_drop(request_ids):
+    ids = set(request_ids)
+    with _fr_index_lock:
+        for destination in [d for d, fr in _fr_index.items() if fr.id in ids]:
+            del _fr_index[destination]
+
+
+@instrumented()
+@_retry_policy
+def file_request_exists(token, destination_path: str) -> bool:
+    global _fr_index, _fr_index_built
+    with _fr_index_lock:
+        if time.time() - _fr_index_built > FR_INDEX_TTL:
+            _fr_index = {fr.destination: fr for fr in iter_file_requests(token)}
+            _fr_index_built = time.time()
+        return destination_path in _fr_index
+
+
+
+@instrumented()
+@_retry_policy
+def submission_time(token, destination_path):
+    """
+    server_modified of the first file in destination_path, or None if it has
+    no files yet. Raises DropboxError of kind 'not_found' if the folder is missing.
+    """
+    dbx = dbx_client(token)
+    result = dbx.files_list_folder(destination_path)
+
+    for entry in result.entries:
+        if isinstance(entry, FileMetadata):
+            return entry.server_modified  # First file found
+
+    return None  # No file entries found
+
+
+@instrumented()
+@_retry_policy
+def check_file_request_submissions(access_token, file_request_id, verbose = False):
+    """
+    Check if files have been submitted to a specific file request
+    
+    Args:
+        access_token (str): Your Dropbox access token
+        file_request_id (str): The ID of the file request
+    
+    Returns:
+        dict: Information about the file request including file count.
+        Raises DropboxError of kind 'not_found' for an unknown id.
+    """
+    dbx = dbx_client(access_token)
+    
+    # Get file request details including file count
+    request_info = dbx.file_requests_get(file_request_id)
+    
+    if verbose:
+        print(f"File Request: {request_info.title}")
+        print(f"Status: {'Open' if request_info.is_open else 'Closed'}")
+        print(f"Files submitted: {request_info.file_count}")
+        print(f"Destination folder: {request_info.destination}")
+    
+    if hasattr(request_info, 'deadline') and request_info.deadline:
+        print(f"Deadline: {request_info.deadline}")
+        
+    return {
+        'title': request_info.title,
+        'file_count': request_info.file_count,
+        'is_open': request_info.is_open,
+        'destination': request_info.destination,
+        'request_info': request_info
+    }
+
+@instrumented()
+@_retry_policy
+def check_file_requests_bulk(access_token, file_request_ids):
+    """
+    Check the submission status of many file requests with a single listing.
+
+    Args:
+        access_token (str): Your Dropbox access token
+        file_request_ids (list): IDs of the file requests to check
+
+    Returns:
+        dict: {id: {'file_count', 'is_open', 'destination', 'deadline'}} for
+        every requested id; ids unknown to Dropbox map to None.
+    """
+    wanted = set(file_request_ids)
+    by_id = {fr.id: fr for fr in iter_file_requests(access_token) if fr.id in wanted}
+
+    status = {}
+    for request_id in file_request_ids:
+        fr = by_id.get(request_id)
+        if fr is None:
+            status[request_id] = None
+            continue
+        status[request_id] = {
+            'file_count': fr.file_count,
+            'is_open': fr.is_open,
+            'destination': fr.destination,
+            'deadline': fr.deadline.deadline if fr.deadline else None
+        }
+    return status
+
+# Columns of the file_request_state table in the project database, see
+# sync_file_request_state and dbox_sync_file_request_state in dropbox.jl.
+FR_STATE_COLUMNS = ('file_request_id', 'title', 'destination', 'journal', 'paper_id', 'round',
+                    'folder', 'file_count', 'is_open', 'deadline', 'created', 'state_hash')
+
+
+def _fr_state_row(fr):
+    "a FR_STATE_COLUMNS row for a FileRequest; paper fields are None outside /journal/slug/round/folder."
+    parts = (fr.destination or "").strip("/").split("/")
+    is_paper = len(parts) >= 4 and parts[2].isdigit()
+    deadline = fr.deadline.deadline if fr.deadline else None
+    state = (fr.title, fr.destination, fr.file_count, fr.is_open,
+             deadline.isoformat() if deadline else None)
+    return {
+        'file_request_id': fr.id,
+        'title': fr.title,
+        'destination': fr.destination,
+        'journal': parts[0] if is_paper else None,
+        'paper_id': parts[1].rsplit("-", 1)[-1] if is_paper else None,
+        'round': int(parts[2]) if is_paper else None,
+        'folder': parts[3] if is_paper else None,
+        'file_count': fr.file_count,
+        'is_open': fr.is_open,
+        'deadline': deadline,
+        'created': fr.created,
+        'state_hash': hashlib.sha1(json.dumps(state).encode()).hexdigest()
+    }
+
+
+@instrumented()
+@_retry_policy
+def sync_file_request_state(token=None, known=None):
+    """
+    Compare the state of all file requests with the last stored snapshot.
+
+    One paginated listing gives file_count, is_open, deadline and destination
+    of every file request. `known` maps file request id -> state_hash as
+    stored by the previous sync; only requests that are new or whose state
+    changed since are returned, so the caller writes just those rows. The
+    listing also refreshes the index behind file_request_exists.
+
+    Returns:
+        dict: 'changed' (columnar, one list per name in FR_STATE_COLUMNS),
+        'removed' (ids in `known` that Dropbox no longer has), 'listed' (the
+        number of file requests) and 'synced_at' (UTC time of the listing).
+    """
+    global _fr_index, _fr_index_built
+    known = dict(known or {})
+    synced_at = _utcnow()
+    file_requests = list(iter_file_requests(token))
+    with _fr_index_lock:
+        _fr_index = {fr.destination: fr for fr in file_requests}
+        _fr_index_built = time.time()
+
+    changed = {c: [] for c in FR_STATE_COLUMNS}
+    for fr in file_requests:
+        row = _fr_state_row(fr)
+        if known.get(fr.id) == row['state_hash']:
+            continue
+        for c in FR_STATE_COLUMNS:
+            changed[c].append(row[c])
+    listed = {fr.id for fr in file_requests}
+    return {'changed': changed, 'removed': [i for i in known if i not in listed],
+            'listed': len(listed), 'synced_at': synced_at}
+
+@instrumented()
+@_retry_policy
+def monitor_all_file_requests(access_token):
+    """
+    Check submission status for all file requests
+    """
+    # Get list of all file requests
+    file_requests = list(iter_file_requests(access_token))
+    
+    print(f"Found {len(file_requests)} file requests:")
+    
+    for request in file_requests:
+        print(f"\n--- File Request ---")
+        print(f"Title: {request.title}")
+        print(f"ID: {request.id}")
+        print(f"Status: {'Open' if request.is_open else 'Closed'}")
+        print(f"Files submitted: {request.file_count}")
+        print(f"Destination: {request.destination}")
+        
+        if request.file_count > 0:
+            print(f"✅ Has {request.file_count} submitted files")
+        else:
+            print("❌ No files submitted yet")
+
+def _close_file_requests(token, request_ids, max_workers=8):
+    "Close file requests concurrently. Returns {id: error message} for those that failed."
+    closed = run_many(_client_op(token, 'file_requests_update'),
+                      [{'id': i, 'open': False} for i in request_ids], max_workers=max_workers)
+    return {i: c['error'] for i, c in zip(request_ids, closed) if c['error'] is not None}
+
+
+def _delete_file_requests(token, request_ids, chunk_size=100):
+    """
+    Delete (closed) file requests with one file_requests_delete call per
+    `chunk_size` ids, each retried under the policy. Returns (deleted ids,
+    {id: error message}).
+    """
+    deleted, errors = [], {}
+    for start in range(0, len(request_ids), chunk_size):
+        chunk = request_ids[start:start + chunk_size]
+        try:
+            _call_with_backoff(_client_op(token, 'file_requests_delete'), (chunk,))
+            deleted.extend(chunk)
+        except Exception as e:
+            errors.update((i, f"{type(e).__name__}: {e}") for i in chunk)
+    _fr_index_drop(deleted)
+    return deleted, errors
+
+
+@instrumented()
+@_retry_policy
+def cleanup_file_requests(access_token, request_ids_to_delete, max_workers=8):
+    """
+    Delete file requests that are no longer needed
+    
+    The status of all ids comes from one listing, open requests are closed
+    concurrently (Dropbox refuses to delete an open file request), and all
+    are deleted with bulk file_requests_delete calls.
+
+    Args:
+        access_token (str): Dropbox access token
+        request_ids_to_delete (list): List of file request IDs to delete
+        max_workers (int): concurrent close calls
+
+    Returns:
+        dict: {id: 'deleted', 'not_found' or an error message}
+    """
+    if not request_ids_to_delete:
+        return {}
+
+    wanted = list(dict.fromkeys(request_ids_to_delete))
+    wanted_set = set(wanted)
+    by_id = {fr.id: fr for fr in iter_file_requests(access_token) if fr.id in wanted_set}
+
+    outcome = {i: 'not_found' for i in wanted if i not in by_id}
+    found = [i for i in wanted if i in by_id]
+
+    close_errors = _close_file_requests(access_token, [i for i in found if by_id[i].is_open],
+                                        max_workers=max_workers)
+    outcome.update(close_errors)
+
+    deleted, delete_errors = _delete_file_requests(access_token, [i for i in found if i not in close_errors])
+    outcome.update(delete_errors)
+    outcome.update((i, 'deleted') for i in deleted)
+
+    print(f"🗑️  Deleted {len(deleted)} of {len(wanted)} file requests")
+    return outcome
+
+def _folder_exists(token, path):
+    "True if `path` exists on Dropbox, False if it is not found; other errors are raised."
+    try:
+        dbx_client(token).files_get_metadata(path)
+        return True
+    except dropbox.exceptions.ApiError as e:
+        if (e.error.is_path() and e.error.get_path().is_not_found()) or 'not_found' in str(e).lower():
+            return False
+        raise
+
+
+@instrumented()
+@_retry_policy
+def monitor_viable_file_requests(access_token, only_open=True, delete=False, max_workers=8):
+    """
+    Monitor file requests that are viable and optionally clean up problematic ones
+    
+    Destination folders are probed concurrently (one files_get_metadata per
+    distinct folder, `max_workers` at a time), and all deletions go out in
+    bulk file_requests_delete calls.
+
+    Args:
+        access_token (str): Dropbox access token
+        only_open (bool): Only monitor open file requests
+        delete (bool): If True, delete closed requests or requests with missing destination folders
+        max_workers (int): concurrent folder probes and closes
+    
+    Returns:
+        dict: 'viable' (list of viable file requests), 'closed' and
+        'missing_folder' (lists of ids), 'deleted' (ids actually deleted)
+        and 'errors' ({id: message} for failed probes, closes or deletes).
+    """
+    result = {'viable': [], 'closed': [], 'missing_folder': [], 'deleted': [], 'errors': {}}
+
+    file_requests = list(iter_file_requests(access_token))
+    result['closed'] = [fr.id for fr in file_requests if not fr.is_open]
+
+    # closed requests are only checked further if we neither delete nor skip them
+    to_check = [fr for fr in file_requests if fr.is_open or not (delete or only_open)]
+    destinations = sorted({fr.destination for fr in to_check})
+    probes = dict(zip(destinations, run_many(functools.partial(_folder_exists, access_token),
+                                             destinations, max_workers=max_workers)))
+
+    for fr in to_check:
+        probe = probes[fr.destination]
+        if probe['error'] is not None:
+            # some other API error - might still be viable
+            result['errors'][fr.id] = probe['error']
+            result['viable'].append(fr)
+        elif probe['result']:
+            result['viable'].append(fr)
+        else:
+            result['missing_folder'].append(fr.id)
+
+    if delete:
+        # Dropbox refuses to delete an open file request; close those first
+        by_id = {fr.id: fr for fr in file_requests}
+        to_close = [i for i in result['missing_folder'] if by_id[i].is_open]
+        close_errors = _close_file_requests(access_token, to_close, max_workers=max_workers)
+        result['errors'].update(close_errors)
+
+        stale = [i for i in result['closed'] + result['missing_folder'] if i not in close_errors]
+        result['deleted'], delete_errors = _delete_file_requests(access_token, stale)
+        result['errors'].update(delete_errors)
+
+    print(f"📋 {len(file_requests)} file requests: {len(result['viable'])} viable, "
+          f"{len(result['closed'])} closed, {len(result['missing_folder'])} with missing folder, "
+          f"{len(result['deleted'])} deleted, {len(result['errors'])} errors")
+    return result
+
+@instrumented()
+@_retry_policy
+def create_password_protected_link(path, password, token):
+    """
+    Create a password-protected shared link for a Dropbox path.
+
+    Args:
+        path: Dropbox path (e.g., "/JPE/Surname-12345678/1/replication-package")
+        password: Password to protect the link
+        token: Dropbox access token
+
+    Returns:
+        dict: {'url': str, 'id': str, 'path': str}
+    """
+    dbx = dbx_client(token)
+    from dropbox.sharing import SharedLinkSettings, RequestedVisibility
+
+    # any existing link for this path is replaced below
+    _link_cache_drop(path=path)
+
+    settings = SharedLinkSettings(
+        requested_visibility=RequestedVisibility.password,
+        link_password=password
+    )
+
+    try:
+        link = dbx.sharing_create_shared_link_with_settings(path, settings)
+        return {
+            'url': link.url,
+            'id': link.url,
+            'path': link.path_lower
+        }
+    except dropbox.exceptions.ApiError as e:
+        if hasattr(e.error, 'is_shared_link_already_exists') and e.error.is_shared_link_already_exists():
+            existing_link = e.error.get_shared_link_already_exists().metadata
+            dbx.sharing_revoke_shared_link(existing_link.url)
+            link = dbx.sharing_create_shared_link_with_settings(path, settings)
+            return {
+                'url': link.url,
+                'id': link.url,
+                'path': link.path_lower
+            }
+        else:
+            raise
+
+
+@instrumented()
+@_retry_policy
+def revoke_shared_link(url, token):
+    """
+    Revoke a Dropbox shared link.
+
+    Args:
+        url: The shared link URL to revoke
+        token: Dropbox access token
+    """
+    dbx = dbx_client(token)
+    dbx.sharing_revoke_shared_link(url)
+    _link_cache_drop(url=url)
+
+
+@instrumented()
+@_retry_policy
+def upload_text(path, text, token):
+    """Upload a UTF-8 string to a Dropbox path, overwriting if it exists. For testing only."""
+    from dropbox.files import WriteMode
+    dbx = dbx_client(token)
+    dbx.files_upload(text.encode('utf-8'), path, mode=WriteMode.overwrite)
+
+
+# Chunk size for upload sessions (Dropbox accepts at most 150 MB per request).
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+# Upload sessions left behind by failed uploads, so that a later call for the
+# same file can resume from the last committed offset instead of starting over.
+# (local_path, dropbox_path) -> {'session_id', 'offset', 'closed', 'size', 'mtime'}
+_upload_sessions = {}
+_upload_lock = threading.Lock()
+
+
+def _upload_chunks(token, local_path, dropbox_path, chunk_size, max_retries=5):
+    """
+    Upload a local file into a Dropbox upload session, one chunk at a time.
+
+    Resumes a session left by an earlier failed call for the same file if the
+    file is unchanged. Returns the cursor of the closed session, ready to be
+    finished.
+    """
+    from dropbox.files import UploadSessionCursor
+
+    st = os.stat(local_path)
+    key = (local_path, dropbox_path)
+    with _upload_lock:
+        state = _upload_sessions.get(key)
+    if state is not None and (state['size'], state['mtime']) != (st.st_size, st.st_mtime):
+        state = None
+
+    if state is None:
+        state = {'session_id': dbx_client(token).files_upload_session_start(b"").session_id,
+                 'offset': 0, 'closed': False, 'size': st.st_size, 'mtime': st.st_mtime}
+    cursor = UploadSessionCursor(session_id=state['session_id'], offset=state['offset'])
+
+    attempt = 0
+    with open(local_path, "rb") as f:
+        while not state['closed']:
+            with _upload_lock:
+                _upload_sessions[key] = dict(state)
+            f.seek(cursor.offset)
+            chunk = f.read(chunk_size)
+            close = cursor.offset + len(chunk) >= st.st_size
+            try:
+                dbx_client(token).files_upload_session_append_v2(chunk, cursor, close=close)
+            except dropbox.exceptions.ApiError as e:
+                if e.error.is_incorrect_offset():
+                    # Dropbox has more (or less) than we thought: continue from there
+                    cursor.offset = e.error.get_incorrect_offset().correct_offset
+                    state['offset'] = cursor.offset
+                    continue
+                if e.error.is_not_found():
+                    # the session expired; start over
+                    with _upload_lock:
+                        _upload_sessions.pop(key, None)
+                raise
+            except (requests.exceptions.RequestException,
+                    dropbox.exceptions.RateLimitError,
+                    dropbox.exceptions.InternalServerError) as e:
+                if attempt >= max_retries:
+                    raise _give_up(e) from e
+                _note_rate_limit(getattr(e, 'backoff', None))
+                record_retry("upload_file")
+                time.sleep(_backoff_delay(attempt, getattr(e, 'backoff', None)))
+                attempt += 1
+                continue
+            attempt = 0
+            cursor.offset += len(chunk)
+            state['offset'] = cursor.offset
+            state['closed'] = close
+
+    with _upload_lock:
+        _upload_sessions[key] = dict(state)
+    return cursor
+
+
+@instrumented()
+@_retry_policy
+def upload_file(local_path, dropbox_path, token, chunk_size=UPLOAD_CHUNK_SIZE):
+    """
+    Upload a local file of any size to a Dropbox path, overwriting if it exists.
+
+    The file goes up in chunks of `chunk_size` bytes through an upload session,
+    so memory use is bounded by one chunk. If the upload fails, calling
+    upload_file again with the same arguments resumes where it stopped.
+
+    Returns:
+        dict: {'path', 'size', 'content_hash', 'rev'} of the uploaded file.
+    """
+    from dropbox.files import CommitInfo, WriteMode
+
+    cursor = _upload_chunks(token, local_path, dropbox_path, chunk_size)
+    meta = dbx_client(token).files_upload_session_finish(
+        b"", cursor, CommitInfo(path=dropbox_path, mode=WriteMode.overwrite))
+    with _upload_lock:
+        _upload_sessions.pop((local_path, dropbox_path), None)
+    return {'path': meta.path_display, 'size': meta.size,
+            'content_hash': meta.content_hash, 'rev': meta.rev}
+
+
+@instrumented()
+@_retry_policy
+def upload_files(pairs, token, chunk_size=UPLOAD_CHUNK_SIZE, max_workers=4):
+    """
+    Upload several local files concurrently and commit them all at once.
+
+    Args:
+        pairs (list): (local_path, dropbox_path) tuples.
+        token: Dropbox access token.
+        chunk_size (int): bytes per upload request.
+        max_workers (int): files uploaded in parallel.
+
+    Returns:
+        list: one dict {'result', 'error'} per pair, in input order; 'result'
+        is as for upload_file.
+    """
+    from dropbox.files import CommitInfo, UploadSessionFinishArg, WriteMode
+
+    pairs = [tuple(p) for p in pairs]
+    uploads = run_many(functools.partial(_upload_chunks, token, chunk_size=chunk_size),
+                       pairs, max_workers=max_workers)
+
+    results = list(uploads)
+    ready = [i for i, u in enumerate(uploads) if u['error'] is None]
+    # finish_batch_v2 takes at most 1000 entries
+    for start in range(0, len(ready), 1000):
+        idx = ready[start:start + 1000]
+        entries = [UploadSessionFinishArg(cursor=uploads[i]['result'],
+                                          commit=CommitInfo(path=pairs[i][1], mode=WriteMode.overwrite))
+                   for i in idx]
+        batch = dbx_client(token).files_upload_session_finish_batch_v2(entries)
+        for i, entry in zip(idx, batch.entries):
+            if entry.is_success():
+                meta = entry.get_success()
+                results[i] = {'result': {'path': meta.path_display, 'size': meta.size,
+                                         'content_hash': meta.content_hash, 'rev': meta.rev},
+                              'error': None, 'kind': None}
+                with _upload_lock:
+                    _upload_sessions.pop(pairs[i], None)
+            else:
+                results[i] = {'result': None, 'error': f"UploadSessionFinishError: {entry.get_failure()}",
+                              'kind': 'permanent'}
+    return results
+
+
+@instrumented()
+@_retry_policy
+def download_via_password_link(url, password, token):
+    """
+    Download file content from a password-protected Dropbox shared link.
+    Uses sharing_get_shared_link_file which accepts link_password directly.
+    Returns the file content as bytes.
+    """
+    dbx = dbx_client(token)
+    metadata, response = dbx.sharing_get_shared_link_file(url=url, link_password=password)
+    return response.content
+
+
+# Bytes per read when streaming downloads to disk.
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+_CONTENT_HASH_BLOCK = 4 * 1024 * 1024
+
+
+class _ContentHasher:
+    """
+    Dropbox content_hash: SHA-256 over the concatenated SHA-256 digests of
+    each 4 MB block of the file.
+    """
+
+    def __init__(self):
+        self._overall = hashlib.sha256()
+        self._block = hashlib.sha256()
+        self._block_pos = 0
+
+    def update(self, data):
+        view = memoryview(data)
+        while view:
+            n = min(len(view), _CONTENT_HASH_BLOCK - self._block_pos)
+            self._block.update(view[:n])
+            self._block_pos += n
+            view = view[n:]
+            if self._block_pos == _CONTENT_HASH_BLOCK:
+                self._overall.update(self._block.digest())
+                self._block = hashlib.sha256()
+                self._block_pos = 0
+
+    def hexdigest(self):
+        overall = self._overall.copy()
+        if self._block_pos > 0:
+            overall.update(self._block.digest())
+        return overall.hexdigest()
+
+
+def _stream_download(endpoint, api_arg, local_path, token, content_hash=None,
+                     chunk_size=DOWNLOAD_CHUNK_SIZE, max_retries=5, progress=True):
+    """
+    Stream a Dropbox content endpoint (e.g. "files/download") to `local_path`.
+
+    Data goes to `local_path + ".part"` in chunks, which is renamed when the
+    download is complete. An existing .part file is resumed with an HTTP range
+    request, as is a download interrupted by a network error. The file is
+    checked against `content_hash` (or the one Dropbox sends) and its size.
+
+    Returns:
+        dict: the metadata Dropbox sends in the Dropbox-API-Result header.
+    """
+    session = _http_session()
+    part_path = local_path + ".part"
+    name = os.path.basename(local_path)
+    attempt = 0
+
+    while True:
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        live = _live_token(token)
+        headers = {"Authorization": f"Bearer {live}",
+                   "Dropbox-API-Arg": json.dumps(api_arg)}
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+        try:
+            with instrument(f"dropbox/{endpoint}") as m, \
+                    session.post(f"https://content.dropboxapi.com/2/{endpoint}",
+                                 headers=headers, stream=True, timeout=60) as response:
+                if response.status_code == 416:
+                    # the .part file is already complete (or bogus): start over
+                    os.remove(part_path)
+                    continue
+                if response.status_code == 429:
+                    retry_after = response.headers.get("Retry-After")
+                    raise dropbox.exceptions.RateLimitError(
+                        None, backoff=int(retry_after) if retry_after else None)
+                if response.status_code >= 500:
+                    raise dropbox.exceptions.InternalServerError(
+                        None, response.status_code, response.text)
+                if response.status_code == 401:
+                    e = dropbox.exceptions.AuthError(None, response.text)
+                    e.token = live
+                    raise e
+                if response.status_code >= 400:
+                    raise RuntimeError(f"Dropbox API error downloading {name}: "
+                                       f"{response.status_code} {response.text}")
+
+                meta = json.loads(response.headers["Dropbox-API-Result"])
+                if response.status_code != 206:
+                    offset = 0  # the server ignored our range: rewrite from scratch
+
+                hasher = _ContentHasher()
+                if offset:
+                    with open(part_path, "rb") as f:
+                        for block in iter(lambda: f.read(_CONTENT_HASH_BLOCK), b""):
+                            hasher.update(block)
+
+                done, t0, last = offset, time.monotonic(), time.monotonic()
+                with open(part_path, "ab" if offset else "wb") as f:
+                    for chunk in response.iter_content(chunk_size=chunk_size):
+                        f.write(chunk)
+                        hasher.update(chunk)
+                        done += len(chunk)
+                        m.add_bytes(len(chunk))
+                        now = time.monotonic()
+                        if progress and now - last >= 5:
+                            rate = (done - offset) / (now - t0) / 1024**2
+                            print(f"⬇️  {name}: {done / 1024**2:.0f} MB ({rate:.1f} MB/s)")
+                            last = now
+        except (requests.exceptions.RequestException,
+                dropbox.exceptions.RateLimitError,
+                dropbox.exceptions.InternalServerError) as e:
+            if attempt >= max_retries:
+                raise _give_up(e) from e
+            _note_rate_limit(getattr(e, 'backoff', None))
+            record_retry(f"dropbox/{endpoint}")
+            time.sleep(_backoff_delay(attempt, getattr(e, 'backoff', None)))
+            attempt += 1
+            continue
+        break
+
+    expected_hash = content_hash or meta.get("content_hash")
+    expected_size = meta.get("size")
+    if expected_size is not None and done != expected_size:
+        raise RuntimeError(f"Download of {name} incomplete: {done} of {expected_size} bytes.")
+    if expected_hash is not None and hasher.hexdigest() != expected_hash:
+        os.remove(part_path)
+        raise RuntimeError(f"Download of {name} is corrupt: content hash mismatch.")
+
+    os.replace(part_path, local_path)
+    if progress:
+        elapsed = max(time.monotonic() - t0, 1e-9)
+        print(f"✅ {name}: {done / 1024**2:.1f} MB ({(done - offset) / elapsed / 1024**2:.1f} MB/s)")
+    return meta
+
+
+@instrumented()
+@_retry_policy
+def download_shared_link_to_file(url, local_path, token, password=None, progress=True):
+    """
+    Download the file behind a (possibly password-protected) shared link to
+    `local_path`, streaming it to disk.
+
+    Resumes a partial download left by an earlier call. If the link points to
+    a file in our own Dropbox, the result is verified against its content_hash.
+
+    Returns:
+        dict: {'path', 'size', 'content_hash'} of the local file.
+    """
+    api_arg = {"url": url}
+    if password is not None:
+        api_arg["link_password"] = password
+
+    # shared link metadata carries no content_hash; look it up if the file is ours
+    content_hash = None
+    try:
+        link_meta = dbx_client(token).sharing_get_shared_link_metadata(url, link_password=password)
+        if link_meta.id is not None:
+            content_hash = dbx_client(token).files_get_metadata(link_meta.id).content_hash
+    except dropbox.exceptions.ApiError:
+        pass
+
+    meta = _stream_download("sharing/get_shared_link_file", api_arg, local_path, token,
+                            content_hash=content_hash, progress=progress)
+    return {'path': local_path, 'size': meta.get("size"), 'content_hash': content_hash}
+
+
+@instrumented()
+@_retry_policy
+def download_file(dropbox_path, local_path, token, progress=True):
+    """
+    Download a file from our Dropbox to `local_path`, streaming it to disk and
+    verifying its content_hash. Parent folders are created as needed.
+
+    Returns:
+        dict: Dropbox metadata of the file ('rev', 'content_hash', 'size', ...).
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(local_path)), exist_ok=True)
+    return _stream_download("files/download", {"path": dropbox_path}, local_path, token,
+                            progress=progress)
+
+
+def local_content_hash(local_path):
+    "Dropbox content_hash of a local file."
+    hasher = _ContentHasher()
+    with open(local_path, "rb") as f:
+        for block in iter(lambda: f.read(_CONTENT_HASH_BLOCK), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def _index_connect():
+    """
+    Open the local index of downloaded Dropbox files, a SQLite file at
+    $JPE_DBOX_INDEX or $JPE_DB/dropbox_index.sqlite.
+    """
+    path = os.environ.get("JPE_DBOX_INDEX") or os.path.join(os.environ["JPE_DB"], "dropbox_index.sqlite")
+    con = sqlite3.connect(path)
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS dropbox_files (
+            path_lower      TEXT PRIMARY KEY,
+            rev             TEXT,
+            content_hash    TEXT,
+            size            INTEGER,
+            server_modified TEXT,
+            local_path      TEXT,
+            local_mtime     REAL,
+            synced_at       TEXT
+        )""")
+    con.execute("CREATE INDEX IF NOT EXISTS dropbox_files_hash ON dropbox_files (content_hash)")
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS shared_links (
+            path_lower TEXT PRIMARY KEY,
+            url        TEXT,
+            visibility TEXT,
+            expires    TEXT,
+            updated_at TEXT
+        )""")
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS dropbox_cursors (
+            root       TEXT PRIMARY KEY,
+            cursor     TEXT,
+            updated_at TEXT
+        )""")
+    return con
+
+
+def _index_record(con, entry, local_path):
+    con.execute("""
+        INSERT OR REPLACE INTO dropbox_files
+        (path_lower, rev, content_hash, size, server_modified, local_path, local_mtime, synced_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+        (entry.path_lower, entry.rev, entry.content_hash, entry.size,
+         entry.server_modified.isoformat(), local_path, os.path.getmtime(local_path),
+         datetime.now(timezone.utc).isoformat()))
+
+
+@instrumented()
+@_retry_policy
+def sync_folder(remote, local, token, max_workers=4, progress=False):
+    """
+    Make the local folder `local` a copy of the Dropbox folder `remote`,
+    transferring only what changed.
+
+    Every file's Dropbox content_hash is compared with the local index (and,
+    for files the index does not know, with the hash of the local file). A
+    file whose content already exists elsewhere on disk, e.g. in the previous
+    round's package, is copied locally. Only the rest is downloaded.
+    Local files that no longer exist on Dropbox are left alone.
+
+    Returns:
+        dict: counts of 'unchanged', 'copied' and 'downloaded' files,
+        'bytes_downloaded', and 'errors' as {dropbox path: message}.
+    """
+    remote = remote.rstrip("/")
+    entries = [e for e in iter_folder(remote, token) if isinstance(e, FileMetadata)]
+
+    con = _index_connect()
+    summary = {'unchanged': 0, 'copied': 0, 'downloaded': 0, 'bytes_downloaded': 0, 'errors': {}}
+    to_download = []
+    try:
+        for entry in entries:
+            target = os.path.join(local, entry.path_display[len(remote):].lstrip("/"))
+
+            if os.path.isfile(target) and os.path.getsize(target) == entry.size:
+                row = con.execute(
+                    "SELECT content_hash, local_path, local_mtime FROM dropbox_files WHERE path_lower = ?",
+                    (entry.path_lower,)).fetchone()
+                known = row is not None and row == (entry.content_hash, target, os.path.getmtime(target))
+                if known or local_content_hash(target) == entry.content_hash:
+                    _index_record(con, entry, target)
+                    summary['unchanged'] += 1
+                    continue
+
+            # same content somewhere else on disk?
+            source = None
+            for path, mtime in con.execute(
+                    "SELECT local_path, local_mtime FROM dropbox_files WHERE content_hash = ?",
+                    (entry.content_hash,)):
+                # only trust copies that were not touched since we recorded them
+                if path != target and os.path.isfile(path) and os.path.getmtime(path) == mtime:
+                    source = path
+                    break
+            if source is not None:
+                os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+                shutil.copyfile(source, target)
+                _index_record(con, entry, target)
+                summary['copied'] += 1
+                continue
+
+            to_download.append((entry, target))
+
+        downloads = run_many(lambda e, t: download_file(e.path_display, t, token, progress=progress),
+                             to_download, max_workers=max_workers)
+        for (entry, target), d in zip(to_download, downloads):
+            if d['error'] is None:
+                _index_record(con, entry, target)
+                summary['downloaded'] += 1
+                summary['bytes_downloaded'] += entry.size
+            else:
+                summary['errors'][entry.path_display] = d['error']
+        con.commit()
+    finally:
+        con.close()
+
+    print(f"🔄 {remote}: {summary['unchanged']} unchanged, {summary['copied']} copied locally, "
+          f"{summary['downloaded']} downloaded ({summary['bytes_downloaded'] / 1024**2:.1f} MB), "
+          f"{len(summary['errors'])} errors")
+    return summary
+
+
+# Inventory of the app folder from one recursive listing, and per-folder
+# stats, both reused for INVENTORY_TTL seconds.
+INVENTORY_TTL = 600
+INVENTORY_COLUMNS = ('journal', 'paper_slug', 'paper_id', 'round', 'folder',
+                     'n_files', 'bytes', 'largest_file', 'largest_bytes')
+_inventory = None
+_inventory_index = {}
+_inventory_at = 0.0
+_folder_stats = {}
+_inventory_lock = threading.Lock()       # guards the data above, held briefly
+_inventory_scan_lock = threading.Lock()  # one scan at a time; not held by readers
+
+
+def _add_to_stats(stats, entry):
+    stats['n_files'] += 1
+    stats['bytes'] += entry.size
+    if stats['largest_file'] is None or entry.size > stats['largest_bytes']:
+        stats['largest_file'] = entry.path_display
+        stats['largest_bytes'] = entry.size
+
+
+def _empty_stats():
+    return {'n_files': 0, 'bytes': 0, 'largest_file': None, 'largest_bytes': 0}
+
+
+@instrumented()
+@_retry_policy
+def scan_inventory(token=None, root="", max_age=INVENTORY_TTL):
+    """
+    File counts, total size and largest file for every folder
+    /{journal}/{slug}/{round}/{folder} under `root`, from a single recursive
+    listing. Files lying directly in a round folder are counted under
+    folder "". A scan younger than `max_age` seconds is reused.
+
+    Returns:
+        dict: columnar result, one list per name in INVENTORY_COLUMNS, ready
+        for a DataFrame or a DuckDB table.
+    """
+    global _inventory, _inventory_index, _inventory_at
+
+    def fresh():
+        with _inventory_lock:
+            if _inventory is not None and time.time() - _inventory_at < max_age:
+                return _inventory
+        return None
+
+    columns = fresh()
+    if columns is not None:
+        return columns
+    # concurrent callers wait for one scan and reuse it; folder_stats does not wait
+    with _inventory_scan_lock:
+        columns = fresh()
+        if columns is not None:
+            return columns
+
+        groups = {}
+        for entry in iter_folder(root, token):
+            if not isinstance(entry, FileMetadata):
+                continue
+            parts = entry.path_display.strip("/").split("/")
+            if len(parts) < 4 or not parts[2].isdigit():
+                continue
+            folder = parts[3] if len(parts) > 4 else ""
+            key = (parts[0], parts[1], int(parts[2]), folder)
+            _add_to_stats(groups.setdefault(key, _empty_stats()), entry)
+
+        columns = {c: [] for c in INVENTORY_COLUMNS}
+        index = {}
+        for (journal, slug, round_, folder), stats in sorted(groups.items()):
+            row = {'journal': journal, 'paper_slug': slug, 'paper_id': slug.rsplit("-", 1)[-1],
+                   'round': round_, 'folder': folder, **stats}
+            for c in INVENTORY_COLUMNS:
+                columns[c].append(row[c])
+            index[f"/{journal}/{slug}/{round_}/{folder}".lower()] = stats
+
+        with _inventory_lock:
+            _inventory, _inventory_index, _inventory_at = columns, index, time.time()
+        return columns
+
+
+@instrumented()
+@_retry_policy
+def folder_stats(path, token=None, max_age=INVENTORY_TTL):
+    """
+    {'n_files', 'bytes', 'largest_file', 'largest_bytes'} for a Dropbox folder.
+
+    Served from a fresh inventory scan if it covers `path`, else from a
+    recent listing of the same folder, else by listing it now.
+    """
+    key = "/" + path.strip("/").lower()
+    now = time.time()
+    with _inventory_lock:
+        if _inventory is not None and now - _inventory_at < max_age and key in _inventory_index:
+            return dict(_inventory_index[key])
+        cached = _folder_stats.get(key)
+        if cached is not None and now - cached[0] < max_age:
+            return dict(cached[1])
+
+    stats = _empty_stats()
+    for entry in iter_folder(path, token):
+        if isinstance(entry, FileMetadata):
+            _add_to_stats(stats, entry)
+    with _inventory_lock:
+        _folder_stats[key] = (time.time(), stats)
+    return dict(stats)
+
+
+# Folders inside a round that file requests upload into.
+_UPLOAD_FOLDERS = ("replication-package", "paper-appendices", "replicator-upload")
+# Earliest time the next longpoll may be issued, as asked by Dropbox.
+_longpoll_not_before = 0.0
+
+
+def _upload_event(entry):
+    """
+    Turn the metadata of a new file at /{journal}/{slug}/{round}/{folder}/...
+    into an arrival event, or None for files elsewhere.
+    """
+    parts = entry.path_display.strip("/").split("/")
+    if len(parts) < 5 or parts[3] not in _UPLOAD_FOLDERS:
+        return None
+    journal, slug, round_, folder = parts[:4]
+    return {
+        'journal': journal,
+        'paper_slug': slug,
+        'paper_id': slug.rsplit("-", 1)[-1],
+        'round': int(round_) if round_.isdigit() else round_,
+        'folder': folder,
+        'path': entry.path_display,
+        'size': entry.size,
+        'content_hash': entry.content_hash,
+        'server_modified': entry.server_modified
+    }
+
+
+@instrumented()
+@_retry_policy
+def read_changes(token, root="", wait=True, timeout=30):
+    """
+    The files that arrived in upload folders since the saved cursor, without
+    moving it.
+
+    Reads the files_list_folder cursor for `root` (recursive; "" is the app
+    folder /Apps/JPE-packages) from the local index. Without a saved cursor,
+    returns no events and the latest cursor. With `wait`, blocks in
+    files_list_folder_longpoll for up to `timeout` seconds (30-480) until
+    something changes. Pass the returned cursor to save_cursor once the
+    events are stored, so that nothing is lost if that fails.
+
+    Returns:
+        dict: 'cursor' and 'events', one dict per new or modified file with
+        'journal', 'paper_slug', 'paper_id', 'round', 'folder', 'path',
+        'size', 'content_hash' and 'server_modified' (the real upload time).
+    """
+    global _longpoll_not_before
+    dbx = dbx_client(token)
+    con = _index_connect()
+    try:
+        row = con.execute("SELECT cursor FROM dropbox_cursors WHERE root = ?", (root,)).fetchone()
+    finally:
+        con.close()
+    if row is None:
+        return {'cursor': dbx.files_list_folder_get_latest_cursor(root, recursive=True).cursor, 'events': []}
+
+    cursor = row[0]
+    if wait:
+        time.sleep(max(0.0, _longpoll_not_before - time.time()))
+        poll = dbx.files_list_folder_longpoll(cursor, timeout=timeout)
+        if poll.backoff:
+            _longpoll_not_before = time.time() + poll.backoff
+        if not poll.changes:
+            return {'cursor': cursor, 'events': []}
+
+    events = []
+    while True:
+        result = dbx.files_list_folder_continue(cursor)
+        for entry in result.entries:
+            if isinstance(entry, FileMetadata):
+                event = _upload_event(entry)
+                if event is not None:
+                    events.append(event)
+        cursor = result.cursor
+        if not result.has_more:
+            break
+    return {'cursor': cursor, 'events': events}
+
+
+def save_cursor(cursor, root=""):
+    "store the change feed cursor for `root` returned by read_changes."
+    con = _index_connect()
+    try:
+        con.execute("INSERT OR REPLACE INTO dropbox_cursors (root, cursor, updated_at) VALUES (?, ?, ?)",
+                    (root, cursor, datetime.now(timezone.utc).isoformat()))
+        con.commit()
+    finally:
+        con.close()
+
+
+def poll_changes(token, root="", wait=True, timeout=30):
+    """
+    read_changes and save_cursor in one: the events since the last call, as
+    a list. The first call only records the cursor and returns nothing.
+    """
+    changes = read_changes(token, root=root, wait=wait, timeout=timeout)
+    save_cursor(changes['cursor'], root=root)
+    return changes['events']
+
+
+def watch_uploads(token, root="", timeout=30):
+    """
+    Generator of arrival events (see read_changes), blocking cheaply in
+    longpoll between changes. Runs until the consumer stops iterating; the
+    cursor moves once the consumer has taken all events of a poll.
+    """
+    while True:
+        changes = read_changes(token, root=root, wait=True, timeout=timeout)
+        yield from changes['events']
+        save_cursor(changes['cursor'], root=root)
+
+
+@instrumented()
+@_retry_policy
+def delete_dropbox_path(path, token):
+    """Delete a file or folder at a Dropbox path. For testing only."""
+    dbx = dbx_client(token)
+    dbx.files_delete_v2(path)
+
+
+# Usage examples:
+#
+# # Just monitor (default behavior)
+# viable_requests = monitor_viable_file_requests(access_token)['viable']
+# 
+# # Monitor and automatically delete closed/problematic requests
+# audit = monitor_viable_file_requests(access_token, delete=True)
+# 
+# # Monitor all requests (including closed ones) but don't delete
+# all_viable = monitor_viable_file_requests(access_token, only_open=False, delete=False)['viable']
+# 
+# # Monitor all requests and clean up problematic ones
+# audit = monitor_viable_file_requests(access_token, only_open=False, delete=True)
\ No newline at end of file
@@ -0,0 +1,343 @@
+# Async Dropbox backend for high fan-out operations.
+#
+# Builds on db_filerequests (token handling, back-off, the shared-link cache and
+# the file request index). Requests go straight to the HTTP API through one httpx.AsyncClient (HTTP/2 if
+# the h2 package is installed) with a semaphore bounding requests in flight.
+# Arguments and results are (de)serialized with the SDK's own stone types, so
+# the coroutines return and raise exactly what the SDK functions do.
+#
+# httpx is optional: nothing here imports it until an AsyncDropbox is created.
+#
+# usage from julia (sync facade, runs on a background event loop):
+#   jpy.links_at_paths_async(paths, token)
+#   jpy.check_file_requests_async(token, ids)
+# or swap the backend under the existing jpy.get_link_at_path(...) call sites:
+#   jpy.use_async_backend(true)
+
+import os
+import json
+import asyncio
+import threading
+import contextvars
+import importlib.util
+from datetime import datetime, timedelta, timezone
+
+import dropbox
+from dropbox import stone_serializers
+from dropbox.exceptions import ApiError, AuthError, BadInputError, InternalServerError, RateLimitError
+from dropbox.file_requests import CreateFileRequestArgs, FileRequestDeadline, GetFileRequestArgs
+from dropbox.files import FileMetadata
+from dropbox.sharing import RequestedVisibility, SharedLinkSettings
+
+from . import db_filerequests
+from .db_filerequests import (_backoff_delay, _fr_index_add, _give_up, _link_cache_get, _link_cache_put,
+                              _live_token, _note_rate_limit, _rate_limit_wait, _retry_policy,
+                              classify_error)
+from .metrics import instrument, record_retry
+
+DBX_API_URL = os.environ.get("JPE_DBOX_API_URL", "https://api.dropboxapi.com/2")
+DBX_ASYNC_CONCURRENCY = int(os.environ.get("JPE_DBOX_ASYNC_CONCURRENCY", "32"))
+
+
+class AsyncDropbox:
+    """
+    Coroutine versions of get_link_at_path, check_file_request_submissions,
+    submission_time and create_file_request sharing one connection pool.
+
+    Args:
+        token (str): access token; defaults to the module token (refreshed if stale).
+        max_concurrency (int): maximum number of requests in flight.
+        api_url (str): API base URL, e.g. a local stub server.
+        max_retries (int): retries on rate limiting and Dropbox 5xx errors.
+    """
+
+    def __init__(self, token=None, max_concurrency=DBX_ASYNC_CONCURRENCY, api_url=None,
+                 max_retries=5, timeout=30.0):
+        import httpx
+
+        self.token = token
+        self.api_url = (api_url or DBX_API_URL).rstrip("/")
+        self.max_retries = max_retries
+        self._sem = asyncio.Semaphore(max_concurrency)
+        self._client = httpx.AsyncClient(
+            http2=importlib.util.find_spec("h2") is not None,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_concurrency,
+                                max_keepalive_connections=max_concurrency),
+        )
+
+    async def aclose(self):
+        await self._client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    def _token(self):
+        return _live_token(_call_token.get() or self.token)
+
+    async def _call(self, endpoint, route, arg):
+        "POST one RPC route; decode the result or raise the SDK exception for the error."
+        body = json.dumps(stone_serializers.json_compat_obj_encode(route.arg_type, arg))
+        attempt = 0
+        while True:
+            await asyncio.sleep(_rate_limit_wait())
+            token = self._token()
+            try:
+                # timed from when a slot is free, so queueing is not counted as latency
+                async with self._sem:
+                    with instrument(f"dropbox/{endpoint}") as m:
+                        r = await self._client.post(
+                            f"{self.api_url}/{endpoint}",
+                            content=body,
+                            headers={"Authorization": f"Bearer {token}",
+                                     "Content-Type": "application/json"},
+                        )
+                        m.add_bytes(len(body) + len(r.content))
+                        request_id = r.headers.get("x-dropbox-request-id")
+                        if r.status_code == 200:
+                            return stone_serializers.json_compat_obj_decode(route.result_type, r.json(), strict=False)
+                        err = self._error(request_id, r)
+            except AuthError as e:
+                e.token = token  # retired by the retry policy of the caller
+                raise
+            except Exception as e:
+                kind, retry_after = classify_error(e)
+                if kind not in ('rate_limit', 'transient'):
+                    raise
+                if attempt >= self.max_retries:
+                    raise _give_up(e) from e
+                _note_rate_limit(retry_after)
+                record_retry(f"dropbox/{endpoint}")
+                await asyncio.sleep(_backoff_delay(attempt, retry_after))
+                attempt += 1
+                continue
+            if r.status_code == 409:
+                raise ApiError(request_id,
+                               stone_serializers.json_compat_obj_decode(route.error_type, err['error'], strict=False),
+                               err.get('user_message', {}).get('text'),
+                               err.get('user_message', {}).get('locale'))
+            raise BadInputError(request_id, r.text)
+
+    @staticmethod
+    def _error(request_id, r):
+        "raise for 401/429/5xx; return the parsed error body otherwise."
+        if r.status_code >= 500:
+            raise InternalServerError(request_id, r.status_code, r.text)
+        if r.status_code == 429:
+            retry_after = None
+            try:
+                retry_after = r.json()['error'].get('retry_after')
+            except (ValueError, KeyError, AttributeError):
+                pass
+            if retry_after is None and 'Retry-After' in r.headers:
+                retry_after = int(r.headers['Retry-After'])
+            raise RateLimitError(request_id, None, retry_after)
+        try:
+            err = r.json()
+        except ValueError:
+            raise BadInputError(request_id, r.text)
+        if r.status_code == 401:
+            raise AuthError(request_id, stone_serializers.json_compat_obj_decode(
+                dropbox.auth.AuthError_validator, err['error'], strict=False))
+        return err
+
+    async def get_link_at_path(self, path, expiry_days=None):
+        "get a shareable link for local path /Apps/JPE-packages/path"
+        cached = _link_cache_get(path)
+        if cached is not None:
+            return cached
+
+        expires = datetime.now(timezone.utc) + timedelta(days=expiry_days) if expiry_days is not None else None
+        arg = dropbox.sharing.CreateSharedLinkWithSettingsArg(
+            path=path,
+            settings=SharedLinkSettings(requested_visibility=RequestedVisibility.public, expires=expires),
+        )
+        try:
+            link = await self._call("sharing/create_shared_link_with_settings",
+                                    dropbox.sharing.create_shared_link_with_settings, arg)
+            _link_cache_put([link])
+            return link.url
+        except ApiError as e:
+            if not e.error.is_shared_link_already_exists():
+                raise
+            existing = e.error.get_shared_link_already_exists()
+            if existing is not None and existing.is_metadata():
+                link = existing.get_metadata()
+                _link_cache_put([link])
+                return link.url
+            links = await self._call("sharing/list_shared_links", dropbox.sharing.list_shared_links,
+                                     dropbox.sharing.ListSharedLinksArg(path=path, direct_only=True))
+            if links.links:
+                _link_cache_put([links.links[0]])
+                return links.links[0].url
+            raise RuntimeError(f"A shared link exists for {path} but could not be retrieved.")
+
+    async def check_file_request_submissions(self, file_request_id):
+        "same dict as check_file_request_submissions."
+        info = await self._call("file_requests/get", dropbox.file_requests.get,
+                                GetFileRequestArgs(id=file_request_id))
+        return {
+            'title': info.title,
+            'file_count': info.file_count,
+            'is_open': info.is_open,
+            'destination': info.destination,
+            'request_info': info
+        }
+
+    async def submission_time(self, destination_path):
+        "server_modified of the first file in destination_path, or None."
+        result = await self._call("files/list_folder", dropbox.files.list_folder,
+                                  dropbox.files.ListFolderArg(path=destination_path))
+        for entry in result.entries:
+            if isinstance(entry, FileMetadata):
+                return entry.server_modified
+        return None
+
+    async def create_file_request(self, title, destination_path, deadline_days=None):
+        "{'url', 'id'} of the new file request."
+        deadline = None
+        if deadline_days is not None:
+            deadline = FileRequestDeadline(deadline=datetime.now(timezone.utc) + timedelta(days=deadline_days))
+        fr = await self._call("file_requests/create", dropbox.file_requests.create,
+                              CreateFileRequestArgs(title=title, destination=destination_path,
+                                                    deadline=deadline))
+        _fr_index_add(fr)
+        return {'url': fr.url, 'id': fr.id}
+
+
+# ---- sync facade ------------------------------------------------------------
+# One event loop on a daemon thread owns a single AsyncDropbox, so its
+# connection pool survives between calls from Julia. The token is only a
+# header: each call sets the one it was given in _call_token, and the client
+# serves every token (tokens rotate every few hours).
+
+_async_loop = None
+_async_client = None
+_async_lock = threading.Lock()
+_call_token = contextvars.ContextVar("dbx_async_token", default=None)
+
+
+def _loop():
+    global _async_loop
+    with _async_lock:
+        if _async_loop is None:
+            _async_loop = asyncio.new_event_loop()
+            threading.Thread(target=_async_loop.run_forever, name="dbx-async", daemon=True).start()
+        return _async_loop
+
+
+def run_async(coro):
+    "run a coroutine on the backend loop and wait for its result."
+    return asyncio.run_coroutine_threadsafe(coro, _loop()).result()
+
+
+async def _client_for(token):
+    "the shared client, with `token` set for the calling task and the tasks it starts."
+    global _async_client
+    # created on the backend loop, which the semaphore and the pool belong to
+    if _async_client is None:
+        _async_client = AsyncDropbox()
+    _call_token.set(token)
+    return _async_client
+
+
+def async_dropbox():
+    "the shared AsyncDropbox; it uses the module token (refreshed if stale)."
+    return run_async(_client_for(None))
+
+
+def close_async_backend():
+    async def _close():
+        global _async_client
+        if _async_client is not None:
+            await _async_client.aclose()
+            _async_client = None
+    if _async_loop is not None:
+        run_async(_close())
+
+
+async def _gather(method, arg_list, token):
+    client = await _client_for(token)  # gather's tasks inherit the token
+    fn = getattr(client, method)
+    return await asyncio.gather(*(fn(*args) for args in arg_list), return_exceptions=True)
+
+
+def _many(method, arg_list, token):
+    "[{'result', 'error', 'kind'}] per argument tuple, in input order (as run_many)."
+    out = []
+    for res in run_async(_gather(method, arg_list, token)):
+        if isinstance(res, Exception):
+            out.append({'result': None, 'error': f"{type(res).__name__}: {res}", 'kind': classify_error(res)[0]})
+        else:
+            out.append({'result': res, 'error': None, 'kind': None})
+    return out
+
+
+def links_at_paths_async(paths, token=None, expiry_days=None):
+    return _many("get_link_at_path", [(p, expiry_days) for p in paths], token)
+
+
+def check_file_requests_async(token, ids):
+    return _many("check_file_request_submissions", [(i,) for i in ids], token)
+
+
+def submission_times_async(token, paths):
+    return _many("submission_time", [(p,) for p in paths], token)
+
+
+def create_file_requests_async(token, specs):
+    "specs: list of (title, destination_path, deadline_days)."
+    return _many("create_file_request", [tuple(s) for s in specs], token)
+
+
+# Drop-in replacements with the signatures of the blocking functions, so the
+# existing call sites can be switched to this backend with use_async_backend.
+# They run under the same retry policy as the functions they replace.
+
+@_retry_policy
+def _async_get_link_at_path(path, token, expiry_days=None):
+    return run_async(_async_call("get_link_at_path", token, path, expiry_days))
+
+
+@_retry_policy
+def _async_check_file_request_submissions(access_token, file_request_id, verbose=False):
+    return run_async(_async_call("check_file_request_submissions", access_token, file_request_id))
+
+
+@_retry_policy
+def _async_submission_time(token, destination_path):
+    return run_async(_async_call("submission_time", token, destination_path))
+
+
+@_retry_policy
+def _async_create_file_request(token, title, destination_path, deadline_days=None):
+    return run_async(_async_call("create_file_request", token, title, destination_path, deadline_days))
+
+
+async def _async_call(method, token, *args):
+    client = await _client_for(token)
+    return await getattr(client, method)(*args)
+
+
+_sync_backend = {}
+
+
+def use_async_backend(enable=True):
+    """
+    Route get_link_at_path, check_file_request_submissions, submission_time and
+    create_file_request through the async backend (enable=False restores the SDK ones).
+    """
+    target = vars(db_filerequests)
+    names = ("get_link_at_path", "check_file_request_submissions", "submission_time", "create_file_request")
+    if enable:
+        import httpx  # fail here, not on the first call, if it is missing
+        for name in names:
+            _sync_backend.setdefault(name, target[name])
+            target[name] = globals()["_async_" + name]
+    else:
+        for name in names:
+            if name in _sync_backend:
+                target[name] = _sync_backend.pop(name)
@@ -0,0 +1,638 @@
+import io
+import os
+import re
+import json
+import time
+import uuid
+import base64
+import random
+import hashlib
+import tempfile
+import mimetypes
+import threading
+import httplib2
+import requests
+from collections import OrderedDict
+from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest, MediaIoBaseUpload
+from datetime import datetime, timezone
+from email.generator import BytesGenerator
+from email.message import EmailMessage
+from email.utils import parseaddr
+from google.auth.exceptions import TransportError
+from google.oauth2.credentials import Credentials
+
+from .metrics import instrument, instrumented, record_retry
+
+
+
+# Access token cache. The token is handed out until TOKEN_EXPIRY_MARGIN
+# seconds before Google says it expires; the JSON file is only rewritten when
+# a refresh produced a new token.
+GMAIL_TOKEN_EXPIRY_MARGIN = 300
+_gmail_token_lock = threading.Lock()
+_gmail_token_info = None
+_gmail_token_expires = 0.0
+
+
+def _gmail_token_valid():
+    return _gmail_token_info is not None and time.time() < _gmail_token_expires - GMAIL_TOKEN_EXPIRY_MARGIN
+
+
+def refresh_access_token_from_json(force=False):
+    """
+    Refresh Gmail access token using JSON file path from JPE_GMAIL_TOKEN env var.
+    Returns a dictionary with token + client credentials for Gmail API.
+
+    The token is cached (in memory and, with its expiry, in the JSON file) and
+    only refreshed when it is about to expire or `force` is true.
+    """
+    global _gmail_token_info, _gmail_token_expires
+    if not force and _gmail_token_valid():
+        return _gmail_token_info
+
+    with _gmail_token_lock:
+        # another thread may have refreshed while we waited for the lock
+        if not force and _gmail_token_valid():
+            return _gmail_token_info
+
+        json_path = os.getenv("JPE_GMAIL_TOKEN")
+        if not json_path or not os.path.isfile(json_path):
+            raise FileNotFoundError("Missing or invalid JPE_GMAIL_TOKEN path.")
+
+        with open(json_path, "r") as f:
+            config = json.load(f)
+
+        refresh_token = config.get("REFRESH_TOKEN")
+        client_id = config.get("CLIENT_ID")
+        client_secret = config.get("CLIENT_SECRET")
+        token_uri = config.get("TOKEN_URI", "https://oauth2.googleapis.com/token")
+
+        if not all([refresh_token, client_id, client_secret]):
+            raise ValueError("Missing required fields in the token config JSON.")
+
+        token_info = {
+            "access_token": config.get("ACCESS_TOKEN"),
+            "refresh_token": refresh_token,
+            "client_id": client_id,
+            "client_secret": client_secret,
+            "token_uri": token_uri
+        }
+
+        # a token persisted by an earlier session may still be good
+        expires_at = config.get("ACCESS_TOKEN_EXPIRES_AT", 0)
+        if not force and token_info["access_token"] and time.time() < expires_at - GMAIL_TOKEN_EXPIRY_MARGIN:
+            _gmail_token_info, _gmail_token_expires = token_info, expires_at
+            return token_info
+
+        data = {
+            "client_id": client_id,
+            "client_secret": client_secret,
+            "refresh_token": refresh_token,
+            "grant_type": "refresh_token"
+        }
+
+        with instrument("gmail/oauth2/token"):
+            response = requests.post(token_uri, data=data)
+            if response.status_code != 200:
+                raise RuntimeError(f"Failed to refresh access token: {response.text}")
+
+        payload = response.json()
+        new_token = payload["access_token"]
+        expires_at = time.time() + payload.get("expires_in", 3600)
+
+        # Persist the updated token only if it changed
+        if new_token != config.get("ACCESS_TOKEN"):
+            config["ACCESS_TOKEN"] = new_token
+            config["ACCESS_TOKEN_EXPIRES_AT"] = expires_at
+            with open(json_path, "w") as f:
+                json.dump(config, f, indent=2)
+
+        token_info["access_token"] = new_token
+        _gmail_token_info, _gmail_token_expires = token_info, expires_at
+        return token_info
+
+
+
+# The Gmail service is built once (from the discovery document bundled with
+# googleapiclient, no network fetch) and reused until the access token changes.
+_gmail_service = None
+_gmail_service_token = None
+_gmail_service_lock = threading.Lock()
+
+
+class _InstrumentedHttpRequest(HttpRequest):
+    "times every API call as gmail/<method id>, e.g. gmail/gmail.users.messages.send."
+
+    def execute(self, http=None, num_retries=0):
+        with instrument(f"gmail/{self.methodId}") as m:
+            if self.resumable is not None:
+                m.add_bytes(self.resumable.size() or 0)
+            elif self.body:
+                m.add_bytes(len(self.body))
+            return super().execute(http=http, num_retries=num_retries)
+
+
+def build_gmail_service():
+    global _gmail_service, _gmail_service_token
+    token_info = refresh_access_token_from_json()
+
+    with _gmail_service_lock:
+        if _gmail_service is not None and _gmail_service_token == token_info["access_token"]:
+            return _gmail_service
+
+        creds = Credentials(
+            token=token_info["access_token"],
+            refresh_token=token_info["refresh_token"],
+            token_uri=token_info["token_uri"],
+            client_id=token_info["client_id"],
+            client_secret=token_info["client_secret"]
+        )
+
+        _gmail_service = build("gmail", "v1", credentials=creds,
+                               static_discovery=True, cache_discovery=False,
+                               requestBuilder=_InstrumentedHttpRequest)
+        _gmail_service_token = token_info["access_token"]
+        return _gmail_service
+
+
+# Messages whose attachments together exceed this many bytes are written to a
+# temporary file and sent as a resumable media upload instead of one base64
+# string in memory.
+ATTACHMENT_STREAM_THRESHOLD = 5 * 1024 * 1024
+# resumable upload chunk size; must be a multiple of 256 KB
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# raw bytes per base64 chunk; a multiple of 57 so every chunk encodes to whole 76-char lines
+_B64_READ_SIZE = 57 * 1024
+
+
+def _guess_type(file_path):
+    "MIME (maintype, subtype) of a file from its name, octet-stream if unknown or compressed."
+    ctype, encoding = mimetypes.guess_type(file_path)
+    if ctype is None or encoding is not None:
+        ctype = "application/octet-stream"
+    return ctype.split("/", 1)
+
+
+# Encoded attachment bodies, shared by all messages that attach the same
+# content: an LRU keyed by the SHA-256 of the file, bounded by the total size
+# of the encoded bodies (JPE_GMAIL_PART_CACHE_MB). Files are mapped to their
+# hash by (path, size, mtime), so an unchanged file is neither read nor
+# encoded again; a file edited in place gets a new mtime and is re-read.
+# Files larger than PART_CACHE_MAX_FILE are always streamed from disk.
+PART_CACHE_BYTES = int(float(os.getenv("JPE_GMAIL_PART_CACHE_MB", "64")) * 1024 * 1024)
+PART_CACHE_MAX_FILE = ATTACHMENT_STREAM_THRESHOLD
+_part_cache = OrderedDict()    # sha256 -> base64 body
+_part_cache_files = {}         # (path, size, mtime_ns) -> sha256
+_part_cache_size = 0
+_part_cache_stats = {"hits": 0, "misses": 0, "evictions": 0}
+_part_cache_lock = threading.Lock()
+
+
+def _part_cache_put(digest, body):
+    global _part_cache_size
+    _part_cache[digest] = body
+    _part_cache_size += len(body)
+    while _part_cache_size > PART_CACHE_BYTES and len(_part_cache) > 1:
+        old, old_body = _part_cache.popitem(last=False)
+        _part_cache_size -= len(old_body)
+        _part_cache_stats["evictions"] += 1
+        for key in [k for k, d in _part_cache_files.items() if d == old]:
+            del _part_cache_files[key]
+
+
+def _attachment_body(file_path):
+    """
+    base64 body of the attachment part for `file_path`, from the part cache
+    when possible. None if the file is too large to cache; stream it instead.
+    """
+    st = os.stat(file_path)
+    if st.st_size > PART_CACHE_MAX_FILE or st.st_size > PART_CACHE_BYTES:
+        return None
+    key = (os.path.abspath(file_path), st.st_size, st.st_mtime_ns)
+    with _part_cache_lock:
+        digest = _part_cache_files.get(key)
+        if digest in _part_cache:
+            _part_cache.move_to_end(digest)
+            _part_cache_stats["hits"] += 1
+            return _part_cache[digest]
+        _part_cache_stats["misses"] += 1
+
+    with open(file_path, "rb") as f:
+        data = f.read()
+    digest = hashlib.sha256(data).hexdigest()
+    with _part_cache_lock:
+        body = _part_cache.get(digest)
+        if body is None:
+            # 76-char lines, byte for byte what the streamed encoding writes
+            body = base64.encodebytes(data)
+            _part_cache_put(digest, body)
+        else:
+            # same content under another path or mtime: reuse the encoding
+            _part_cache.move_to_end(digest)
+        _part_cache_files[key] = digest
+    return body
+
+
+def part_cache_info():
+    "hits, misses and evictions of the attachment part cache, and its current size."
+    with _part_cache_lock:
+        return dict(_part_cache_stats, entries=len(_part_cache),
+                    bytes=_part_cache_size, max_bytes=PART_CACHE_BYTES)
+
+
+def clear_part_cache():
+    "empty the attachment part cache and reset its counters."
+    global _part_cache_size
+    with _part_cache_lock:
+        _part_cache.clear()
+        _part_cache_files.clear()
+        _part_cache_size = 0
+        _part_cache_stats.update(hits=0, misses=0, evictions=0)
+
+
+def _write_message(fh, to, subject, html_body, sent_from, attachments=None):
+    """
+    Write the MIME message as bytes to the binary file object `fh`.
+
+    Attachment bodies come from the part cache; files too large for it are
+    base64-encoded chunk by chunk straight from disk, so memory use does not
+    grow with attachment size.
+    """
+    msg = EmailMessage()
+    msg["To"] = to
+    msg["From"] = sent_from
+    msg["Subject"] = subject
+    msg.set_content("This is a MIME-formatted message.")
+    msg.add_alternative(html_body, subtype="html")
+
+    if not attachments:
+        BytesGenerator(fh).flatten(msg)
+        return
+
+    # write the message without attachments, minus its closing delimiter ...
+    msg.make_mixed()
+    boundary = "===============" + uuid.uuid4().hex + "=="
+    msg.set_boundary(boundary)
+    buf = io.BytesIO()
+    BytesGenerator(buf).flatten(msg)
+    head = buf.getvalue()
+    closing = f"--{boundary}--".encode()
+    fh.write(head[:head.rindex(closing)])
+
+    # ... then one part per attachment, and close
+    for file_path in attachments:
+        maintype, subtype = _guess_type(file_path)
+        part = EmailMessage()
+        if maintype == "text":
+            # without a charset, readers decode text parts as US-ASCII
+            part.add_header("Content-Type", f"{maintype}/{subtype}", charset="utf-8")
+        else:
+            part["Content-Type"] = f"{maintype}/{subtype}"
+        part["Content-Transfer-Encoding"] = "base64"
+        part.add_header("Content-Disposition", "attachment", filename=os.path.basename(file_path))
+        fh.write(f"--{boundary}\n".encode())
+        for name, value in part.items():
+            fh.write(part.policy.fold_binary(name, value))
+        fh.write(b"\n")
+        body = _attachment_body(file_path)
+        if body is not None:
+            fh.write(body)
+            continue
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(_B64_READ_SIZE), b""):
+                fh.write(base64.encodebytes(chunk))
+    fh.write(closing + b"\n")
+
+
+def _encode_message(to, subject, html_body, sent_from, attachments=None):
+    "Build the MIME message and return it base64url-encoded, as the Gmail API wants it."
+    buf = io.BytesIO()
+    _write_message(buf, to, subject, html_body, sent_from, attachments)
+    return base64.urlsafe_b64encode(buf.getbuffer()).decode()
+
+
+def _is_large(attachments):
+    return bool(attachments) and sum(os.path.getsize(p) for p in attachments) > ATTACHMENT_STREAM_THRESHOLD
+
+
+def _message_upload(fh, to, subject, html_body, sent_from, attachments):
+    "Write the message to the temporary file `fh` and wrap it as a resumable media upload."
+    _write_message(fh, to, subject, html_body, sent_from, attachments)
+    fh.seek(0)
+    return MediaIoBaseUpload(fh, mimetype="message/rfc822", chunksize=UPLOAD_CHUNK_SIZE, resumable=True)
+
+
+@instrumented()
+def send_email(to, subject, html_body, sent_from, attachments=None):
+    """
+    Send an email with optional attachments.
+
+    Messages with large attachments are streamed through a resumable upload.
+    """
+    service = build_gmail_service()
+    user_id = "me"
+
+    if _is_large(attachments):
+        with tempfile.TemporaryFile() as fh:
+            media = _message_upload(fh, to, subject, html_body, sent_from, attachments)
+            return service.users().messages().send(userId=user_id, body={}, media_body=media).execute()
+
+    encoded_message = _encode_message(to, subject, html_body, sent_from, attachments)
+    create_message = {"raw": encoded_message}
+
+    send_result = service.users().messages().send(userId=user_id, body=create_message).execute()
+    return send_result
+
+
+@instrumented()
+def create_draft(to, subject, html_body, sent_from, attachments=None):
+    """
+    Create a Gmail draft with optional attachments.
+
+    Drafts with large attachments are streamed through a resumable upload.
+    """
+    service = build_gmail_service()
+    user_id = "me"
+
+    if _is_large(attachments):
+        with tempfile.TemporaryFile() as fh:
+            media = _message_upload(fh, to, subject, html_body, sent_from, attachments)
+            return service.users().drafts().create(userId=user_id, body={}, media_body=media).execute()
+
+    encoded_message = _encode_message(to, subject, html_body, sent_from, attachments)
+    create_message = {"message": {"raw": encoded_message}}
+
+    draft_result = service.users().drafts().create(userId=user_id, body=create_message).execute()
+    return draft_result
+
+
+# the connection failed: no (complete) response came back
+_TRANSPORT_ERRORS = (OSError, httplib2.HttpLib2Error, TransportError)
+
+
+def _is_transient(exception):
+    "True for Gmail errors worth retrying: 429, 5xx and 403 rate-limit responses, and transport errors."
+    if isinstance(exception, _TRANSPORT_ERRORS):
+        return True
+    if not isinstance(exception, HttpError):
+        return False
+    status = exception.resp.status
+    if status == 429 or status >= 500:
+        return True
+    return status == 403 and "ratelimitexceeded" in str(exception).lower()
+
+
+def _execute_batched(make_request, n, name, batch_size=50, max_retries=5, nbytes=None, idempotent=False):
+    """
+    Run requests 0..n-1 through the Gmail HTTP batch endpoint, `batch_size`
+    per batch request, resending those that failed with 429/5xx errors with
+    exponential back-off. `make_request(service, i)` builds request i and
+    `nbytes(i)` gives its body size, for the metrics. Retries are counted
+    under `name`.
+
+    If a batch request fails in transport, its requests fail with that error
+    and the other batches go on. They are only resent if `idempotent`: a send
+    may have gone through before the connection broke.
+
+    Returns:
+        list: one (response, exception) pair per request, in order; the
+        exception is None on success.
+    """
+    results = [(None, None)] * n
+    pending = list(range(n))
+
+    for attempt in range(max_retries + 1):
+        service = build_gmail_service()
+        retry = []
+
+        def callback(request_id, response, exception):
+            i = int(request_id)
+            results[i] = (response, exception)
+            if exception is not None and _is_transient(exception):
+                retry.append(i)
+
+        for start in range(0, len(pending), batch_size):
+            chunk = pending[start:start + batch_size]
+            batch = service.new_batch_http_request(callback=callback)
+            for i in chunk:
+                batch.add(make_request(service, i), request_id=str(i))
+            try:
+                with instrument("gmail/batch") as m:
+                    if nbytes is not None:
+                        m.add_bytes(sum(nbytes(i) for i in chunk))
+                    batch.execute()
+            except HttpError as e:
+                # the whole batch request failed
+                for i in chunk:
+                    results[i] = (None, e)
+                if _is_transient(e):
+                    retry.extend(chunk)
+            except _TRANSPORT_ERRORS as e:
+                for i in chunk:
+                    results[i] = (None, e)
+                if idempotent:
+                    retry.extend(chunk)
+
+        if not retry or attempt == max_retries:
+            break
+        record_retry(name, len(retry))
+        time.sleep(min(60, 2 ** attempt) + random.uniform(0, 1))
+        pending = sorted(retry)
+
+    return results
+
+
+@instrumented()
+def send_emails_batch(messages, batch_size=50, max_retries=5):
+    """
+    Send many emails through the Gmail HTTP batch endpoint.
+
+    Args:
+        messages (list): dicts with keys 'to', 'subject', 'html_body', 'sent_from'
+            and optionally 'attachments', as for send_email.
+        batch_size (int): messages per batch request (Gmail allows at most 100).
+        max_retries (int): how often failed messages are resent after 429/5xx errors,
+            with exponential back-off. Permanent errors are not retried.
+
+    Returns:
+        list: one dict {'id', 'error'} per message, in input order.
+    """
+    raws = [_encode_message(**m) for m in messages]
+    sent = _execute_batched(
+        lambda service, i: service.users().messages().send(userId="me", body={"raw": raws[i]}),
+        len(raws), "send_emails_batch", batch_size=batch_size, max_retries=max_retries,
+        nbytes=lambda i: len(raws[i]))
+    return [{'id': response["id"], 'error': None} if exception is None else {'id': None, 'error': str(exception)}
+            for response, exception in sent]
+
+
+# ---- inbox sync ---------------------------------------------------------
+# Replies are read incrementally: the caller stores the mailbox historyId of
+# the last sync, users.history.list gives the messages added since, and their
+# headers come from batched messages.get calls in metadata format. The cost of
+# a sync grows with the number of new messages, not the size of the mailbox.
+
+# headers fetched for each new message
+INBOX_HEADERS = ("From", "To", "Subject", "Date", "Message-ID", "In-Reply-To")
+
+
+def _message_row(message):
+    "the fields of a metadata-format message resource that inbox_changes returns."
+    headers = {h["name"].lower(): h["value"] for h in message.get("payload", {}).get("headers", [])}
+    received = message.get("internalDate")
+    return {
+        'id': message["id"],
+        'thread_id': message.get("threadId"),
+        'from': headers.get("from"),
+        'from_address': parseaddr(headers.get("from", ""))[1].lower() or None,
+        'to': headers.get("to"),
+        'subject': headers.get("subject", ""),
+        'received_at': (datetime.fromtimestamp(int(received) / 1000, timezone.utc).replace(tzinfo=None)
+                        if received else None),
+        'snippet': message.get("snippet", ""),
+        'label_ids': message.get("labelIds", []),
+        'in_reply_to': headers.get("in-reply-to")
+    }
+
+
+def _history_message_ids(service, start_history_id, label, page_size):
+    "ids of the messages added to `label` since start_history_id, and the mailbox's current history id."
+    ids, page_token = [], None
+    while True:
+        page = service.users().history().list(
+            userId="me", startHistoryId=start_history_id, labelId=label,
+            historyTypes=["messageAdded"], maxResults=page_size, pageToken=page_token).execute()
+        for record in page.get("history", []):
+            ids.extend(added["message"]["id"] for added in record.get("messagesAdded", []))
+        page_token = page.get("nextPageToken")
+        if not page_token:
+            return list(dict.fromkeys(ids)), page["historyId"]
+
+
+def _recent_message_ids(service, label, days, page_size):
+    "ids of the messages in `label` from the last `days` days."
+    ids, page_token = [], None
+    while True:
+        page = service.users().messages().list(
+            userId="me", labelIds=[label], q=f"newer_than:{days}d",
+            maxResults=page_size, pageToken=page_token).execute()
+        ids.extend(m["id"] for m in page.get("messages", []))
+        page_token = page.get("nextPageToken")
+        if not page_token:
+            return ids
+
+
+@instrumented()
+def inbox_changes(history_id=None, label="INBOX", page_size=500, batch_size=50, fallback_days=7):
+    """
+    Messages added to `label` since the mailbox was at `history_id`.
+
+    Without `history_id` (the first sync) nothing is fetched and only the
+    current history id is returned. If Gmail no longer keeps history that
+    far back, the messages of the last `fallback_days` days are returned
+    instead and 'reset' is True.
+
+    Returns:
+        dict: 'history_id' (store it and pass it next time), 'reset', and
+        'messages', one dict per new message with 'id', 'thread_id', 'from',
+        'from_address', 'to', 'subject', 'received_at' (UTC), 'snippet',
+        'label_ids' and 'in_reply_to'. If some messages could not be fetched
+        for a transient error, 'history_id' stays at the one passed in, so
+        that the next sync picks them up again.
+    """
+    service = build_gmail_service()
+    if history_id is None:
+        profile = service.users().getProfile(userId="me").execute()
+        return {'history_id': profile["historyId"], 'reset': False, 'messages': []}
+
+    reset = False
+    try:
+        ids, new_history_id = _history_message_ids(service, history_id, label, page_size)
+    except HttpError as e:
+        if e.resp.status != 404:
+            raise
+        # history expired: take the cursor first so nothing that arrives meanwhile is missed
+        reset = True
+        new_history_id = service.users().getProfile(userId="me").execute()["historyId"]
+        ids = _recent_message_ids(service, label, fallback_days, page_size)
+
+    fetched = _execute_batched(
+        lambda service, i: service.users().messages().get(
+            userId="me", id=ids[i], format="metadata", metadataHeaders=list(INBOX_HEADERS)),
+        len(ids), "inbox_changes", batch_size=batch_size, idempotent=True)
+
+    messages, incomplete = [], False
+    for response, exception in fetched:
+        if exception is None:
+            messages.append(_message_row(response))
+        elif _is_transient(exception):
+            incomplete = True
+        # anything else, e.g. 404 for a message deleted since, is skipped
+    return {'history_id': history_id if incomplete else new_history_id,
+            'reset': reset, 'messages': messages}
+
+
+def match_messages(messages, paper_ids, threads=None, contacts=None):
+    """
+    Match messages (as returned by inbox_changes) to papers.
+
+    A message belongs to a paper if its subject contains the paper id, alone
+    or inside the paper slug or case id ("JPE-Smith-12345678-R2" also gives
+    the round), or else if its thread belongs to one: `threads` maps thread
+    id -> paper id from earlier syncs, and threads matched by subject among
+    `messages` count too. `contacts` maps paper id -> {email: role}, e.g.
+    'author' or 'replicator', to tell who replied.
+
+    Returns:
+        list: the matched messages, each with 'paper_id', 'round' (None if
+        the subject does not say), 'matched_by' ('subject' or 'thread') and
+        'role' (None for senders not in `contacts`) added.
+    """
+    ids = sorted({str(p) for p in paper_ids if p}, key=len, reverse=True)
+    if not ids:
+        return []
+    pattern = re.compile(r"(?<!\w)(" + "|".join(map(re.escape, ids)) + r")(?:-R(\d+))?(?!\w)",
+                         re.IGNORECASE)
+    by_lower = {i.lower(): i for i in ids}
+    threads = dict(threads or {})
+    contacts = contacts or {}
+
+    matched = {}
+    for m in messages:
+        found = pattern.search(m['subject'] or "")
+        if found is not None:
+            paper_id = by_lower[found.group(1).lower()]
+            matched[m['id']] = (paper_id, int(found.group(2)) if found.group(2) else None, 'subject')
+            threads.setdefault(m['thread_id'], paper_id)
+    for m in messages:
+        if m['id'] not in matched and m['thread_id'] in threads:
+            matched[m['id']] = (threads[m['thread_id']], None, 'thread')
+
+    out = []
+    for m in messages:
+        if m['id'] not in matched:
+            continue
+        paper_id, round_, how = matched[m['id']]
+        role = contacts.get(paper_id, {}).get(m['from_address'])
+        out.append(dict(m, paper_id=paper_id, round=round_, matched_by=how, role=role))
+    return out
+
+
+# testing
+
+# from jpe_py.gmail_client import send_email, create_draft
+
+# send_email(
+#     to="florian.oswald@gmail.com",
+#     subject="Test Email",
+#     html_body="<h1>Hello from Python</h1> you are the man 🚨",
+#     attachments=["database.md"]
+# )
+
+# create_draft(
+#     to="you@example.com",
+#     subject="Draft Email",
+#     html_body="<p>This is a draft email.</p>"
+# )
\ No newline at end of file
@@ -0,0 +1,186 @@
+# Call metrics for the python layer.
+#
+# db_filerequests and gmail_client time their exported operations with
+# @instrumented and every HTTP API call with `with instrument(...)`. Per name
+# we keep call and error counts, retries, bytes transferred and a latency
+# histogram.
+#
+# usage from julia:
+#   jpy.get_metrics()           # snapshot dict, name => stats
+#   jpy.dump_metrics()          # append a snapshot to the JSON-lines file
+#   jpy.reset_metrics()
+
+import os
+import json
+import time
+import threading
+import functools
+from datetime import datetime, timezone
+
+# upper bounds (seconds) of the latency histogram buckets; the last one catches the rest
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, float("inf"))
+
+_metrics = {}
+_metrics_lock = threading.Lock()
+
+
+def _new_stats():
+    return {'calls': 0, 'errors': {}, 'retries': 0, 'bytes': 0,
+            'total_s': 0.0, 'max_s': 0.0, 'buckets': [0] * len(LATENCY_BUCKETS)}
+
+
+def _stats(name):
+    # caller holds _metrics_lock
+    stats = _metrics.get(name)
+    if stats is None:
+        stats = _metrics[name] = _new_stats()
+    return stats
+
+
+def _observe(name, seconds, error=None, nbytes=0):
+    with _metrics_lock:
+        stats = _stats(name)
+        stats['calls'] += 1
+        stats['total_s'] += seconds
+        stats['max_s'] = max(stats['max_s'], seconds)
+        stats['bytes'] += nbytes
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                stats['buckets'][i] += 1
+                break
+        if error is not None:
+            stats['errors'][error] = stats['errors'].get(error, 0) + 1
+
+
+def record_retry(name, n=1):
+    "count `n` retries of `name`."
+    with _metrics_lock:
+        _stats(name)['retries'] += n
+
+
+def record_bytes(name, n):
+    "add `n` bytes transferred by `name` outside a timed block (e.g. a streamed body)."
+    with _metrics_lock:
+        _stats(name)['bytes'] += n
+
+
+class instrument:
+    """
+    Time a block under `name`; an exception is counted by its class (and its
+    `kind`, if it has one) and re-raised.
+
+        with instrument("dropbox/files/list_folder") as m:
+            ...
+            m.add_bytes(len(body))
+    """
+
+    __slots__ = ('name', 'nbytes', '_t0')
+
+    def __init__(self, name):
+        self.name = name
+        self.nbytes = 0
+
+    def add_bytes(self, n):
+        self.nbytes += n
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _observe(self.name, time.perf_counter() - self._t0, _error_label(exc_type, exc), self.nbytes)
+        return False
+
+
+def _error_label(exc_type, exc):
+    "metrics key of an exception: its class name, with the error kind for typed errors."
+    if exc_type is None:
+        return None
+    kind = getattr(exc, 'kind', None)
+    return f"{exc_type.__name__}/{kind}" if kind else exc_type.__name__
+
+
+def instrumented(name=None):
+    "decorator: time every call of the function under `name` (default: its own name)."
+    def wrap(fn):
+        label = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with instrument(label):
+                return fn(*args, **kwargs)
+        return wrapper
+    return wrap
+
+
+def _quantile(buckets, calls, q):
+    "upper bucket bound below which a fraction q of the calls fell."
+    if calls == 0:
+        return None
+    target = q * calls
+    seen = 0
+    for bound, n in zip(LATENCY_BUCKETS, buckets):
+        seen += n
+        if seen >= target:
+            return bound
+    return LATENCY_BUCKETS[-1]
+
+
+def get_metrics(reset=False):
+    """
+    Snapshot of all metrics: {name: {'calls', 'errors', 'retries', 'bytes',
+    'total_s', 'mean_s', 'max_s', 'p50_s', 'p95_s', 'histogram'}}.
+    Quantiles are histogram bucket bounds; 'histogram' maps each bound to its count.
+    """
+    global _metrics
+    with _metrics_lock:
+        current = _metrics
+        if reset:
+            _metrics = {}
+        else:
+            current = {k: dict(v, errors=dict(v['errors']), buckets=list(v['buckets']))
+                       for k, v in current.items()}
+
+    snapshot = {}
+    for name, s in sorted(current.items()):
+        calls = s['calls']
+        snapshot[name] = {
+            'calls': calls,
+            'errors': s['errors'],
+            'retries': s['retries'],
+            'bytes': s['bytes'],
+            'total_s': s['total_s'],
+            'mean_s': s['total_s'] / calls if calls else None,
+            'max_s': s['max_s'],
+            'p50_s': _quantile(s['buckets'], calls, 0.5),
+            'p95_s': _quantile(s['buckets'], calls, 0.95),
+            'histogram': {("inf" if b == float("inf") else b): n
+                          for b, n in zip(LATENCY_BUCKETS, s['buckets'])},
+        }
+    return snapshot
+
+
+def reset_metrics():
+    get_metrics(reset=True)
+
+
+def _metrics_path():
+    path = os.environ.get("JPE_METRICS_FILE")
+    if path:
+        return path
+    return os.path.join(os.environ.get("JPE_DB", "."), "python_metrics.jsonl")
+
+
+def dump_metrics(path=None, reset=False, label=None):
+    """
+    Append one JSON line {'time', 'label', 'metrics'} with the current snapshot
+    to `path` (default $JPE_METRICS_FILE, else $JPE_DB/python_metrics.jsonl).
+    Returns the path written to.
+    """
+    path = path or _metrics_path()
+    line = json.dumps({'time': datetime.now(timezone.utc).isoformat(),
+                       'label': label,
+                       'metrics': get_metrics(reset=reset)})
+    with open(path, "a") as fh:
+        fh.write(line + "\n")
+    return path
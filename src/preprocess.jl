@@ -1,5 +1,5 @@
 
-function preprocess2(paperID; which_round = nothing, max_pkg_size_gb = 10, max_file_size_gb = 2, run_checks = true)
+function preprocess2(paperID; which_round = nothing, max_pkg_size_gb = 10, max_file_size_gb = 2, run_checks = true, local_mirror = false)
         
     # get row from "iterations"
     p = db_filter_paper(paperID)
@@ -44,7 +44,8 @@ function preprocess2(paperID; which_round = nothing, max_pkg_size_gb = 10, max_f
 
     # check size of replication packge on dropbox and decide what to do
     r.file_request_path_full = get_dbox_loc(r.journal, r.paper_slug, r.round, full = false)
-    size_gb = dbox_get_folder_size(joinpath(r.file_request_path_full, "replication-package"))
+    pkg_stats = dbox_folder_stats(joinpath(r.file_request_path_full, "replication-package"))
+    size_gb = round(pkg_stats["bytes"] / 1024^3, digits = 2)
 
     @info "package has $size_gb GB on dropbox."
 
@@ -58,6 +59,9 @@ function preprocess2(paperID; which_round = nothing, max_pkg_size_gb = 10, max_f
         end
     end
 
+    if !isnothing(pkg_stats["largest_file"])
+        println("largest file on dropbox: $(basename(pkg_stats["largest_file"])) ($(round(pkg_stats["largest_bytes"] / 1024^3, digits = 2)) GB)")
+    end
     println("To disregard extracting very large files from zip, we have a safeguard:")
     println("max_file_size_gb is currently $(max_file_size_gb). Keep or change?")
     max_size_prompt = RadioMenu(["keep","change"])
@@ -138,6 +142,13 @@ function preprocess2(paperID; which_round = nothing, max_pkg_size_gb = 10, max_f
         runner_env = ENV["JULIA_RUNNER_ENV"]
         runner_script = joinpath(repoloc,"runner_precheck.jl")
 
+        if local_mirror
+            # sync the package straight into the repo (files already on disk, e.g. in the
+            # previous round's package, are copied rather than downloaded); the runner
+            # then skips its own download
+            dbox_sync_folder(dropbox_path, joinpath(repoloc, "replication-package"), dbox_token)
+        end
+
         # always run the script to fetch/copy the replication package;
         # run_checks only controls whether PackageScanner.precheck_package runs (see write_runner_script)
         cmd = Cmd([
@@ -734,6 +734,8 @@ function replicator_billing(; test_max_hours = 1.5, rate = 25.0, email = false,
         groupby(:replicator)
     end
 
+    # invoice emails are sent together in one batch after the loop
+    invoices = []
     for g in h_repl
         # update wrong email addresses
         search_email = if g.replicator[1] == "huiyann@ucsb.edu"
@@ -746,10 +748,23 @@ function replicator_billing(; test_max_hours = 1.5, rate = 25.0, email = false,
         # println(g)
         (sheet_row, col_idx,next_invoice_num) = replicator_next_invoice(replicators_df,r.email[1])
 
-        gmail_send_invoice(r.name[1],r.email[1],select(g,Not(:replicator)), test_max_hours,rate,EUR2USD,next_invoice_num,send = email)
-        # updated invoice field
         if email
-            replicator_write_invoice(sheet_row,col_idx,string("INV-",next_invoice_num))
+            m = gmail_invoice_message(r.name[1],r.email[1],select(g,Not(:replicator)), test_max_hours,rate,EUR2USD,next_invoice_num)
+            push!(invoices, (message = m, sheet_row = sheet_row, col_idx = col_idx, invoice = next_invoice_num))
+        else
+            gmail_send_invoice(r.name[1],r.email[1],select(g,Not(:replicator)), test_max_hours,rate,EUR2USD,next_invoice_num,send = false)
+        end
+    end
+
+    if !isempty(invoices)
+        sent = gmail_send_batch([inv.message for inv in invoices])
+        for (inv, res) in zip(invoices, sent)
+            if isnothing(res["error"])
+                # updated invoice field
+                replicator_write_invoice(inv.sheet_row,inv.col_idx,string("INV-",inv.invoice))
+            else
+                @warn "could not send invoice to $(inv.message.to): $(res["error"])"
+            end
         end
     end
 
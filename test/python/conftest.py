@@ -0,0 +1,42 @@
+"""
+Fixtures for the python layer tests: a fresh jpe_py per test, wired to the
+local fake Dropbox/Gmail server of bench/fake_services.py. No credentials or
+network needed.
+
+    python -m pytest test/python
+"""
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(ROOT, "bench"))
+
+from bench_python_layer import TOKEN, load_layer  # noqa: E402  (also puts src/ on the path)
+from fake_services import FakeServer  # noqa: E402
+
+__all__ = ["TOKEN"]
+
+
+@pytest.fixture
+def server():
+    with FakeServer() as srv:
+        yield srv
+
+
+@pytest.fixture
+def layer(server, tmp_path):
+    "the jpe_py submodules (see bench_python_layer.Layer), with back-off delays of zero."
+    ns = load_layer(server, str(tmp_path))
+    for module in ns.modules:
+        if hasattr(module, "_backoff_delay"):
+            module._backoff_delay = lambda attempt, retry_after=None, **kwargs: 0.0
+    return ns
+
+
+@pytest.fixture
+def dfr(layer):
+    "jpe_py.db_filerequests of the fresh layer."
+    return sys.modules["jpe_py.db_filerequests"]
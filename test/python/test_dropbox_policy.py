@@ -0,0 +1,178 @@
+"""
+Retry policy, circuit breaker, error classification and link cache of
+jpe_py.db_filerequests, against the fake Dropbox server.
+"""
+
+import time
+import importlib.util
+
+import pytest
+
+from conftest import TOKEN
+
+LINK_ROUTE = "sharing/create_shared_link_with_settings"
+
+
+def _dropbox_calls(layer, route):
+    return layer["get_metrics"]().get(f"dropbox/{route}", {}).get("calls", 0)
+
+
+def test_rate_limit_reaches_retry_policy(layer, dfr, server):
+    "a 429 is not retried inside the SDK: the policy retries it, counts it and shares the pause."
+    server.state.add_folder("/p")
+    server.fail(LINK_ROUTE, 429, times=2, retry_after=1)
+    t0 = time.time()
+    url = dfr.get_link_at_path("/p", TOKEN)
+    assert url.startswith("https://fake.dropbox/s/")
+    assert _dropbox_calls(layer, LINK_ROUTE) == 3
+    assert layer["get_metrics"]()["get_link_at_path"]["retries"] == 2
+    assert dfr._rate_limited_until >= t0 + 1
+
+
+def test_server_error_retried_once_per_attempt(layer, dfr, server):
+    "a 5xx costs one request per policy attempt, not a burst of SDK retries."
+    server.state.add_folder("/p")
+    server.fail(LINK_ROUTE, 500, times=1)
+    dfr.get_link_at_path("/p", TOKEN)
+    assert _dropbox_calls(layer, LINK_ROUTE) == 2
+    assert layer["get_metrics"]()["get_link_at_path"]["retries"] == 1
+
+
+def test_rate_limit_gives_up_as_rate_limit(dfr, server):
+    server.state.add_folder("/p")
+    server.fail(LINK_ROUTE, 429, times=10)
+    with pytest.raises(dfr.DropboxError) as e:
+        dfr.get_link_at_path("/p", TOKEN)
+    assert e.value.kind == "rate_limit"
+
+
+def _open_breaker(dfr, server, monkeypatch):
+    monkeypatch.setattr(dfr._breaker, "threshold", 1)
+    monkeypatch.setattr(dfr._breaker, "cooldown", 0.05)
+    server.state.add_folder("/p")
+    server.fail("files/list_folder", 503, times=6)  # the first try and all 5 retries
+    with pytest.raises(dfr.DropboxError) as e:
+        dfr.submission_time(TOKEN, "/p")
+    assert e.value.kind == "transient"
+    with pytest.raises(dfr.DropboxError) as e:
+        dfr.submission_time(TOKEN, "/p")
+    assert e.value.kind == "unavailable"
+    time.sleep(0.1)
+
+
+def test_breaker_recovers_after_failed_auth_trial(dfr, server, monkeypatch):
+    "a trial call whose token refresh fails must not leave the circuit open for good."
+    _open_breaker(dfr, server, monkeypatch)
+
+    def refresh_fails(**kwargs):
+        raise RuntimeError("token endpoint down")
+
+    server.fail("files/list_folder", 401)
+    monkeypatch.setattr(dfr, "refresh_token", refresh_fails)
+    with pytest.raises(dfr.DropboxError) as e:
+        dfr.submission_time(TOKEN, "/p")
+    assert e.value.kind == "auth"
+
+    assert dfr.submission_time(TOKEN, "/p") is None
+    assert dfr._breaker._opened_at is None
+
+
+def test_breaker_recovers_after_interrupted_trial(dfr, server, monkeypatch):
+    _open_breaker(dfr, server, monkeypatch)
+
+    def interrupted():
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        dfr._call_with_backoff(interrupted, ())
+    assert dfr.submission_time(TOKEN, "/p") is None
+
+
+def test_retrying_trial_is_not_refused(dfr, server, monkeypatch):
+    "the trial call may retry: its own later attempts are not turned away as 'unavailable'."
+    _open_breaker(dfr, server, monkeypatch)
+    server.fail("files/list_folder", 503, times=2)
+    assert dfr.submission_time(TOKEN, "/p") is None
+
+
+def test_bulk_trial_workers_share_admission(dfr, server, monkeypatch):
+    "a bulk call admitted as the trial runs its workers under that admission, not refused as 'unavailable'."
+    _open_breaker(dfr, server, monkeypatch)
+    res = dfr.create_file_requests_bulk([("a", "/p/a"), ("b", "/p/b")], TOKEN)
+    assert [r["error"] for r in res] == [None, None]
+    assert all(r["id"] for r in res)
+    assert dfr._breaker._opened_at is None
+
+
+def test_fan_out_replays_with_refreshed_token(dfr, server, monkeypatch, tmp_path):
+    "workers of a bulk call look up their client per attempt, so a refresh reaches their replays."
+    def refresh(force=False, stale=None):
+        if stale is not None:
+            dfr._stale_tokens.add(stale)
+        dfr._dbx_token = "fresh-token"
+        return dfr._dbx_token
+
+    monkeypatch.setattr(dfr, "refresh_token", refresh)
+    server.revoke(TOKEN)
+    res = dfr.create_file_requests_bulk([("a", "/p/a"), ("b", "/p/b")], TOKEN)
+    assert [r["error"] for r in res] == [None, None]
+    assert set(dfr.cleanup_file_requests(TOKEN, [r["id"] for r in res]).values()) == {"deleted"}
+
+    local = tmp_path / "x.txt"
+    local.write_bytes(b"x" * 10)
+    up = dfr.upload_files([(str(local), "/p/x.txt")], TOKEN, chunk_size=4)
+    assert up[0]["error"] is None
+
+
+@pytest.mark.parametrize("status", [429, 500])
+def test_bulk_delete_is_retried(dfr, server, status):
+    created = dfr.create_file_requests_bulk([("a", "/p/a"), ("b", "/p/b")], TOKEN)
+    ids = [r["id"] for r in created]
+    server.fail("file_requests/delete", status, times=2)
+    assert dfr.cleanup_file_requests(TOKEN, ids) == {i: "deleted" for i in ids}
+
+
+@pytest.mark.parametrize("name, args", [
+    ("check_file_request_submissions", ("no-such-id",)),
+    ("submission_time", ("/no/such/folder",)),
+    ("update_file_request_deadline", ("no-such-id", 7)),
+])
+def test_missing_targets_are_not_found(dfr, name, args):
+    with pytest.raises(dfr.DropboxError) as e:
+        getattr(dfr, name)(TOKEN, *args)
+    assert e.value.kind == "not_found"
+
+
+@pytest.mark.skipif(importlib.util.find_spec("httpx") is None, reason="the async backend needs httpx")
+def test_missing_file_request_is_not_found_async(layer):
+    try:
+        res = layer["check_file_requests_async"](TOKEN, ["no-such-id"])
+    finally:
+        layer["close_async_backend"]()
+    assert res[0]["result"] is None and res[0]["kind"] == "not_found"
+
+
+def test_revoked_link_leaves_cache(dfr, server):
+    "revoking a link, also by its url without ?dl=0, drops it from memory and the index."
+    server.state.add_folder("/p")
+    url = dfr.get_link_at_path("/p", TOKEN)
+    assert dfr._link_cache_get("/p") == url
+
+    dfr.revoke_shared_link(url.split("?")[0], TOKEN)  # as revoke_preprocessing_link does
+    assert dfr._link_cache_get("/p") is None
+    dfr._link_cache = None  # as a new session, reading the index
+    assert dfr._link_cache_get("/p") is None
+
+    fresh = dfr.get_link_at_path("/p", TOKEN)
+    assert fresh != url
+    dfr._link_cache = None
+    assert dfr._link_cache_get("/p") == fresh
+
+
+def test_old_cache_entries_are_revalidated(dfr, server, monkeypatch):
+    server.state.add_folder("/p")
+    url = dfr.get_link_at_path("/p", TOKEN)
+    server.state.links.clear()  # revoked outside this process
+    monkeypatch.setattr(dfr, "LINK_CACHE_TTL", 0)
+    time.sleep(0.01)
+    assert dfr.get_link_at_path("/p", TOKEN) != url
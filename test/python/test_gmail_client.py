@@ -0,0 +1,26 @@
+"""
+Messages built by jpe_py.gmail_client, as received by the fake Gmail server.
+"""
+
+import base64
+import email
+import email.policy
+
+
+def _sent(server, n=0):
+    raw = base64.urlsafe_b64decode(server.state.messages[n])
+    return email.message_from_bytes(raw, policy=email.policy.default)
+
+
+def test_text_attachment_keeps_utf8(layer, server, tmp_path):
+    notes = tmp_path / "notes.txt"
+    notes.write_text("héllo wörld\n", encoding="utf-8")
+    data = tmp_path / "data.bin"
+    data.write_bytes(b"\xff\x00")
+    layer["send_email"]("a@example.org", "s", "<p>hi</p>", "jpe@example.org", [str(notes), str(data)])
+
+    parts = {p.get_filename(): p for p in _sent(server).iter_attachments()}
+    assert parts["notes.txt"].get_content_charset() == "utf-8"
+    assert parts["notes.txt"].get_content() == "héllo wörld\n"
+    assert parts["data.bin"].get_content_type() == "application/octet-stream"
+    assert parts["data.bin"].get_content() == b"\xff\x00"